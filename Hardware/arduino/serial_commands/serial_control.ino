@@ -1,26 +1,165 @@
-// Serial command control for LED
+// Serial control for LED and species counts over the binary protocol
+// (Software/serial_communication/protocol.py):
+//
+//   frame = SYNC type seq len payload[len] crc16_lo crc16_hi
+//
+// Bytes are parsed one at a time into a fixed buffer (no String allocation).
+// Every valid frame is answered with an ACK carrying its sequence number; a
+// repeated sequence number (our ACK was lost and the host resent) is acked
+// again without being applied twice. Only the last sequence number is
+// remembered: the host (binary_link.py) never sends a newer frame for a
+// species while an older one is unacked, and sends commands one at a time
+// with nothing else in flight.
 const int ledPin = 13;
+const int pwmPin = 9;  // brightness output
+
+const byte SYNC = 0xA5;
+const byte MAX_PAYLOAD = 48;
+
+const byte FRAME_COUNTS = 0x01;
+const byte FRAME_COMMAND = 0x02;
+const byte FRAME_ACK = 0x80;
+
+const byte ACK_OK = 0;
+const byte ACK_DUPLICATE = 1;
+const byte ACK_BAD_PAYLOAD = 2;
+
+const byte CMD_LED_OFF = 0;
+const byte CMD_LED_ON = 1;
+const byte CMD_BLINK = 2;
+const byte CMD_BRIGHTNESS = 3;
+
+const byte MAX_SPECIES = 32;
+unsigned long lastCount[MAX_SPECIES];  // latest count per species id (class_indices.json)
+
+// --- Parser state ---
+enum ParseState { WAIT_SYNC, READ_TYPE, READ_SEQ, READ_LEN, READ_PAYLOAD, READ_CRC_LO, READ_CRC_HI };
+ParseState state = WAIT_SYNC;
+byte frameType, frameSeq, frameLen, payloadPos, crcLo;
+byte payload[MAX_PAYLOAD];
+uint16_t crc;
+
+int lastSeq = -1;
+unsigned long blinkUntil = 0;
+
+// CRC-16/CCITT-FALSE, same as binascii.crc_hqx(data, 0xFFFF)
+uint16_t crcUpdate(uint16_t value, byte b) {
+  value ^= (uint16_t)b << 8;
+  for (byte i = 0; i < 8; i++) {
+    value = (value & 0x8000) ? (value << 1) ^ 0x1021 : value << 1;
+  }
+  return value;
+}
+
+// Unsigned LEB128; returns false if the payload ends mid-varint
+bool readVarint(byte &pos, unsigned long &value) {
+  value = 0;
+  byte shift = 0;
+  while (pos < frameLen && shift < 32) {
+    byte b = payload[pos++];
+    value |= (unsigned long)(b & 0x7F) << shift;
+    if (!(b & 0x80)) return true;
+    shift += 7;
+  }
+  return false;
+}
+
+void sendAck(byte seq, byte status) {
+  byte frame[7] = {SYNC, FRAME_ACK, seq, 1, status, 0, 0};
+  uint16_t c = 0xFFFF;
+  for (byte i = 1; i < 5; i++) c = crcUpdate(c, frame[i]);
+  frame[5] = c & 0xFF;
+  frame[6] = c >> 8;
+  Serial.write(frame, sizeof(frame));
+}
+
+byte applyCounts() {
+  byte pos = 0;
+  unsigned long id, count;
+  while (pos < frameLen) {
+    if (!readVarint(pos, id) || !readVarint(pos, count)) return ACK_BAD_PAYLOAD;
+    if (id < MAX_SPECIES) lastCount[id] = count;
+  }
+  return ACK_OK;
+}
+
+byte applyCommand() {
+  if (frameLen < 1) return ACK_BAD_PAYLOAD;
+  switch (payload[0]) {
+    case CMD_LED_ON:
+      digitalWrite(ledPin, HIGH);
+      break;
+    case CMD_LED_OFF:
+      digitalWrite(ledPin, LOW);
+      break;
+    case CMD_BLINK:
+      digitalWrite(ledPin, HIGH);
+      blinkUntil = millis() + 200;  // switched off in loop(), so parsing never stalls
+      break;
+    case CMD_BRIGHTNESS:
+      analogWrite(pwmPin, frameLen > 1 ? payload[1] : 0);
+      break;
+    default:
+      return ACK_BAD_PAYLOAD;
+  }
+  return ACK_OK;
+}
+
+void handleFrame() {
+  if (frameSeq == lastSeq) {
+    sendAck(frameSeq, ACK_DUPLICATE);
+    return;
+  }
+  byte status = ACK_BAD_PAYLOAD;
+  if (frameType == FRAME_COUNTS) status = applyCounts();
+  else if (frameType == FRAME_COMMAND) status = applyCommand();
+  lastSeq = frameSeq;
+  sendAck(frameSeq, status);
+}
+
+void parseByte(byte b) {
+  switch (state) {
+    case WAIT_SYNC:
+      if (b == SYNC) { crc = 0xFFFF; state = READ_TYPE; }
+      break;
+    case READ_TYPE:
+      frameType = b; crc = crcUpdate(crc, b); state = READ_SEQ;
+      break;
+    case READ_SEQ:
+      frameSeq = b; crc = crcUpdate(crc, b); state = READ_LEN;
+      break;
+    case READ_LEN:
+      if (b > MAX_PAYLOAD) { state = (b == SYNC) ? READ_TYPE : WAIT_SYNC; crc = 0xFFFF; break; }
+      frameLen = b; payloadPos = 0; crc = crcUpdate(crc, b);
+      state = frameLen ? READ_PAYLOAD : READ_CRC_LO;
+      break;
+    case READ_PAYLOAD:
+      payload[payloadPos++] = b; crc = crcUpdate(crc, b);
+      if (payloadPos == frameLen) state = READ_CRC_LO;
+      break;
+    case READ_CRC_LO:
+      crcLo = b; state = READ_CRC_HI;
+      break;
+    case READ_CRC_HI:
+      // a corrupted frame gets no ACK; the host times out and resends it
+      if ((crcLo | ((uint16_t)b << 8)) == crc) handleFrame();
+      state = WAIT_SYNC;
+      break;
+  }
+}
 
 void setup() {
   pinMode(ledPin, OUTPUT);
+  pinMode(pwmPin, OUTPUT);
   Serial.begin(9600);
 }
 
 void loop() {
-  if (Serial.available() > 0) {
-    String command = Serial.readStringUntil('\n');
-    command.trim();
-
-    if (command == "ON") {
-      digitalWrite(ledPin, HIGH);
-      Serial.println("LED turned ON");
-    } else if (command == "OFF") {
-      digitalWrite(ledPin, LOW);
-      Serial.println("LED turned OFF");
-    } else if (command.startsWith("BRIGHT")) {
-      Serial.println("Brightness control placeholder");
-    } else {
-      Serial.println("Unknown command");
-    }
+  while (Serial.available() > 0) {
+    parseByte(Serial.read());
+  }
+  if (blinkUntil && (long)(millis() - blinkUntil) >= 0) {
+    digitalWrite(ledPin, LOW);
+    blinkUntil = 0;
   }
 }
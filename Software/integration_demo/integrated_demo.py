@@ -1,32 +1,42 @@
 import cv2
-import time
-from organism_detection.detect_organisms import detect
+from sample_analysis.counting import count_microbes
+from sample_analysis.segmentation import Segmenter
+from sample_analysis.tracking import OrganismTracker
 from serial_communication.send_commands import ArduinoController
+from webcam_feed.frame_grabber import FrameGrabber
 
 def main():
-    cap = cv2.VideoCapture(0)
+    cap = FrameGrabber(0).start()
     arduino = ArduinoController(port='COM7')
 
-    last_detection_time = 0
-    cooldown = 2  # seconds between LED blinks
+    # Organisms keep their id while they stay in view, so the LED blinks once per
+    # new organism rather than on every frame that contains one
+    segmenter = Segmenter()
+    tracker = OrganismTracker()
 
     while True:
         ret, frame = cap.read()
         if not ret:
             break
 
-        organisms_detected = detect(frame)
+        _, _, blobs = count_microbes(frame, segmenter=segmenter)
+        tracker.update(blobs)
 
-        if organisms_detected > 0 and (time.time() - last_detection_time > cooldown):
-            print(f"Detected {organisms_detected} organisms!")
+        if len(tracker.new_confirmed):
+            print(f"Detected {len(tracker.new_confirmed)} new organisms ({tracker.unique_total} so far)")
             arduino.send_command('1')  # Blink LED once
-            last_detection_time = time.time()
 
+        for x, y, w, h in tracker.boxes[tracker.missed == 0].astype(int):
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 1)
+        cv2.putText(frame, f"Unique: {tracker.unique_total}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         cv2.imshow("Microscope Feed", frame)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
+    print(tracker.stats())
+    print(cap.stats())
     cap.release()
     cv2.destroyAllWindows()
     arduino.close()
@@ -0,0 +1,179 @@
+# backends.py
+# Lazily loaded model runtimes. Scripts get an object with the Keras-style
+# predict()/input_shape/output_shape interface, but nothing is imported or
+# loaded until the first prediction, and a converted TFLite or ONNX file next
+# to microbe_model.h5 is preferred over full TensorFlow.
+import os
+import threading
+
+import numpy as np
+
+BACKENDS = ("tflite", "onnx", "keras")
+BACKEND_ENV = "MICROBE_BACKEND"  # force one backend, e.g. MICROBE_BACKEND=keras
+
+
+def converted_path(h5_path, backend, quantize=None):
+    """Where export_model.py writes (and load_model looks for) a converted model."""
+    stem = os.path.splitext(h5_path)[0]
+    suffix = f"_{quantize}" if quantize else ""
+    return f"{stem}{suffix}.{backend}"
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, path, threads=None):
+        if threads:
+            import tensorflow as tf
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(threads)
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+            except RuntimeError:  # TensorFlow already initialized in this process
+                pass
+        from tensorflow.keras.models import load_model
+        self.model = load_model(path)
+        self.input_shape = self.model.input_shape
+        self.output_shape = self.model.output_shape
+
+    def predict(self, x, verbose=0, **kwargs):
+        return self.model.predict(x, verbose=verbose, **kwargs)
+
+
+class TFLiteBackend:
+    name = "tflite"
+
+    def __init__(self, path, threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter  # small wheel, no TensorFlow
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=path, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self._in = self.interpreter.get_input_details()[0]
+        self._out = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in self._in["shape"][1:])
+        self.output_shape = (None,) + tuple(int(d) for d in self._out["shape"][1:])
+        self._batch = int(self._in["shape"][0])
+        self._lock = threading.Lock()  # an Interpreter must not be invoked from two threads at once
+
+    def predict(self, x, verbose=0, **kwargs):
+        x = np.asarray(x, dtype="float32")
+        with self._lock:
+            if len(x) != self._batch:
+                self.interpreter.resize_tensor_input(self._in["index"], [len(x)] + list(self.input_shape[1:]))
+                self.interpreter.allocate_tensors()
+                self._in = self.interpreter.get_input_details()[0]
+                self._out = self.interpreter.get_output_details()[0]
+                self._batch = len(x)
+            scale, zero = self._in["quantization"]
+            if scale:  # fully integer-quantized input
+                x = np.round(x / scale + zero).astype(self._in["dtype"])
+            self.interpreter.set_tensor(self._in["index"], x)
+            self.interpreter.invoke()
+            y = self.interpreter.get_tensor(self._out["index"])
+            scale, zero = self._out["quantization"]
+            if scale:
+                y = (y.astype("float32") - zero) * scale
+            return np.array(y, dtype="float32")
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        inp, out = self.session.get_inputs()[0], self.session.get_outputs()[0]
+        self._input_name = inp.name
+        self.input_shape = (None,) + tuple(inp.shape[1:])
+        self.output_shape = (None,) + tuple(out.shape[1:])
+
+    def predict(self, x, verbose=0, **kwargs):
+        return self.session.run(None, {self._input_name: np.asarray(x, dtype="float32")})[0]
+
+
+_CLASSES = {"keras": KerasBackend, "tflite": TFLiteBackend, "onnx": OnnxBackend}
+
+
+def _candidates(path, backend):
+    """(backend, file) pairs to try, lightest runtime first."""
+    if backend:
+        order = [backend]
+    elif os.environ.get(BACKEND_ENV):
+        order = [os.environ[BACKEND_ENV]]
+    else:
+        order = list(BACKENDS)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".tflite", ".onnx"):
+        return [(ext[1:], path)]
+    out = []
+    for name in order:
+        if name == "keras":
+            out.append((name, path))
+            continue
+        # prefer a quantized export if one exists
+        for quantize in ("int8", "float16", None):
+            candidate = converted_path(path, name, quantize)
+            if os.path.exists(candidate):
+                out.append((name, candidate))
+                break
+    return out
+
+
+def open_backend(path, backend=None, threads=None):
+    """Load the model now with the first runtime that works.
+
+    `threads` caps the runtime's intra-op thread pool (None = runtime default),
+    e.g. one or two per process when several worker processes share the CPU.
+    """
+    errors = []
+    for name, candidate in _candidates(path, backend):
+        try:
+            return _CLASSES[name](candidate, threads)
+        except ImportError as e:  # runtime not installed, fall through to the next one
+            errors.append(f"{name}: {e}")
+    raise RuntimeError(f"No usable backend for {path} ({'; '.join(errors) or 'no model files found'})")
+
+
+class LazyModel:
+    """Keras-like model handle that loads on first use.
+
+    Importing a script no longer costs a TensorFlow import and model load;
+    that happens the first time predict(), input_shape or output_shape is used.
+    """
+
+    def __init__(self, path, backend=None, threads=None):
+        self.path = path
+        self.backend_name = backend
+        self.threads = threads
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = open_backend(self.path, self.backend_name, self.threads)
+                    print(f"Model loaded with {self._backend.name} backend")
+        return self._backend
+
+    @property
+    def input_shape(self):
+        return self.backend.input_shape
+
+    @property
+    def output_shape(self):
+        return self.backend.output_shape
+
+    def predict(self, x, verbose=0, **kwargs):
+        return self.backend.predict(x, verbose=verbose, **kwargs)
+
+
+def load_model(path, backend=None, threads=None):
+    """Drop-in for tensorflow.keras.models.load_model that defers the actual load."""
+    return LazyModel(path, backend, threads)
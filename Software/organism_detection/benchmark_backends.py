@@ -0,0 +1,93 @@
+# benchmark_backends.py
+# Compare startup time, memory and per-batch latency of every available model
+# runtime. Each backend runs in its own child process so imports and RSS don't
+# leak between measurements.
+#   python benchmark_backends.py [--batch-sizes 1 8 32] [--repeats 20]
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.backends import converted_path, open_backend
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "microbe_model.h5")
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except ImportError:  # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def run_child(backend, path, batch_sizes, repeats):
+    start = time.perf_counter()
+    model = open_backend(path, backend)  # includes importing the runtime
+    startup = time.perf_counter() - start
+    h, w, c = model.input_shape[1:]
+    rng = np.random.default_rng(0)
+    latency = {}
+    for n in batch_sizes:
+        x = rng.random((n, h, w, c), dtype=np.float32)
+        model.predict(x)  # warm-up / tensor allocation for this batch size
+        times = []
+        for _ in range(repeats):
+            t = time.perf_counter()
+            model.predict(x)
+            times.append(time.perf_counter() - t)
+        latency[n] = float(np.median(times))
+    print(json.dumps({"startup_s": startup, "peak_rss_mb": peak_rss_mb(), "latency_s": latency}))
+
+
+def candidates(h5_path):
+    found = [("keras", h5_path)]
+    for backend in ("tflite", "onnx"):
+        for quantize in (None, "float16", "int8"):
+            p = converted_path(h5_path, backend, quantize)
+            if os.path.exists(p):
+                found.append((backend, p))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model runtimes")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--child", nargs=2, metavar=("BACKEND", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.batch_sizes, args.repeats)
+        return
+
+    header = f"{'backend':<8} {'file':<30} {'startup':>9} {'peak RSS':>10} " + \
+             " ".join(f"{'b=' + str(n):>10}" for n in args.batch_sizes)
+    print(header)
+    print("-" * len(header))
+    for backend, path in candidates(args.model):
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", backend, path,
+               "--repeats", str(args.repeats), "--batch-sizes"] + [str(n) for n in args.batch_sizes]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        name = os.path.basename(path)
+        if proc.returncode != 0:
+            reason = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+            print(f"{backend:<8} {name:<30} unavailable: {reason}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        lat = " ".join(f"{r['latency_s'][str(n)] * 1000:>8.2f}ms" for n in args.batch_sizes)
+        print(f"{backend:<8} {name:<30} {r['startup_s']:>8.2f}s {r['peak_rss_mb']:>8.0f}MB {lat}")
+
+
+if __name__ == "__main__":
+    main()
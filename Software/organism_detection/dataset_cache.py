@@ -0,0 +1,177 @@
+# dataset_cache.py
+# One-time packing of an image folder (e.g. datasets/train) into contiguous,
+# memory-mapped NumPy arrays:
+#   <name>_images.npy  uint8 (N, 64, 64, 3), BGR like cv2.imread
+#   <name>_labels.npy  int16 (N,), index into class_names, -1 = unreadable file
+#   <name>_index.json  filenames, class names and a per-file size/mtime record
+# The cache is keyed by a hash of every source file's size and mtime; when
+# files change only the new or modified ones are decoded again.
+#
+#   python dataset_cache.py                      # build train/val/test caches
+#   python dataset_cache.py --splits train
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(BASE_DIR, "..", "..", "datasets")
+CACHE_DIR = os.path.join(DATASET_DIR, ".cache")
+IMG_SIZE = 64
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+CACHE_VERSION = 1
+
+
+def scan(folder):
+    """Sorted (relpath, class_name, size, mtime_ns) for every image in `folder`.
+
+    Images in class subfolders get the subfolder name; images directly in
+    `folder` get the class name "".
+    """
+    entries = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        rel_root = os.path.relpath(root, folder)
+        class_name = "" if rel_root == "." else rel_root.split(os.sep)[0]
+        for f in sorted(files):
+            if f.lower().endswith(IMAGE_EXTENSIONS):
+                st = os.stat(os.path.join(root, f))
+                rel = f if rel_root == "." else os.path.join(rel_root, f)
+                entries.append((rel.replace(os.sep, "/"), class_name, st.st_size, st.st_mtime_ns))
+    return entries
+
+
+def fingerprint(entries, size):
+    h = hashlib.sha1(f"v{CACHE_VERSION}:{size}".encode())
+    for rel, _, st_size, mtime in entries:
+        h.update(f"{rel}\0{st_size}\0{mtime}\n".encode())
+    return h.hexdigest()
+
+
+class DatasetCache:
+    """Memory-mapped view of one cached split; slicing `images` never copies."""
+
+    def __init__(self, cache_dir, name):
+        self.name = name
+        with open(os.path.join(cache_dir, f"{name}_index.json")) as f:
+            self.index = json.load(f)
+        self.images = np.load(os.path.join(cache_dir, f"{name}_images.npy"), mmap_mode="r")
+        self.labels = np.load(os.path.join(cache_dir, f"{name}_labels.npy"), mmap_mode="r")
+        self.filenames = [e[0] for e in self.index["files"]]
+        self.class_names = self.index["class_names"]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def rows_for(self, class_name):
+        """Contiguous (start, stop) rows of one class (files are stored grouped by class).
+
+        The range may include unreadable files; mask them with labels >= 0.
+        """
+        rows = [i for i, e in enumerate(self.index["files"]) if e[1] == class_name]
+        return (rows[0], rows[-1] + 1) if rows else (0, 0)
+
+    def close(self):
+        # drop the mmaps so the files can be replaced (needed on Windows)
+        self.images = self.labels = None
+
+
+def _decode(path, size):
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    return cv2.resize(img, (size, size))  # same interpolation as inference.preprocess_frame
+
+
+def build(folder, cache_dir=CACHE_DIR, name=None, size=IMG_SIZE, workers=4):
+    """Return the cache of `folder`, (re)building only files that changed since the last run."""
+    name = name or os.path.basename(os.path.normpath(folder))
+    os.makedirs(cache_dir, exist_ok=True)
+    entries = scan(folder)
+    fp = fingerprint(entries, size)
+
+    old = None
+    if os.path.exists(os.path.join(cache_dir, f"{name}_index.json")):
+        try:
+            old = DatasetCache(cache_dir, name)
+        except (OSError, ValueError):
+            old = None
+    if old is not None and old.index.get("fingerprint") == fp:
+        return old
+
+    class_names = sorted({c for _, c, _, _ in entries})
+    class_to_idx = {c: i for i, c in enumerate(class_names)}
+    n = len(entries)
+    images_tmp = os.path.join(cache_dir, f"{name}_images.tmp.npy")
+    images = np.lib.format.open_memmap(images_tmp, mode="w+", dtype=np.uint8, shape=(n, size, size, 3))
+    labels = np.array([class_to_idx[c] for _, c, _, _ in entries], dtype=np.int16)
+
+    # Reuse rows for files whose size and mtime haven't changed
+    reused = 0
+    todo = list(range(n))
+    if old is not None and old.index.get("size") == size:
+        previous = {e[0]: (row, e[2], e[3]) for row, e in enumerate(old.index["files"])}
+        new_rows, old_rows, todo = [], [], []
+        for row, (rel, _, st_size, mtime) in enumerate(entries):
+            hit = previous.get(rel)
+            if hit and hit[1:] == (st_size, mtime) and old.labels[hit[0]] >= 0:
+                new_rows.append(row)
+                old_rows.append(hit[0])
+            else:
+                todo.append(row)
+        if new_rows:
+            images[new_rows] = old.images[old_rows]
+            reused = len(new_rows)
+    if old is not None:
+        old.close()
+
+    def fill(row):
+        img = _decode(os.path.join(folder, entries[row][0]), size)
+        if img is None:
+            labels[row] = -1
+        else:
+            images[row] = img
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fill, todo))
+    images.flush()
+    del images
+
+    os.replace(images_tmp, os.path.join(cache_dir, f"{name}_images.npy"))
+    np.save(os.path.join(cache_dir, f"{name}_labels.npy"), labels)
+    index = {"version": CACHE_VERSION, "size": size, "fingerprint": fp, "source": os.path.abspath(folder),
+             "channels": "BGR", "class_names": class_names, "files": entries}
+    index_tmp = os.path.join(cache_dir, f"{name}_index.json.tmp")
+    with open(index_tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(index_tmp, os.path.join(cache_dir, f"{name}_index.json"))
+
+    unreadable = int((labels < 0).sum())
+    print(f"Cache '{name}': {n} images ({reused} reused, {len(todo)} decoded, {unreadable} unreadable)")
+    return DatasetCache(cache_dir, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack dataset splits into memory-mapped arrays")
+    parser.add_argument("--data", default=DATASET_DIR, help="folder with the split folders (default: %(default)s)")
+    parser.add_argument("--splits", nargs="+", default=["train", "val", "test"])
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--size", type=int, default=IMG_SIZE)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    for split in args.splits:
+        folder = os.path.join(args.data, split)
+        if not os.path.isdir(folder):
+            print(f"⚠️ Skipping missing split folder: {folder}")
+            continue
+        build(folder, args.cache_dir, split, args.size, args.workers)
+    print(f"✅ Dataset cache ready in {os.path.abspath(args.cache_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
 # detect_from_images.py (robust debug version)
-import os, json, numpy as np, cv2
-from tensorflow.keras.models import load_model
+import os, sys, json, argparse, time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.backends import load_model  # TFLite/ONNX if exported, else Keras
+from organism_detection.inference import ClassificationEngine, DEFAULT_BATCH_SIZE
+from organism_detection.pipeline import DEFAULT_WORKERS
+from organism_detection import dataset_cache
 
 BASE = r"C:\Users\msuha\Downloads\SIH\Software\organism_detection"
 MODEL_PATH = os.path.join(BASE, "microbe_model.h5")
 MAPPING_PATH = os.path.join(BASE, "class_indices.json")
 IMAGES_DIR = os.path.join(BASE, "images")
 
+parser = argparse.ArgumentParser(description="Classify every image in the images folder")
+parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                    help="images per model.predict call (default: %(default)s)")
+parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                    help="decode threads feeding the model, 0 = decode on the main thread (default: %(default)s)")
+parser.add_argument("--cache", action="store_true",
+                    help="read images from the memory-mapped dataset cache (built/refreshed on demand)")
+args = parser.parse_args()
+
 # Load model and mapping
 model = load_model(MODEL_PATH)
 print("Model loaded. input_shape:", model.input_shape, "output_shape:", model.output_shape)
@@ -21,41 +35,40 @@ idx_to_label = {int(v): k for k, v in label_to_index.items()}
 # Initialize counters
 final_counts = {label: 0 for label in label_to_index.keys()}
 
-# Preprocess helper
-def preprocess(path):
-    img = cv2.imread(path)
-    if img is None:
-        return None
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    h, w = model.input_shape[1], model.input_shape[2]
-    img = cv2.resize(img, (w, h))
-    img = img.astype("float32") / 255.0
-    return np.expand_dims(img, axis=0)
+# Model was trained on RGB input (Keras ImageDataGenerator)
+engine = ClassificationEngine(model, idx_to_label, batch_size=args.batch_size, rgb=True,
+                              workers=args.workers)
 
 # Confirm images folder
 if not os.path.isdir(IMAGES_DIR):
     raise SystemExit("Images folder not found: " + IMAGES_DIR)
 
 files = sorted([f for f in os.listdir(IMAGES_DIR) if f.lower().endswith((".png", ".jpg", ".jpeg"))])
-print("Found", len(files), "test images")
+print("Found", len(files), "test images", f"(batch size {engine.batch_size})")
 
-for fname in files:
-    path = os.path.join(IMAGES_DIR, fname)
+start = time.perf_counter()
+if args.cache:
+    cache = dataset_cache.build(IMAGES_DIR, name="images", size=model.input_shape[1])
+    species_arr, probs = engine.classify_array(cache.images)
+    readable = cache.labels >= 0
+    results = [(os.path.basename(f), s if ok else None, float(p))
+               for f, s, p, ok in zip(cache.filenames, species_arr, probs, readable)]
+else:
+    paths = [os.path.join(IMAGES_DIR, fname) for fname in files]
+    results = engine.classify(paths)
+for fname, species, prob in results:
     print("\nProcessing:", fname)
-    x = preprocess(path)
-    if x is None:
+    if species is None:
         print("  ERROR: cannot read image")
         continue
-    print("  image shape after prep:", x.shape, "min/max:", x.min(), x.max())
-    preds = model.predict(x, verbose=0)[0]
-    print("  raw preds:", preds)
-    pred_idx = int(np.argmax(preds))
-    pred_prob = float(preds[pred_idx])
-    species = idx_to_label.get(pred_idx, "Unknown")
-    print(f"  predicted index={pred_idx}, species={species}, prob={pred_prob:.4f}")
+    print(f"  species={species}, prob={prob:.4f}")
 
     if species != "Unknown":
         final_counts[species] += 1
+elapsed = time.perf_counter() - start
+if files:
+    print(f"\nClassified {len(files)} images in {elapsed:.2f}s ({len(files) / max(elapsed, 1e-9):.1f} images/sec)")
+    print(engine.report())
 
 # Final summary
 print("\n===== Final Results =====")
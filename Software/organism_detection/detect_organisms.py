@@ -1,22 +1,31 @@
+import os
+import sys
+import argparse
 import cv2
 import numpy as np
-import tensorflow as tf
 
-# Load the dummy model
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from webcam_feed.frame_grabber import FrameGrabber
+from organism_detection.backends import load_model
+from sample_analysis.live_worker import LiveAnalyzer, AnalysisPolicy
+
+parser = argparse.ArgumentParser(description="Live microbe detection")
+parser.add_argument("--source", default="0", help="camera index, video file or image folder (default: %(default)s)")
+parser.add_argument("--every-n", type=int, default=1, help="predict on at most every Nth frame (default: %(default)s)")
+parser.add_argument("--max-hz", type=float, default=None, help="at most this many predictions per second")
+args = parser.parse_args()
+
+# Load the dummy model (lazily, on the first prediction; prefers an exported TFLite/ONNX file)
 MODEL_PATH = "microbe_model.h5"
-model = tf.keras.models.load_model(MODEL_PATH)
+model = load_model(MODEL_PATH)
 
 # Instead of loading metadata.csv, just define dummy classes
 CLASS_NAMES = ["Bacteria", "Algae", "Protozoa"]
 
-# Open webcam
-cap = cv2.VideoCapture(0)
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
+# Open webcam, read on a background thread (latest frame wins)
+cap = FrameGrabber(args.source).start()
 
+def predict_label(frame):
     # Preprocess frame
     img = cv2.resize(frame, (64, 64))
     img = img / 255.0
@@ -25,16 +34,32 @@ while True:
     # Run prediction
     preds = model.predict(img, verbose=0)
     class_id = np.argmax(preds)
-    label = CLASS_NAMES[class_id]
+    return CLASS_NAMES[class_id]
+
+# Prediction runs on a worker thread; the display keeps up with the camera
+# and shows the most recent label.
+analyzer = LiveAnalyzer(predict_label, AnalysisPolicy(every_n=args.every_n, max_hz=args.max_hz))
+
+while True:
+    frame_id, captured_at, frame = cap.read_latest()
+    if frame is None:
+        break
+
+    analyzer.offer(frame_id, captured_at, frame)
 
     # Show prediction on frame
-    cv2.putText(frame, f"Detected: {label}", (10, 40),
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    if analyzer.latest:
+        label, latency = analyzer.latest.value, analyzer.latest.latency
+        cv2.putText(frame, f"Detected: {label} ({latency * 1000:.0f} ms)", (10, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
 
     cv2.imshow("Microbe Detection", frame)
 
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
+analyzer.close()
+print(analyzer.stats())
+print(cap.stats())
 cap.release()
 cv2.destroyAllWindows()
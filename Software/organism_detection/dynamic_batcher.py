@@ -0,0 +1,96 @@
+# dynamic_batcher.py
+# Collects classifier inputs from many concurrent callers (HTTP request
+# threads) and runs them through the model as one batch. The first waiting
+# input opens a batch; more are gathered for at most `max_wait` seconds or
+# until `max_batch` rows are queued, then a single predict call serves them all.
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT = 0.005  # seconds
+
+_STOP = object()
+
+
+class DynamicBatcher:
+    """Batch rows from concurrent submit() calls into one `predict(batch)` call.
+
+    `predict` takes a float32 (N, h, w, c) array and returns (indices,
+    confidences), e.g. ClassificationEngine.predict_batch. It is only ever
+    called from the batcher thread, so the model needs no locking.
+    """
+
+    def __init__(self, predict, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT):
+        self.predict = predict
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self.batch_sizes = np.zeros(self.max_batch + 1, dtype=np.int64)  # last bin: oversized requests
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="dynamic-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows):
+        """Queue (n, h, w, c) rows; the Future resolves to (indices, confidences) for them."""
+        future = Future()
+        self._queue.put((np.asarray(rows, dtype="float32"), future))
+        return future
+
+    def _gather(self, first):
+        items, n = [first], len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while n < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # finish this batch, stop on the next round
+                break
+            items.append(item)
+            n += len(item[0])
+        return items, n
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            items, n = self._gather(first)
+            batch = items[0][0] if len(items) == 1 else np.concatenate([rows for rows, _ in items])
+            try:
+                indices, confidences = self.predict(batch)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += n
+            self.batch_sizes[min(n, self.max_batch)] += 1
+            start = 0
+            for rows, future in items:
+                stop = start + len(rows)
+                future.set_result((indices[start:stop], confidences[start:stop]))
+                start = stop
+
+    @property
+    def queued(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {"batches": self.batches, "rows": self.rows,
+                "mean_batch": self.rows / self.batches if self.batches else 0.0,
+                "batch_size_histogram": {str(i): int(c) for i, c in enumerate(self.batch_sizes) if c},
+                "queued": self.queued}
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5.0)
@@ -0,0 +1,225 @@
+# evaluate.py
+# Accuracy and speed of the counting + classification pipeline on fixed data,
+# written as JSON so runs can be compared:
+#   datasets/test/<species>/*  -> accuracy, per-class precision/recall, confusion matrix
+#   organism_detection/images  -> unlabeled, speed and counts only
+# For every image the decode, preprocess and count stages are timed
+# separately; inference is timed per model.predict batch.
+#
+#   python evaluate.py --output eval.json
+#   python evaluate.py --baseline eval_baseline.json --fail-on-regression
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.backends import load_model
+from organism_detection.inference import ClassificationEngine, DEFAULT_BATCH_SIZE, preprocess_frame
+from organism_detection.benchmark_backends import peak_rss_mb
+from organism_detection.dataset_cache import scan
+from sample_analysis.counting import BlobFilter, count_microbes
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "microbe_model.h5")
+MAPPING_PATH = os.path.join(BASE_DIR, "class_indices.json")
+TEST_DIR = os.path.join(BASE_DIR, "..", "..", "datasets", "test")
+IMAGES_DIR = os.path.join(BASE_DIR, "images")
+PERCENTILES = (50, 95, 99)
+
+# metric path -> True if bigger is better; used by the baseline comparison
+COMPARED = {
+    ("accuracy",): True,
+    ("throughput_images_per_s",): True,
+    ("latency_ms", "decode", "p95"): False,
+    ("latency_ms", "preprocess", "p95"): False,
+    ("latency_ms", "count", "p95"): False,
+    ("latency_ms", "infer_batch", "p95"): False,
+}
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return {"n": 0}
+    ms = np.asarray(seconds) * 1000.0
+    out = {"n": len(ms), "mean": float(ms.mean())}
+    for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+        out[f"p{p}"] = float(v)
+    return out
+
+
+def classification_metrics(true, pred):
+    """Accuracy, per-class precision/recall and a confusion matrix for labeled images."""
+    classes = sorted(set(true) | set(pred))
+    pos = {c: i for i, c in enumerate(classes)}
+    confusion = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    np.add.at(confusion, ([pos[t] for t in true], [pos[p] for p in pred]), 1)
+    hits = np.diag(confusion)
+    predicted, actual = confusion.sum(axis=0), confusion.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, hits / predicted, 0.0)
+        recall = np.where(actual > 0, hits / actual, 0.0)
+    return {
+        "accuracy": float(hits.sum() / max(1, confusion.sum())),
+        "per_class": {c: {"precision": float(precision[i]), "recall": float(recall[i]), "support": int(actual[i])}
+                      for i, c in enumerate(classes)},
+        "confusion_matrix": {"labels": classes, "matrix": confusion.tolist()},
+    }
+
+
+def evaluate_folder(folder, engine, blob_filter, batch_size):
+    """Run decode -> preprocess -> count -> infer over every image in `folder`."""
+    entries = scan(folder)
+    w, h = engine.input_size
+    batch = np.empty((batch_size, h, w, 3), dtype="float32")
+    timings = {"decode": [], "preprocess": [], "count": [], "infer_batch": []}
+    true, pred, counts = [], [], []
+    unreadable = 0
+
+    def run_batch(labels, filled):
+        start = time.perf_counter()
+        indices, _ = engine.predict_batch(batch[:filled])
+        timings["infer_batch"].append(time.perf_counter() - start)
+        for label, idx in zip(labels, indices):
+            species = engine.idx_to_class.get(int(idx), "Unknown")
+            if label:
+                true.append(label)
+                pred.append(species)
+
+    wall = time.perf_counter()
+    labels, filled = [], 0
+    for rel, class_name, _, _ in entries:
+        t0 = time.perf_counter()
+        img = cv2.imread(os.path.join(folder, rel))
+        t1 = time.perf_counter()
+        if img is None:
+            unreadable += 1
+            continue
+        preprocess_frame(img, engine.input_size, engine.rgb, out=batch[filled])
+        t2 = time.perf_counter()
+        count, _, _ = count_microbes(img, blob_filter)
+        t3 = time.perf_counter()
+        timings["decode"].append(t1 - t0)
+        timings["preprocess"].append(t2 - t1)
+        timings["count"].append(t3 - t2)
+        counts.append(count)
+        labels.append(class_name)
+        filled += 1
+        if filled == batch_size:
+            run_batch(labels, filled)
+            labels, filled = [], 0
+    if filled:
+        run_batch(labels, filled)
+    wall = time.perf_counter() - wall
+
+    images = len(counts)
+    result = {
+        "folder": os.path.abspath(folder),
+        "images": images,
+        "unreadable": unreadable,
+        "labeled": len(true),
+        "wall_s": wall,
+        "throughput_images_per_s": images / wall if wall > 0 else 0.0,
+        "latency_ms": {stage: latency_summary(t) for stage, t in timings.items()},
+        "mean_count": float(np.mean(counts)) if counts else 0.0,
+    }
+    if true:
+        result.update(classification_metrics(true, pred))
+    return result
+
+
+def _get(d, path):
+    for key in path:
+        if not isinstance(d, dict) or key not in d:
+            return None
+        d = d[key]
+    return d
+
+
+def compare(current, baseline, tolerance):
+    """Print metric deltas against a baseline run; returns the list of regressions."""
+    regressions = []
+    print(f"\n{'dataset':<10} {'metric':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, res in current["datasets"].items():
+        base = baseline.get("datasets", {}).get(name)
+        if base is None:
+            continue
+        for path, higher_is_better in COMPARED.items():
+            old, new = _get(base, path), _get(res, path)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / abs(old)
+            worse = -change if higher_is_better else change
+            flag = "  ⚠️" if worse > tolerance else ""
+            if flag:
+                regressions.append((name, ".".join(path), old, new))
+            print(f"{name:<10} {'.'.join(path):<28} {old:>10.4g} {new:>10.4g} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate accuracy and throughput of the analysis pipeline")
+    parser.add_argument("--test-dir", default=TEST_DIR, help="labeled species folders (default: %(default)s)")
+    parser.add_argument("--images-dir", default=IMAGES_DIR, help="unlabeled images (default: %(default)s)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--backend", default=None, help="force a model runtime (keras/tflite/onnx)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--rgb", action=argparse.BooleanOptionalAction, default=True,
+                        help="feed the model RGB like training does (default: %(default)s)")
+    parser.add_argument("--output", default=None, help="write the JSON report here (default: stdout only)")
+    parser.add_argument("--baseline", default=None, help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="relative change counted as a regression (default: %(default)s)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    with open(MAPPING_PATH) as f:
+        idx_to_class = {int(v): k for k, v in json.load(f).items()}
+    model = load_model(args.model, args.backend)
+    engine = ClassificationEngine(model, idx_to_class, batch_size=args.batch_size, rgb=args.rgb)
+    blob_filter = BlobFilter()
+
+    # Load the model before timing anything so startup isn't billed to the first batch
+    model.predict(np.zeros((1,) + tuple(model.input_shape[1:]), dtype="float32"))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"model": os.path.basename(args.model), "backend": model.backend.name,
+                   "batch_size": args.batch_size, "rgb": args.rgb,
+                   "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "datasets": {},
+    }
+    for name, folder in (("test", args.test_dir), ("images", args.images_dir)):
+        if not os.path.isdir(folder):
+            print(f"⚠️ Skipping missing folder: {folder}")
+            continue
+        res = evaluate_folder(folder, engine, blob_filter, args.batch_size)
+        report["datasets"][name] = res
+        line = f"{name}: {res['images']} images, {res['throughput_images_per_s']:.1f} images/sec"
+        if "accuracy" in res:
+            line += f", accuracy {res['accuracy']:.1%}"
+        print(line)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"✅ Report written to {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# export_model.py
+# Convert the trained Keras model into lighter runtime formats for the microscope box.
+#   python export_model.py                        -> microbe_model.tflite
+#   python export_model.py --quantize float16     -> microbe_model_float16.tflite
+#   python export_model.py --quantize int8        -> microbe_model_int8.tflite (calibrated on datasets/train)
+#   python export_model.py --format onnx          -> microbe_model.onnx (needs tf2onnx)
+import os
+import sys
+import argparse
+import random
+
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.backends import converted_path
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "microbe_model.h5")
+CALIBRATION_DIR = os.path.join(BASE_DIR, "..", "..", "datasets", "train")
+
+
+def calibration_images(folder, size, limit=200, rgb=True):
+    """Representative inputs for int8 calibration, preprocessed like inference."""
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths += [os.path.join(root, f) for f in files if f.lower().endswith((".png", ".jpg", ".jpeg"))]
+    random.Random(0).shuffle(paths)
+    for p in paths[:limit]:
+        img = cv2.imread(p)
+        if img is None:
+            continue
+        if rgb:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        img = cv2.resize(img, size).astype("float32") / 255.0
+        yield [img[None]]
+
+
+def export_tflite(model, out_path, quantize=None, calibration_dir=CALIBRATION_DIR):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        h, w = model.input_shape[1], model.input_shape[2]
+        if not os.path.isdir(calibration_dir):
+            raise SystemExit(f"int8 needs calibration images, folder not found: {calibration_dir}")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: calibration_images(calibration_dir, (w, h))
+        # int8 weights and activations; float32 in/out so callers don't change
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, out_path):
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=out_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export microbe_model.h5 to TFLite or ONNX")
+    parser.add_argument("--model", default=MODEL_PATH, help="Keras .h5 model (default: %(default)s)")
+    parser.add_argument("--format", choices=["tflite", "onnx"], default="tflite")
+    parser.add_argument("--quantize", choices=["float16", "int8"], default=None,
+                        help="TFLite only: post-training quantization")
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR,
+                        help="images for int8 calibration (default: %(default)s)")
+    args = parser.parse_args()
+
+    from tensorflow.keras.models import load_model
+    model = load_model(args.model)
+
+    out_path = converted_path(args.model, args.format, args.quantize if args.format == "tflite" else None)
+    if args.format == "tflite":
+        export_tflite(model, out_path, args.quantize, args.calibration_dir)
+    else:
+        export_onnx(model, out_path)
+    size_mb = os.path.getsize(out_path) / 1e6
+    print(f"✅ Exported {out_path} ({size_mb:.2f} MB, Keras .h5 was {os.path.getsize(args.model) / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,29 @@
 import os
+import sys
 import csv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection import raw_manifest
+
 # 🔹 Change this to the folder where your images are stored
 image_folder = r"C:\Users\msuha\Downloads\SIH\datasets\raw"
 
 # 🔹 Output CSV file (will be created in the same folder as the script)
 output_csv = "labels.csv"
 
+# Incremental listing shared with prepare_dataset.py; skip the rewrite if nothing changed
+manifest = raw_manifest.load(image_folder)
+if manifest.is_current("labels.csv", output_csv):
+    print(f"✅ {output_csv} is already up to date ({len(manifest.entries)} images)")
+    sys.exit(0)
+
 with open(output_csv, mode="w", newline="") as f:
     writer = csv.writer(f)
     writer.writerow(["filename", "species"])  # header row
 
-    for filename in os.listdir(image_folder):
-        if filename.lower().endswith((".jpg", ".jpeg", ".png", ".tif", ".bmp")):
-            # Extract species name from filename (before first underscore or dot)
-            species = filename.split("_")[0]
-            writer.writerow([filename, species])
+    # Species name is the filename part before the first underscore
+    for filename in sorted(manifest.entries):
+        writer.writerow([filename, manifest.entries[filename]["species"]])
 
+manifest.mark_built("labels.csv")
 print(f"✅ CSV file created: {output_csv}")
-
@@ -0,0 +1,203 @@
+# inference.py
+# Batched species classification shared by detect_from_images.py and
+# sample_analysis/analyze_and_classify.py.
+import os
+import time
+import numpy as np
+import cv2
+
+from organism_detection.pipeline import PrefetchPipeline, StageStats
+
+DEFAULT_BATCH_SIZE = 32
+
+
+def preprocess_frame(img, size, rgb=False, out=None):
+    """Resize a BGR frame to the model input size and scale it to [0, 1].
+
+    `size` is (width, height). If `out` is given, the result is written into
+    that float32 array instead of allocating a new one.
+    """
+    if rgb:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = cv2.resize(img, size)
+    if out is None:
+        out = np.empty(img.shape, dtype="float32")
+    np.multiply(img, 1.0 / 255.0, out=out)
+    return out
+
+
+def crop_batch(frame, boxes, size, pad=0.15, rgb=False):
+    """Cut every (x, y, w, h) box out of `frame` and resize them all in one gather.
+
+    Boxes are grown by `pad` (fraction of their size) on each side and clipped
+    to the frame. Resizing is nearest-neighbour through precomputed index
+    grids, so there is no per-crop Python work. Returns float32 (N, h, w, 3).
+    """
+    out_w, out_h = size
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    frame_h, frame_w = frame.shape[:2]
+    x, y, w, h = boxes.T
+    x0 = np.clip(x - w * pad, 0, frame_w - 1)
+    y0 = np.clip(y - h * pad, 0, frame_h - 1)
+    x1 = np.clip(x + w * (1 + pad), x0 + 1, frame_w)
+    y1 = np.clip(y + h * (1 + pad), y0 + 1, frame_h)
+    # Sample at pixel centres: (N, out_w) column and (N, out_h) row indices
+    xs = (x0[:, None] + (np.arange(out_w) + 0.5) * ((x1 - x0) / out_w)[:, None]).astype(np.intp)
+    ys = (y0[:, None] + (np.arange(out_h) + 0.5) * ((y1 - y0) / out_h)[:, None]).astype(np.intp)
+    np.minimum(xs, frame_w - 1, out=xs)
+    np.minimum(ys, frame_h - 1, out=ys)
+    crops = frame[ys[:, :, None], xs[:, None, :]]  # (N, out_h, out_w, 3)
+    if rgb:
+        crops = crops[..., ::-1]
+    return crops.astype("float32") * (1.0 / 255.0)
+
+
+class ClassificationEngine:
+    """Classify many images with one model.predict call per batch.
+
+    Items passed to classify() are image paths, (name, frame) tuples, or
+    sample objects with load()/classifier_input() (sample_analysis/sample.py). Results come back as (filename, species, confidence) in input
+    order; unreadable images yield (filename, None, None). With workers > 0,
+    decoding runs in a background thread pool (see pipeline.py) while the
+    calling thread runs inference.
+    """
+
+    def __init__(self, model, idx_to_class, batch_size=DEFAULT_BATCH_SIZE, rgb=True, workers=0):
+        self.model = model
+        self.idx_to_class = {int(k): v for k, v in idx_to_class.items()}
+        self.batch_size = max(1, int(batch_size))
+        self.rgb = rgb  # frames are BGR; the model was trained on RGB (train_model.py decodes RGB)
+        self.workers = workers
+        self._input_size = None
+        self._batch = None  # reused between batches, (re)allocated on batch size change
+        self.decode = StageStats("decode+resize")
+        self.infer = StageStats("inference")
+        self.wait = StageStats("inference waiting on input")
+
+    @property
+    def input_size(self):
+        """(width, height) the model expects; read lazily so the model loads on first use."""
+        if self._input_size is None:
+            h, w = self.model.input_shape[1], self.model.input_shape[2]
+            self._input_size = (w, h)
+        return self._input_size
+
+    def _load(self, item):
+        if isinstance(item, (str, os.PathLike)):
+            return os.path.basename(item), cv2.imread(str(item))
+        name, frame = item
+        return name, frame
+
+    def prepare(self, item, out):
+        """Decode `item` into the float32 row `out`; returns (name, ok)."""
+        if hasattr(item, "classifier_input"):
+            if not item.load():
+                return item.name, False
+            item.classifier_input(self.input_size, self.rgb, out=out)
+            return item.name, True
+        name, frame = self._load(item)
+        if frame is None:
+            return name, False
+        preprocess_frame(frame, self.input_size, self.rgb, out=out)
+        return name, True
+
+    def predict_batch(self, batch):
+        """Run the model on a stacked batch and return (indices, confidences)."""
+        start = time.perf_counter()
+        preds = self.model.predict(batch, verbose=0)
+        indices = np.argmax(preds, axis=1)
+        confidences = preds[np.arange(len(preds)), indices]
+        self.infer.add(len(batch), time.perf_counter() - start)
+        return indices, confidences
+
+    def _serial_batches(self, items):
+        w, h = self.input_size
+        if self._batch is None or len(self._batch) != self.batch_size:
+            self._batch = np.empty((self.batch_size, h, w, 3), dtype="float32")
+        pending = []  # (name, slot in self._batch or None if unreadable)
+        filled = 0
+        start = time.perf_counter()
+        for item in items:
+            name, ok = self.prepare(item, self._batch[filled])
+            pending.append((name, filled if ok else None))
+            if ok:
+                filled += 1
+            if filled == self.batch_size:
+                self.decode.add(len(pending), time.perf_counter() - start)
+                yield pending, filled, self._batch
+                pending, filled = [], 0
+                start = time.perf_counter()
+        # partial last batch
+        if pending:
+            self.decode.add(len(pending), time.perf_counter() - start)
+            yield pending, filled, self._batch
+
+    def classify(self, items):
+        """Yield (filename, species, confidence) for every item, in order."""
+        if self.workers > 0:
+            w, h = self.input_size
+            pipe = PrefetchPipeline(self.prepare, (self.batch_size, h, w, 3), workers=self.workers)
+            pipe.decode, pipe.wait = self.decode, self.wait
+            batches = pipe.batches(items)
+        else:
+            batches = self._serial_batches(items)
+
+        for pending, filled, batch in batches:
+            if filled:
+                indices, confidences = self.predict_batch(batch[:filled])
+            for name, slot in pending:
+                if slot is None:
+                    yield name, None, None
+                else:
+                    idx = int(indices[slot])
+                    yield name, self.idx_to_class.get(idx, "Unknown"), float(confidences[slot])
+
+    def classify_array(self, images):
+        """Classify uint8 BGR images already at the model input size, e.g. rows of a
+        dataset_cache.py memmap. Returns (species, confidences) arrays; each batch is
+        a zero-copy slice converted to float only for its own predict call.
+        """
+        species, confidences = [], []
+        for start in range(0, len(images), self.batch_size):
+            chunk = images[start:start + self.batch_size]
+            if self.rgb:
+                chunk = chunk[..., ::-1]
+            indices, conf = self.predict_batch(chunk.astype("float32") * (1.0 / 255.0))
+            species += [self.idx_to_class.get(int(i), "Unknown") for i in indices]
+            confidences.append(conf)
+        return np.array(species, dtype=object), (np.concatenate(confidences) if confidences else np.array([]))
+
+    def classify_one(self, frame, name="frame"):
+        """Classify a single in-memory frame; returns (species, confidence)."""
+        w, h = self.input_size
+        x = np.empty((1, h, w, 3), dtype="float32")
+        preprocess_frame(frame, self.input_size, self.rgb, out=x[0])
+        indices, confidences = self.predict_batch(x)
+        idx = int(indices[0])
+        return self.idx_to_class.get(idx, "Unknown"), float(confidences[0])
+
+    def classify_crops(self, frame, boxes, pad=0.15):
+        """Classify each box of `frame` in a single model.predict call.
+
+        Returns (species, confidences): an object array of names and a float array.
+        """
+        if len(boxes) == 0:
+            return np.array([], dtype=object), np.array([], dtype="float32")
+        crops = crop_batch(frame, boxes, self.input_size, pad=pad, rgb=self.rgb)
+        indices, confidences = self.predict_batch(crops)
+        lookup = np.array([self.idx_to_class.get(i, "Unknown") for i in range(int(indices.max()) + 1)],
+                          dtype=object)
+        return lookup[indices], confidences
+
+    def count_species(self, frame, boxes, pad=0.15):
+        """Per-species organism counts for the detected boxes of one frame."""
+        species, _ = self.classify_crops(frame, boxes, pad=pad)
+        names, counts = np.unique(species.astype(str), return_counts=True)
+        return dict(zip(names.tolist(), counts.tolist()))
+
+    def report(self):
+        """One line per stage so the slowest one stands out."""
+        lines = [str(self.decode), str(self.infer)]
+        if self.wait.seconds:
+            lines.append(f"{self.wait.name}: {self.wait.seconds:.2f}s")
+        return "\n".join(lines)
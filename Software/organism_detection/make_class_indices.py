@@ -1,25 +1,31 @@
 import os
+import sys
 import json
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection import raw_manifest
+
 # Path to your dataset
 DATASET_PATH = r"C:\Users\msuha\Downloads\SIH\datasets\raw"
+OUTPUT_PATH = r"C:\Users\msuha\Downloads\SIH\Software\organism_detection\class_indices.json"
 
-# Extract class names from folder structure OR from file names
-# Since your files are like "Yeast_5.png", we'll use prefixes
-classes = set()
-for fname in os.listdir(DATASET_PATH):
-    if fname.lower().endswith((".png", ".jpg", ".jpeg")):
-        label = fname.split("_")[0]  # part before underscore
-        classes.add(label)
+# Since your files are like "Yeast_5.png", we use the prefixes. The manifest is
+# shared with prepare_dataset.py and only rescans files that changed.
+manifest = raw_manifest.load(DATASET_PATH)
+if manifest.is_current("class_indices.json", OUTPUT_PATH):
+    print("✅ class_indices.json is already up to date")
+    sys.exit(0)
 
-classes = sorted(list(classes))  # sorted for consistent ordering
+classes = sorted({e["species"] for name, e in manifest.entries.items()
+                  if name.lower().endswith((".png", ".jpg", ".jpeg"))})  # sorted for consistent ordering
 
 # Create mapping
 class_indices = {cls: idx for idx, cls in enumerate(classes)}
 
 # Save to JSON
-with open(r"C:\Users\msuha\Downloads\SIH\Software\organism_detection\class_indices.json", "w") as f:
+with open(OUTPUT_PATH, "w") as f:
     json.dump(class_indices, f, indent=4)
 
+manifest.mark_built("class_indices.json")
 print("✅ class_indices.json created with the following mapping:")
 print(class_indices)
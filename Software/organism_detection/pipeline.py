@@ -0,0 +1,115 @@
+# pipeline.py
+# Producer/consumer prefetching: a thread pool decodes and resizes images into
+# a bounded queue of ready batches while the caller runs model inference.
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_BATCHES = 2
+
+_DONE = object()
+
+
+class StageStats:
+    """Images processed and busy seconds for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.images = 0
+        self.seconds = 0.0
+
+    def add(self, images, seconds):
+        self.images += images
+        self.seconds += seconds
+
+    @property
+    def rate(self):
+        return self.images / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.name}: {self.images} images in {self.seconds:.2f}s ({self.rate:.1f} images/sec)"
+
+
+class PrefetchPipeline:
+    """Fill batches in background threads, handing them over through a bounded queue.
+
+    `prepare(item, out)` must decode `item` into the float32 row `out` and
+    return (name, ok). At most `queue_batches` finished batches wait in the
+    queue, so memory stays flat no matter how many items are fed in.
+    """
+
+    def __init__(self, prepare, batch_shape, workers=DEFAULT_WORKERS, queue_batches=DEFAULT_QUEUE_BATCHES):
+        self.prepare = prepare
+        self.batch_shape = tuple(batch_shape)  # (batch_size, h, w, c)
+        self.workers = max(1, int(workers))
+        self.queue_batches = max(1, int(queue_batches))
+        self.decode = StageStats("decode+resize")
+        self.wait = StageStats("inference waiting on input")
+
+    def _chunks(self, items):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == self.batch_shape[0]:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _put(self, q, value, stop):
+        # Blocks while the queue is full (back-pressure) but gives up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                q.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, items, q, stop):
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for chunk in self._chunks(items):
+                    start = time.perf_counter()
+                    batch = np.empty(self.batch_shape, dtype="float32")
+                    results = list(pool.map(self.prepare, chunk, batch[:len(chunk)]))
+                    # Compact readable images to the front of the batch, keeping input order
+                    pending, filled = [], 0
+                    for row, (name, ok) in enumerate(results):
+                        if not ok:
+                            pending.append((name, None))
+                            continue
+                        if row != filled:
+                            batch[filled] = batch[row]
+                        pending.append((name, filled))
+                        filled += 1
+                    self.decode.add(len(chunk), time.perf_counter() - start)
+                    if not self._put(q, (pending, filled, batch), stop):
+                        return
+            self._put(q, _DONE, stop)
+        except BaseException as e:  # surface decode errors in the consumer thread
+            self._put(q, e, stop)
+
+    def batches(self, items):
+        """Yield (pending, filled, batch) tuples in input order."""
+        q = queue.Queue(maxsize=self.queue_batches)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(items, q, stop), daemon=True)
+        producer.start()
+        try:
+            while True:
+                start = time.perf_counter()
+                got = q.get()
+                if got is _DONE:
+                    return
+                if isinstance(got, BaseException):
+                    raise got
+                self.wait.add(got[1], time.perf_counter() - start)
+                yield got
+        finally:
+            stop.set()
+            producer.join()
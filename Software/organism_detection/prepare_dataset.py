@@ -1,44 +1,144 @@
+# prepare_dataset.py
+# Split datasets/raw into train/val/test/<species>/ folders.
+# The split of each file is a stable hash of its name and content (~70/20/10),
+# so it never changes between runs. Only new or changed files are linked or
+# copied, and an unchanged raw folder is a no-op. Any image under a split
+# folder that this split doesn't put there (raw file removed, or left over from
+# an earlier copy/split) is deleted, so no image ends up in two splits.
+#   python prepare_dataset.py                  # hardlink where possible
+#   python prepare_dataset.py --copy           # always make real copies
 import os
+import sys
+import json
 import shutil
-import random
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection import raw_manifest
 
 RAW_DIR = r"C:\Users\msuha\Downloads\SIH\datasets\raw"
 OUTPUT_DIR = r"C:\Users\msuha\Downloads\SIH\datasets"
 
-# Create train/val/test folders
-splits = ["train", "val", "test"]
-for split in splits:
-    split_path = os.path.join(OUTPUT_DIR, split)
-    os.makedirs(split_path, exist_ok=True)
-
-# Group images by species (from filename prefix before "_")
-species_map = {}
-for img_file in os.listdir(RAW_DIR):
-    if img_file.lower().endswith((".png", ".jpg", ".jpeg")):
-        species = img_file.split("_")[0]
-        species_map.setdefault(species, []).append(img_file)
-
-# Split 70% train, 20% val, 10% test
-for species, files in species_map.items():
-    random.shuffle(files)
-    n = len(files)
-    train_end = int(0.7 * n)
-    val_end = int(0.9 * n)
-
-    split_data = {
-        "train": files[:train_end],
-        "val": files[train_end:val_end],
-        "test": files[val_end:]
-    }
-
-    for split, split_files in split_data.items():
-        species_dir = os.path.join(OUTPUT_DIR, split, species)
-        os.makedirs(species_dir, exist_ok=True)
-
-        for f in split_files:
-            src = os.path.join(RAW_DIR, f)
-            dst = os.path.join(species_dir, f)
-            shutil.copy(src, dst)
-
-print("✅ Dataset prepared and split into train/val/test")
+SPLITS = (("train", 0.7), ("val", 0.9), ("test", 1.0))  # cumulative fractions
+EXTENSIONS = (".png", ".jpg", ".jpeg")
+STATE_FILE = ".prepared.json"  # dst relpath -> sha1 of what was placed there
+
+
+def assign_split(name, sha1):
+    """Deterministic split from the file name and content hash."""
+    h = hashlib.sha1(f"{name}\0{sha1}".encode()).hexdigest()
+    u = int(h[:8], 16) / 0x100000000
+    for split, upper in SPLITS:
+        if u < upper:
+            return split
+    return SPLITS[-1][0]
+
+
+def place(src, dst, link=True):
+    if os.path.lexists(dst):
+        os.remove(dst)  # never write through an old hardlink into the raw file
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if link:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:  # other volume / filesystem without hardlinks
+            pass
+    shutil.copy2(src, dst)
+
+
+def list_split_files(output_dir):
+    """Relative paths ("train/Species/x.png") of every image under the split folders."""
+    found = []
+    for split, _ in SPLITS:
+        root = os.path.join(output_dir, split)
+        for folder, _, files in os.walk(root):
+            for f in files:
+                if f.lower().endswith(EXTENSIONS):
+                    rel = os.path.relpath(os.path.join(folder, f), output_dir)
+                    found.append(rel.replace(os.sep, "/"))
+    return found
+
+
+def remove_empty_dirs(output_dir):
+    for split, _ in SPLITS:
+        root = os.path.join(output_dir, split)
+        for folder, dirs, files in os.walk(root, topdown=False):
+            if folder != root and not dirs and not files:
+                os.rmdir(folder)
+
+
+def check_disjoint(output_dir):
+    """{basename: [splits]} for every image found in more than one split."""
+    seen = {}
+    for rel in list_split_files(output_dir):
+        split, _, name = rel.split("/", 2)
+        seen.setdefault(os.path.basename(name), set()).add(split)
+    return {name: sorted(splits) for name, splits in seen.items() if len(splits) > 1}
+
+
+def prepare(raw_dir=RAW_DIR, output_dir=OUTPUT_DIR, link=True, workers=8):
+    manifest = raw_manifest.load(raw_dir, workers=workers)
+    state_path = os.path.join(output_dir, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+
+    wanted = {}
+    for name, e in manifest.entries.items():
+        if name.lower().endswith(EXTENSIONS):
+            dst = "/".join((assign_split(name, e["sha1"]), e["species"], name))
+            wanted[dst] = (name, e["sha1"])
+
+    todo = [dst for dst, (_, sha1) in wanted.items()
+            if state.get(dst) != sha1 or not os.path.exists(os.path.join(output_dir, dst))]
+    # Everything else under the split folders goes, whether or not we put it
+    # there: a first run must not keep an older split's copies next to the new ones
+    stale = [rel for rel in list_split_files(output_dir) if rel not in wanted]
+    for rel in stale:
+        os.remove(os.path.join(output_dir, rel))
+    if stale:
+        print(f"🧹 Removed {len(stale)} files not in this split, e.g. {', '.join(stale[:3])}")
+    remove_empty_dirs(output_dir)
+    state = {dst: sha1 for dst, sha1 in state.items() if dst in wanted}
+
+    def work(dst):
+        place(os.path.join(raw_dir, wanted[dst][0]), os.path.join(output_dir, dst), link)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for dst, _ in zip(todo, pool.map(work, todo)):
+            state[dst] = wanted[dst][1]
+
+    tmp = state_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path)
+
+    leaks = check_disjoint(output_dir)
+    if leaks:
+        examples = ", ".join(f"{n} ({'/'.join(s)})" for n, s in list(leaks.items())[:5])
+        raise SystemExit(f"❌ {len(leaks)} images are in more than one split: {examples}")
+
+    counts = {split: 0 for split, _ in SPLITS}
+    for dst in wanted:
+        counts[dst.split("/", 1)[0]] += 1
+    print(f"✅ Dataset prepared: {len(todo)} placed, {len(stale)} removed, "
+          f"{len(wanted) - len(todo)} already up to date "
+          f"(train {counts['train']}, val {counts['val']}, test {counts['test']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split datasets/raw into train/val/test")
+    parser.add_argument("--raw", default=RAW_DIR, help="flat folder of Species_N images (default: %(default)s)")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="where train/val/test go (default: %(default)s)")
+    parser.add_argument("--copy", action="store_true", help="copy files instead of hardlinking them")
+    parser.add_argument("--workers", type=int, default=8, help="parallel copy threads (default: %(default)s)")
+    args = parser.parse_args()
+    prepare(args.raw, args.output, link=not args.copy, workers=args.workers)
+
 
+if __name__ == "__main__":
+    main()
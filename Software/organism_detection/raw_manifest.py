@@ -0,0 +1,117 @@
+# raw_manifest.py
+# Incremental manifest of datasets/raw shared by prepare_dataset.py,
+# generate_metadata.py and make_class_indices.py. For every image it keeps
+# size, mtime, a content hash and the species (filename prefix before "_").
+# Only files whose size or mtime changed are read and hashed again, and each
+# script records the manifest fingerprint it last produced output for, so an
+# unchanged raw folder means no work at all.
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".bmp")
+MANIFEST_VERSION = 1
+
+
+def default_path(raw_dir):
+    """Manifest lives next to the raw folder, e.g. datasets/.raw_manifest.json."""
+    raw_dir = os.path.normpath(raw_dir)
+    return os.path.join(os.path.dirname(raw_dir), f".{os.path.basename(raw_dir)}_manifest.json")
+
+
+def species_of(filename):
+    return filename.split("_")[0]
+
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class RawManifest:
+    """Cached listing of a flat raw image folder.
+
+    `entries` maps filename -> {"size", "mtime_ns", "sha1", "species"}.
+    """
+
+    def __init__(self, raw_dir, path=None):
+        self.raw_dir = raw_dir
+        self.path = path or default_path(raw_dir)
+        self.entries = {}
+        self.outputs = {}  # script name -> fingerprint its output was built from
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.entries = data["entries"]
+                    self.outputs = data.get("outputs", {})
+            except (OSError, ValueError, KeyError):
+                pass  # corrupt manifest: rebuild from scratch
+
+    def update(self, workers=4):
+        """Rescan the folder, hashing only new or modified files. Returns (added, changed, removed) names."""
+        current = {}
+        with os.scandir(self.raw_dir) as it:
+            for e in it:
+                if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS):
+                    st = e.stat()
+                    current[e.name] = (st.st_size, st.st_mtime_ns)
+
+        added, changed = [], []
+        for name, (size, mtime) in current.items():
+            old = self.entries.get(name)
+            if old is None:
+                added.append(name)
+            elif (old["size"], old["mtime_ns"]) != (size, mtime):
+                changed.append(name)
+        removed = [name for name in self.entries if name not in current]
+
+        todo = added + changed
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes = pool.map(lambda n: file_hash(os.path.join(self.raw_dir, n)), todo)
+            for name, digest in zip(todo, hashes):
+                size, mtime = current[name]
+                self.entries[name] = {"size": size, "mtime_ns": mtime, "sha1": digest, "species": species_of(name)}
+        for name in removed:
+            del self.entries[name]
+        if todo or removed:
+            print(f"Manifest: {len(added)} new, {len(changed)} changed, {len(removed)} removed, "
+                  f"{len(current) - len(todo)} unchanged")
+        return added, changed, removed
+
+    def fingerprint(self):
+        h = hashlib.sha1()
+        for name in sorted(self.entries):
+            h.update(f"{name}\0{self.entries[name]['sha1']}\n".encode())
+        return h.hexdigest()
+
+    def is_current(self, output_name, output_path=None):
+        """True if `output_name` was last built from exactly this manifest (and its file still exists)."""
+        if output_path is not None and not os.path.exists(output_path):
+            return False
+        return self.outputs.get(output_name) == self.fingerprint()
+
+    def mark_built(self, output_name):
+        self.outputs[output_name] = self.fingerprint()
+        self.save()
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "raw_dir": os.path.abspath(self.raw_dir),
+                       "entries": self.entries, "outputs": self.outputs}, f)
+        os.replace(tmp, self.path)
+
+
+def load(raw_dir, path=None, workers=4):
+    """Open the manifest of `raw_dir`, bring it up to date and save it."""
+    manifest = RawManifest(raw_dir, path)
+    added, changed, removed = manifest.update(workers)
+    if added or changed or removed or not os.path.exists(manifest.path):
+        manifest.save()
+    return manifest
@@ -1,23 +1,197 @@
-# train_model.py (dummy version, no dataset needed)
+# train_model.py
+# Train the species classifier on datasets/train (validated on datasets/val)
+# with a streaming tf.data pipeline:
+#   file list -> parallel PNG/JPEG decode + resize -> on-disk cache of 64x64
+#   uint8 tensors -> shuffle -> batch -> vectorized augmentation -> prefetch
+# After the first epoch images come from the cache, so epoch time is model
+# compute rather than PNG decoding.
+#
+#   python train_model.py --epochs 30
+#   python train_model.py --dummy        # old behaviour: save an untrained 3-class model
+
+import os
+import json
+import time
+import hashlib
+import argparse
 
 import tensorflow as tf
 from tensorflow.keras import Sequential
-from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
+from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout, Input
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(BASE_DIR, "..", "..", "datasets")
+MODEL_PATH = os.path.join(BASE_DIR, "microbe_model.h5")
+CLASS_INDICES_PATH = os.path.join(BASE_DIR, "class_indices.json")
+CACHE_DIR = os.path.join(DATASET_DIR, ".tfcache")
+IMG_SIZE = 64
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+def build_model(num_classes):
+    model = Sequential([
+        Input(shape=(IMG_SIZE, IMG_SIZE, 3)),
+        Conv2D(16, (3, 3), activation='relu', padding='same'),
+        MaxPooling2D(2, 2),
+        Conv2D(32, (3, 3), activation='relu', padding='same'),
+        MaxPooling2D(2, 2),
+        Conv2D(64, (3, 3), activation='relu', padding='same'),
+        MaxPooling2D(2, 2),
+        Flatten(),
+        Dense(64, activation='relu'),
+        Dropout(0.3),
+        Dense(num_classes, activation='softmax'),
+    ])
+    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def list_split(split_dir, class_names):
+    """Paths and integer labels for every image of the known classes in a split folder."""
+    paths, labels = [], []
+    for idx, name in enumerate(class_names):
+        folder = os.path.join(split_dir, name)
+        if not os.path.isdir(folder):
+            continue
+        for f in sorted(os.listdir(folder)):
+            if f.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(folder, f))
+                labels.append(idx)
+    return paths, labels
+
+
+def decode_and_resize(path, label):
+    data = tf.io.read_file(path)
+    img = tf.io.decode_image(data, channels=3, expand_animations=False)  # RGB
+    img = tf.image.resize(img, (IMG_SIZE, IMG_SIZE))
+    return tf.cast(tf.round(img), tf.uint8), label
+
+
+def augment(images, labels):
+    """Random flips, 90-degree rotations and brightness on a whole uint8 batch at once."""
+    x = tf.image.convert_image_dtype(images, tf.float32)  # -> [0, 1], same scaling as inference
+    n = tf.shape(x)[0]
+    flip = tf.random.uniform((n, 1, 1, 1)) < 0.5
+    x = tf.where(flip, tf.reverse(x, axis=[2]), x)
+    flip = tf.random.uniform((n, 1, 1, 1)) < 0.5
+    x = tf.where(flip, tf.reverse(x, axis=[1]), x)
+    transpose = tf.random.uniform((n, 1, 1, 1)) < 0.5  # with the flips this covers all 90-degree turns
+    x = tf.where(transpose, tf.transpose(x, [0, 2, 1, 3]), x)
+    x = x + tf.random.uniform((n, 1, 1, 1), -0.1, 0.1)
+    return tf.clip_by_value(x, 0.0, 1.0), labels
+
+
+def to_float(images, labels):
+    return tf.image.convert_image_dtype(images, tf.float32), labels
+
+
+def cache_prefix(cache_dir, split, paths, labels):
+    """tf.data cache path keyed by every (path, size, mtime, label), so swapped or
+    relabelled images never train from stale tensors; older caches of the split are deleted."""
+    digest = hashlib.sha1()
+    for path, label in sorted(zip(paths, labels)):
+        st = os.stat(path)
+        digest.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\0{label}\n".encode())
+    name = f"{split}_{digest.hexdigest()[:16]}"
+    for entry in os.listdir(cache_dir):
+        if entry.startswith(f"{split}_") and not entry.startswith(name):
+            os.remove(os.path.join(cache_dir, entry))
+    return os.path.join(cache_dir, name)
+
+
+def make_dataset(paths, labels, batch_size, cache_file, training):
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(decode_and_resize, num_parallel_calls=AUTOTUNE, deterministic=False)
+    # uint8 64x64 tensors on disk: ~12 KB per image instead of re-decoding the PNG every epoch
+    ds = ds.cache(cache_file)
+    if training:
+        ds = ds.shuffle(min(len(paths), 4096), reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(augment if training else to_float, num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """Print images/sec for every epoch."""
+
+    def __init__(self, num_images):
+        super().__init__()
+        self.num_images = num_images
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self.start
+        print(f"  epoch {epoch + 1}: {self.num_images / elapsed:.1f} images/sec ({elapsed:.1f}s)")
+
+
+def save_dummy():
+    # Previous behaviour: untrained 3-class model, no dataset needed
+    model = Sequential([
+        Conv2D(16, (3,3), activation='relu', input_shape=(64,64,3)),
+        MaxPooling2D(2,2),
+        Flatten(),
+        Dense(32, activation='relu'),
+        Dropout(0.3),
+        Dense(3, activation='softmax')  # 3 classes (e.g. bacteria, algae, protozoa)
+    ])
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    model.save(MODEL_PATH)
+    print("✅ Dummy model created and saved as microbe_model.h5")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the microbe species classifier")
+    parser.add_argument("--data", default=DATASET_DIR, help="folder with train/ and val/ (default: %(default)s)")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="where decoded 64x64 tensors are cached between epochs and runs")
+    parser.add_argument("--output", default=MODEL_PATH)
+    parser.add_argument("--class-indices", default=None,
+                        help="where to write the class mapping (default: class_indices.json next to --output)")
+    parser.add_argument("--dummy", action="store_true", help="save an untrained 3-class model and exit")
+    args = parser.parse_args()
+
+    if args.dummy:
+        save_dummy()
+        return
+
+    train_dir = os.path.join(args.data, "train")
+    val_dir = os.path.join(args.data, "val")
+    if not os.path.isdir(train_dir):
+        raise SystemExit(f"Train dataset folder not found: {train_dir} (run prepare_dataset.py first)")
+
+    # Class index = position in the sorted train folder list, same as Keras' directory loaders
+    class_names = sorted(d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d)))
+    print("Classes:", class_names)
+
+    train_paths, train_labels = list_split(train_dir, class_names)
+    val_paths, val_labels = list_split(val_dir, class_names)
+    print(f"{len(train_paths)} training images, {len(val_paths)} validation images")
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    train_ds = make_dataset(train_paths, train_labels, args.batch_size,
+                            cache_prefix(args.cache_dir, "train", train_paths, train_labels), training=True)
+    val_ds = make_dataset(val_paths, val_labels, args.batch_size,
+                          cache_prefix(args.cache_dir, "val", val_paths, val_labels),
+                          training=False) if val_paths else None
 
-# Define a simple CNN model
-model = Sequential([
-    Conv2D(16, (3,3), activation='relu', input_shape=(64,64,3)),
-    MaxPooling2D(2,2),
-    Flatten(),
-    Dense(32, activation='relu'),
-    Dropout(0.3),
-    Dense(3, activation='softmax')  # 3 classes (e.g. bacteria, algae, protozoa)
-])
+    model = build_model(len(class_names))
+    model.fit(train_ds, validation_data=val_ds, epochs=args.epochs,
+              callbacks=[ThroughputLogger(len(train_paths))], verbose=2)
 
-# Compile it
-model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    # The mapping goes next to the model it belongs to, so a side-by-side run
+    # never replaces the one the deployed model uses
+    class_indices_path = args.class_indices or os.path.join(os.path.dirname(os.path.abspath(args.output)),
+                                                            os.path.basename(CLASS_INDICES_PATH))
+    model.save(args.output)
+    with open(class_indices_path, "w") as f:
+        json.dump({name: idx for idx, name in enumerate(class_names)}, f, indent=4)
+    print(f"✅ Model saved to {args.output}, class mapping saved to {class_indices_path}")
 
-# Save directly without training
-model.save("microbe_model.h5")
 
-print("✅ Dummy model created and saved as microbe_model.h5")
+if __name__ == "__main__":
+    main()
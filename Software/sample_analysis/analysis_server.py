@@ -0,0 +1,210 @@
+# analysis_server.py
+# Local HTTP service so several capture stations can share one analysis box
+# without loading TensorFlow themselves.
+#
+#   POST /analyze        body = encoded image (PNG/JPEG bytes)
+#                        ?name=slide1.png  ?per_organism=1
+#                        -> {"name", "species", "confidence", "count", "per_organism"?, "timings_ms"}
+#   GET  /health         -> {"status": "ok", "model_loaded": ...}
+#   GET  /metrics        -> request counters, per-stage latency, batcher batch sizes
+#
+# Counting runs on the request threads; classification inputs from all
+# concurrent requests go through one DynamicBatcher, so N simultaneous
+# uploads cost a single model.predict call.
+#   python analysis_server.py --port 8765
+#   curl --data-binary @slide.png "http://localhost:8765/analyze?name=slide.png"
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.backends import load_model
+from organism_detection.inference import ClassificationEngine, DEFAULT_BATCH_SIZE, preprocess_frame, crop_batch
+from organism_detection.dynamic_batcher import DynamicBatcher, DEFAULT_MAX_WAIT
+from sample_analysis.counting import count_microbes, BlobFilter, DEFAULT_MIN_AREA
+from sample_analysis.instrumentation import StageHistogram
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "..", "organism_detection", "microbe_model.h5")
+CLASS_INDICES_PATH = os.path.join(BASE_DIR, "..", "organism_detection", "class_indices.json")
+DEFAULT_PORT = 8765
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+STAGES = ("decode", "count", "classify", "total")
+
+
+class AnalysisService:
+    """Everything the request handlers share: model, batcher, filter and metrics."""
+
+    def __init__(self, engine, blob_filter, max_batch=DEFAULT_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT):
+        self.engine = engine
+        self.blob_filter = blob_filter
+        self.batcher = DynamicBatcher(engine.predict_batch, max_batch, max_wait)
+        self.latency = {stage: StageHistogram(stage) for stage in STAGES}
+        self.requests = 0
+        self.errors = 0
+        self.started = time.time()
+        self.ready = False  # set once the model has run its warm-up batch
+        self._lock = threading.Lock()
+
+    def _species(self, indices):
+        return [self.engine.idx_to_class.get(int(i), "Unknown") for i in indices]
+
+    def analyze(self, data, name="upload", per_organism=False):
+        t0 = time.perf_counter()
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("body is not a decodable image")
+        w, h = self.engine.input_size
+        row = np.empty((1, h, w, 3), dtype="float32")
+        preprocess_frame(img, self.engine.input_size, self.engine.rgb, out=row[0])
+        t1 = time.perf_counter()
+
+        # Queue the classification first so it batches with other requests while we count
+        whole = self.batcher.submit(row)
+        count, _, blobs = count_microbes(img, self.blob_filter)
+        crops = None
+        if per_organism and len(blobs):
+            crops = self.batcher.submit(crop_batch(img, blobs.bbox, self.engine.input_size, rgb=self.engine.rgb))
+        t2 = time.perf_counter()
+
+        indices, confidences = whole.result()
+        result = {"name": name, "species": self._species(indices)[0], "confidence": float(confidences[0]),
+                  "count": int(count)}
+        if per_organism:
+            names = self._species(crops.result()[0]) if crops is not None else []
+            species, counts = np.unique(np.array(names, dtype=str), return_counts=True)
+            result["per_organism"] = dict(zip(species.tolist(), counts.tolist()))
+        t3 = time.perf_counter()
+
+        timings = {"decode": t1 - t0, "count": t2 - t1, "classify": t3 - t2, "total": t3 - t0}
+        for stage, seconds in timings.items():
+            self.latency[stage].add(seconds)
+        result["timings_ms"] = {k: round(v * 1000, 2) for k, v in timings.items()}
+        return result
+
+    def count_request(self, ok):
+        with self._lock:
+            self.requests += 1
+            self.errors += not ok
+
+    def health(self):
+        return {"status": "ok", "model_loaded": self.ready,
+                "uptime_s": round(time.time() - self.started, 1)}
+
+    def metrics(self):
+        return {"requests": self.requests, "errors": self.errors,
+                "latency_ms": {stage: h.summary() for stage, h in self.latency.items()},
+                "batcher": self.batcher.stats()}
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None  # set by serve()
+    protocol_version = "HTTP/1.1"  # keep-alive for stations posting one slide after another
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, self.service.health())
+        elif path == "/metrics":
+            self._send_json(200, self.service.metrics())
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/analyze":
+            self._send_json(404, {"error": f"unknown endpoint {url.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.service.count_request(False)
+            self.close_connection = True  # the body's extent is unknown, so the stream can't be reused
+            self._send_json(400, {"error": "Content-Length is not a number"})
+            return
+        if not 0 < length <= MAX_UPLOAD_BYTES:
+            self.service.count_request(False)
+            self._send_json(400 if length == 0 else 413, {"error": "send the image bytes as the request body"})
+            return
+        data = self.rfile.read(length)
+        query = parse_qs(url.query)
+        name = query.get("name", ["upload"])[0]
+        per_organism = query.get("per_organism", ["0"])[0] in ("1", "true", "yes")
+        try:
+            result = self.service.analyze(data, name, per_organism)
+        except ValueError as e:
+            self.service.count_request(False)
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.service.count_request(False)
+            self._send_json(500, {"error": str(e)})
+            return
+        self.service.count_request(True)
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass  # one line per request would flood the console under load; see /metrics
+
+
+def serve(service, host="127.0.0.1", port=DEFAULT_PORT):
+    Handler.service = service
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP counting + classification service")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to accept other stations (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--backend", default=None, help="force a model runtime (keras/tflite/onnx)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="most images per model.predict call (default: %(default)s)")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1000,
+                        help="how long to hold a batch open for more requests (default: %(default)s)")
+    parser.add_argument("--min-area", type=float, default=DEFAULT_MIN_AREA,
+                        help="ignore blobs smaller than this many pixels (default: %(default)s)")
+    args = parser.parse_args()
+
+    with open(CLASS_INDICES_PATH) as f:
+        idx_to_class = {int(v): k for k, v in json.load(f).items()}
+    model = load_model(args.model, args.backend)
+    engine = ClassificationEngine(model, idx_to_class, rgb=True)  # RGB like training, as analyze_and_classify.py
+    service = AnalysisService(engine, BlobFilter(min_area=args.min_area), args.max_batch, args.max_wait_ms / 1000)
+
+    # Load the model before accepting requests so the first caller doesn't pay for it
+    engine.predict_batch(np.zeros((1,) + tuple(model.input_shape[1:]), dtype="float32"))
+    service.ready = True
+
+    server = serve(service, args.host, args.port)
+    print(f"✅ Analysis service on http://{args.host}:{args.port} (POST /analyze, GET /health, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down")
+    finally:
+        server.server_close()
+        service.batcher.close()
+        print(json.dumps(service.metrics()["batcher"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,28 @@
 import os
+import sys
+import argparse
 import cv2
 import json
-import numpy as np
-import csv
+import collections
 import warnings
 import logging
 import serial
 import time
-from tensorflow.keras.models import load_model
+import multiprocessing
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.backends import load_model, converted_path, BACKENDS, BACKEND_ENV
+from organism_detection.inference import ClassificationEngine, DEFAULT_BATCH_SIZE
+from organism_detection.pipeline import DEFAULT_WORKERS
+from sample_analysis.sample import Sample
+from sample_analysis.counting import BlobFilter, DEFAULT_MIN_AREA
+from sample_analysis.process_pool import ShardedAnalyzer, result_row, DEFAULT_CHUNK
+from sample_analysis.folder_watcher import FolderWatcher
+from sample_analysis.instrumentation import StageHistogram
+from sample_analysis.result_writer import ResultWriter, FORMATS
+from sample_analysis.result_cache import ResultCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, files_fingerprint
+from sample_analysis.results_store import ResultsStore, DEFAULT_STORE_PATH
+from serial_communication.binary_link import BinaryLink
 
 # --- Paths ---
 BASE_DIR = os.path.dirname(__file__)
@@ -15,106 +30,319 @@ MODEL_PATH = os.path.join(BASE_DIR, "..", "organism_detection", "microbe_model.h
 CLASS_INDICES_PATH = os.path.join(BASE_DIR, "..", "organism_detection", "class_indices.json")
 IMAGE_FOLDER = os.path.join(BASE_DIR, "images")  # folder with test images
 CSV_PATH = os.path.join(BASE_DIR, "analysis_results.csv")
+RESULT_COLUMNS = ["Filename", "Species", "Count", "Confidence (%)"]
 
 # --- Arduino Setup ---
-try:
-    arduino = serial.Serial(port="COM7", baudrate=9600, timeout=2)  # ⚠️ change COM port if needed
-    time.sleep(2)  # allow Arduino to reset
-    print("✅ Arduino connected on COM7")
-except Exception as e:
-    arduino = None
-    print("⚠️ Could not connect to Arduino:", e)
+# --processes workers started with "spawn" (Windows) re-import this script; only the parent owns the port
+arduino = None
+if multiprocessing.parent_process() is None:
+    try:
+        arduino = serial.Serial(port="COM7", baudrate=9600, timeout=2)  # ⚠️ change COM port if needed
+        time.sleep(2)  # allow Arduino to reset
+        print("✅ Arduino connected on COM7")
+    except Exception as e:
+        arduino = None
+        print("⚠️ Could not connect to Arduino:", e)
 
 # --- Load model ---
+# Loaded on first prediction; uses microbe_model.tflite/.onnx if export_model.py made one
 model = load_model(MODEL_PATH)
 
 # --- Load class indices mapping ---
 with open(CLASS_INDICES_PATH, "r") as f:
     class_indices = json.load(f)
+# Counts go out as binary frames keyed by these ids; a background thread batches,
+# acks and resends them so analysis never waits on the 9600 baud link
+serial_link = BinaryLink(arduino, class_indices) if arduino else None
 idx_to_class = {v: k for k, v in class_indices.items()}  # reverse mapping
+SPECIES_NAMES = [idx_to_class[i] for i in sorted(idx_to_class)]
 
-# --- Counting Function ---
-def count_microbes(image_path):
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    blurred = cv2.GaussianBlur(img, (5, 5), 0)
-    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    return len(contours), thresh, contours
+# --- Counting ---
+# count_microbes() lives in counting.py; main() sets the size/shape filter from the CLI
+blob_filter = BlobFilter()
 
 # --- Classification Function ---
-def classify_species(image_path):
-    img = cv2.imread(image_path)
-    img = cv2.resize(img, (64, 64))  # ✅ match your model's expected input size
-    img = img.astype("float32") / 255.0
-    img = np.expand_dims(img, axis=0)
-
-    preds = model.predict(img, verbose=0)
-    predicted_idx = int(np.argmax(preds))
-    predicted_species = idx_to_class.get(predicted_idx, "Unknown")
-    confidence = float(preds[0][predicted_idx])
+engine = ClassificationEngine(model, idx_to_class, rgb=True)  # BGR frames converted to RGB like training
+
+def classify_species(sample):
+    _, predicted_species, confidence = next(engine.classify([sample]))
     return predicted_species, confidence
 
 # --- Send to Arduino ---
 def send_to_arduino(species, count):
-    if arduino:
-        message = f"{species}:{count}\n"
-        arduino.write(message.encode())
-        print(f"📤 Sent to Arduino → {message.strip()}")
+    if serial_link:
+        serial_link.send_counts({species: count})  # a newer count for the same species replaces a queued one
+        print(f"📤 Queued for Arduino → {species}:{count}")
     else:
         print(f"(⚠️ Arduino not connected) {species}:{count}")
 
 
+# --- Results ---
+# Every reported row is also appended to the results store (results_store.py),
+# which keeps the history that --output overwrites; main() opens it
+results_store = None
+
+def report_row(row, writer, cache=None, hashes=None, blobs=None):
+    file, species, count, conf_percent = row[:4]
+    print(f"[{file}] → Species: {species} | Count: {count} | Confidence: {conf_percent}%")
+    if len(row) > 4:
+        print(f"    per organism: {dict((n, c) for n, c in zip(SPECIES_NAMES, row[4:]) if c)}")
+    writer.write(row)
+    if results_store:
+        results_store.append(file, species, count, conf_percent / 100, blobs)
+    if cache:
+        cache.put(hashes[file], row[1:])
+
+    # Send to Arduino
+    send_to_arduino(species, count)
+
+
+def reuse_cached(files, folder, cache, hashes, writer):
+    """Report every file with a cached result right away; returns the ones still to analyze."""
+    fresh = []
+    for f in files:
+        hashes[f] = cache.image_hash(os.path.join(folder, f))
+        value = cache.get(hashes[f])
+        if value is None:
+            fresh.append(f)
+            continue
+        species, count, conf_percent = value[:3]
+        print(f"[{f}] → Species: {species} | Count: {count} | Confidence: {conf_percent}% (cached)")
+        writer.write([f] + value)
+        if results_store:
+            results_store.append(f, species, count, conf_percent / 100)
+        send_to_arduino(species, count)
+    return fresh
+
+
+# --- Analysis loop ---
+def analyze(classified, in_flight, writer, headless, per_organism=False, tile=None, cache=None, hashes=None):
+    for file, species, conf in classified:
+        sample = in_flight.popleft()
+        if species is None:
+            print(f"[{file}] ⚠️ Could not read image")
+            continue
+
+        # Count microbes (tiled and per-organism classification if asked)
+        row, blobs = result_row(sample, species, conf, engine, blob_filter, per_organism, SPECIES_NAMES, tile)
+        _, species, count, conf_percent = row[:4]
+        report_row(row, writer, cache, hashes, blobs)
+
+        # --- Show image with contours + label ---
+        if headless:
+            sample.release()
+            continue
+        img_color = sample.draw_overlay(blobs.contours(), f"{species} ({conf_percent}%) Count:{count}")
+        sample.release()
+        cv2.imshow("Detection", img_color)
+
+        key = cv2.waitKey(0)  # waits for key press
+        if key == ord("q"):   # press q to quit early
+            break
+
+
+def analyze_parallel(paths, processes, args, writer, cache=None, hashes=None):
+    """Same results as analyze() but from a pool of worker processes, headless."""
+    config = {"model_path": MODEL_PATH, "backend": None, "idx_to_class": idx_to_class,
+              "batch_size": engine.batch_size, "rgb": engine.rgb, "blob_filter": vars(blob_filter),
+              "per_organism": args.per_organism, "species_names": SPECIES_NAMES, "tile": args.tile}
+    with ShardedAnalyzer(config, processes, args.chunk_size) as pool:
+        print(f"🧵 {pool.processes} worker processes, {pool.config['threads']} threads each")
+        for path, row, error in pool.run(paths):
+            if error:
+                print(f"[{os.path.basename(path)}] ⚠️ {error}")
+                continue
+            report_row(row, writer, cache, hashes)
+        if pool.failed:
+            print(f"⚠️ {len(pool.failed)} images failed after {pool.crashes} worker crashes")
+
+
+def watch(watcher, args, writer, cache=None, hashes=None):
+    """Analyze images as they land in the input folder, one micro-batch at a time."""
+    latency = StageHistogram("arrival to result")
+    late = 0
+    print(f"👀 Watching {args.input} for new images ({watcher.mode}). Press Ctrl+C to stop.")
+    try:
+        for batch in watcher.batches(engine.batch_size, args.max_batch_wait):
+            arrived = {os.path.basename(path): t for path, t in batch}
+            files = list(arrived)
+            if cache:
+                fresh = reuse_cached(files, args.input, cache, hashes, writer)
+                done_at = time.perf_counter()
+                for f in set(files) - set(fresh):
+                    latency.add(done_at - arrived[f])
+                files = fresh
+            samples = [Sample(os.path.join(args.input, f), headless=True) for f in files]
+            for sample, (file, species, conf) in zip(samples, engine.classify(samples)):
+                if species is None:
+                    print(f"[{file}] ⚠️ Could not read image")
+                else:
+                    row, blobs = result_row(sample, species, conf, engine, blob_filter, args.per_organism,
+                                            SPECIES_NAMES, args.tile)
+                    report_row(row, writer, cache, hashes, blobs)
+                sample.release()
+                seconds = time.perf_counter() - arrived[file]
+                latency.add(seconds)
+                late += seconds > args.max_latency
+            writer.flush()  # every result is on disk before the next batch starts
+            s = latency.summary()
+            print(f"⏱️ {len(batch)} new images | latency p50 {s['p50_ms']:.0f} / p95 {s['p95_ms']:.0f} / "
+                  f"max {s['max_ms']:.0f} ms | {watcher.pending} waiting")
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped watching")
+    finally:
+        watcher.stop()
+    s = latency.summary()
+    if s["count"]:
+        print(f"Watch mode: {s['count']} images, arrival to result p50 {s['p50_ms']:.0f} ms, "
+              f"p95 {s['p95_ms']:.0f} ms, p99 {s['p99_ms']:.0f} ms, "
+              f"{late} over the {args.max_latency:g}s budget")
+
+
 # --- Main ---
 def main():
-    results = []
+    parser = argparse.ArgumentParser(description="Count and classify microbes in sample images")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="images per model.predict call (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="decode threads feeding the model, 0 = decode inline (default: %(default)s)")
+    parser.add_argument("--headless", action="store_true",
+                        help="no windows or overlays, just print and save results")
+    parser.add_argument("--input", default=IMAGE_FOLDER, help="folder of sample images (default: %(default)s)")
+    parser.add_argument("--output", default=CSV_PATH, help="results file (default: %(default)s)")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from --output extension)")
+    parser.add_argument("--resume", action="store_true",
+                        help="append to an existing output file and skip samples already in it")
+    parser.add_argument("--flush-every", type=int, default=10,
+                        help="flush the output file every N rows (default: %(default)s)")
+    parser.add_argument("--min-area", type=float, default=DEFAULT_MIN_AREA,
+                        help="ignore blobs smaller than this many pixels (default: %(default)s)")
+    parser.add_argument("--max-area", type=float, default=None, help="ignore blobs larger than this many pixels")
+    parser.add_argument("--min-circularity", type=float, default=None,
+                        help="ignore blobs less round than this (0-1, 4*pi*area/perimeter^2)")
+    parser.add_argument("--per-organism", action="store_true",
+                        help="also classify each detected organism and add per-species count columns")
+    parser.add_argument("--tile", type=int, default=None,
+                        help="process large images as overlapping tiles of this many pixels (same counts as untiled)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="analyze in this many worker processes, 0 = one per CPU core; implies --headless "
+                             "(default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK,
+                        help="files handed to a worker process at a time (default: %(default)s)")
+    parser.add_argument("--watch", action="store_true",
+                        help="after the existing images, keep analyzing new ones as they land; implies --headless")
+    parser.add_argument("--settle", type=float, default=0.5,
+                        help="watch mode: seconds a file's size must stay unchanged before it is read "
+                             "(default: %(default)s)")
+    parser.add_argument("--max-batch-wait", type=float, default=0.25,
+                        help="watch mode: seconds to gather more files into a batch (default: %(default)s)")
+    parser.add_argument("--max-latency", type=float, default=5.0,
+                        help="watch mode: arrival-to-result budget in seconds; slower results are counted "
+                             "(default: %(default)s)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help="result cache database; unchanged images are not analyzed again (default: %(default)s)")
+    parser.add_argument("--cache-mb", type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="evict least recently used results above this size (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="analyze every image, don't read or write the cache")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                        help="append every result to this results store; query it with results_store.py "
+                             "(default: %(default)s)")
+    parser.add_argument("--no-store", action="store_true", help="don't append results to the store")
+    args = parser.parse_args()
+    if args.watch or args.processes != 1:
+        args.headless = True
+    engine.batch_size = max(1, args.batch_size)
+    engine.workers = args.workers
+    blob_filter.min_area, blob_filter.max_area = args.min_area, args.max_area
+    blob_filter.min_circularity = args.min_circularity
 
     # Suppress warnings
     cv2.setNumThreads(0)
     logging.getLogger("PIL").setLevel(logging.ERROR)
     warnings.filterwarnings("ignore", category=UserWarning)
 
-    found_any = False
-    for file in os.listdir(IMAGE_FOLDER):
-        if file.lower().endswith((".jpg", ".jpeg", ".png")):
-            path = os.path.join(IMAGE_FOLDER, file)
+    files = sorted(f for f in os.listdir(args.input) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+
+    # Start watching before the first pass so files landing meanwhile aren't missed
+    watcher = FolderWatcher(args.input, settle=args.settle).start(ignore=files) if args.watch else None
 
-            # Count microbes
-            count, thresh, contours = count_microbes(path)
+    # Rows are written as soon as each sample is done, not at the end
+    columns = RESULT_COLUMNS + ([f"{name} Count" for name in SPECIES_NAMES] if args.per_organism else [])
+    try:
+        writer = ResultWriter(args.output, columns, fmt=args.format, resume=args.resume,
+                              flush_every=args.flush_every)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    if writer.done:
+        skipped = len(files)
+        files = [f for f in files if f not in writer.done]
+        print(f"↩️ Resuming: {skipped - len(files)} samples already in {args.output}")
 
-            # Classify species
-            species, conf = classify_species(path)
-            conf_percent = round(conf * 100, 2)
+    global results_store
+    results_store = None if args.no_store else ResultsStore(args.store)
 
-            # Print result
-            print(f"[{file}] → Species: {species} | Count: {count} | Confidence: {conf_percent}%")
-            results.append([file, species, count, conf_percent])
+    # --- Result cache ---
+    # Keyed by image content + model files + settings: a new model or threshold
+    # only misses for results computed with the old one.
+    cache, hashes = None, {}
+    if not args.no_cache:
+        model_files = [MODEL_PATH, CLASS_INDICES_PATH] + [converted_path(MODEL_PATH, b, q) for b in BACKENDS
+                                                          for q in (None, "float16", "int8") if b != "keras"]
+        params = {"filter": vars(blob_filter), "tile": args.tile, "rgb": engine.rgb,
+                  "backend": os.environ.get(BACKEND_ENV),
+                  "per_organism": SPECIES_NAMES if args.per_organism else None}
+        cache = ResultCache(args.cache, files_fingerprint(model_files), params,
+                            max_bytes=int(args.cache_mb * 1024 * 1024))
+        fresh = reuse_cached(files, args.input, cache, hashes, writer)
+        if cache.hits:
+            print(f"♻️ {cache.hits} cached results reused, {len(fresh)} images to analyze")
+        files = fresh
 
-            # Send to Arduino
-            send_to_arduino(species, count)
+    # Each file is decoded once (in the engine's decode workers) and the same
+    # Sample is handed back here for counting and the overlay.
+    in_flight = collections.deque()
 
-            # --- Show image with contours + label ---
-            img_color = cv2.imread(path)
-            cv2.drawContours(img_color, contours, -1, (0, 255, 0), 1)
-            cv2.putText(img_color, f"{species} ({conf_percent}%) Count:{count}", (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            cv2.imshow("Detection", img_color)
+    def samples():
+        for f in files:
+            sample = Sample(os.path.join(args.input, f), headless=args.headless)
+            in_flight.append(sample)
+            yield sample
 
-            key = cv2.waitKey(0)  # waits for key press
-            if key == ord("q"):   # press q to quit early
-                break
-            found_any = True
+    try:
+        if args.processes != 1:
+            analyze_parallel([os.path.join(args.input, f) for f in files], args.processes or None, args,
+                             writer, cache, hashes)
+        else:
+            # Classification runs a batch ahead of counting/display
+            analyze(engine.classify(samples()), in_flight, writer, args.headless, args.per_organism, args.tile,
+                    cache, hashes)
+        if watcher:
+            writer.flush()
+            watch(watcher, args, writer, cache, hashes)
+    finally:
+        if watcher:
+            watcher.stop()
+        writer.close()
+        if results_store:
+            results_store.close()
+            print(f"🗄️ {results_store.appended} results appended to {results_store.root}")
+        if cache:
+            print(cache.stats())
+            cache.close()
+    print(engine.report())
+    finish(writer, files, args.headless)
 
-    cv2.destroyAllWindows()
 
-    # Save results to CSV
-    if results:
-        with open(CSV_PATH, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Filename", "Species", "Count", "Confidence (%)"])
-            writer.writerows(results)
-        print(f"✅ Results saved to {CSV_PATH}")
+def finish(writer, files, headless):
+    if not headless:
+        cv2.destroyAllWindows()
+    if serial_link:
+        serial_link.close()
+        print(serial_link.stats())
 
-    if not found_any:
+    if writer.written:
+        print(f"✅ {writer.written} results saved to {writer.path}")
+    elif not files:
         print("⚠️ No valid images found in the folder.")
 
 if __name__ == "__main__":
@@ -1,13 +1,27 @@
 import os
+import sys
+import argparse
 import cv2
 import json
-import numpy as np
 import csv
 import warnings
 import logging
 import serial
 import time
-from tensorflow.keras.models import load_model
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.backends import load_model
+from organism_detection.inference import ClassificationEngine
+from serial_communication.binary_link import BinaryLink
+from webcam_feed.frame_grabber import FrameGrabber
+from sample_analysis.live_worker import LiveAnalyzer, AnalysisPolicy
+from sample_analysis.counting import count_microbes
+from sample_analysis.segmentation import Segmenter, METHODS, DEFAULT_BG_RATE
+from sample_analysis.tracking import OrganismTracker, DEFAULT_VOTES, UNCLASSIFIED
+from sample_analysis.results_store import ResultsStore, DEFAULT_STORE_PATH
+from sample_analysis import instrumentation
+from sample_analysis.instrumentation import span
 
 # --- Paths ---
 BASE_DIR = os.path.dirname(__file__)
@@ -25,89 +39,241 @@ except Exception as e:
     print("⚠️ Could not connect to Arduino:", e)
 
 # --- Load model ---
+# Loaded on first prediction; uses microbe_model.tflite/.onnx if export_model.py made one
 model = load_model(MODEL_PATH)
 
 # --- Load class indices ---
 with open(CLASS_INDICES_PATH, "r") as f:
     class_indices = json.load(f)
+# Counts go out as binary frames keyed by these ids; a background thread batches,
+# acks and resends them so analysis never waits on the 9600 baud link
+serial_link = BinaryLink(arduino, class_indices) if arduino else None
 idx_to_class = {v: k for k, v in class_indices.items()}
 
-# --- Counting Function ---
-def count_microbes(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    return len(contours), thresh, contours
-
 # --- Classification Function ---
 def classify_species(frame):
-    img = cv2.resize(frame, (64, 64))
-    img = img.astype("float32") / 255.0
-    img = np.expand_dims(img, axis=0)
-    preds = model.predict(img, verbose=0)
-    predicted_idx = int(np.argmax(preds))
-    predicted_species = idx_to_class.get(predicted_idx, "Unknown")
-    confidence = float(preds[0][predicted_idx])
-    return predicted_species, confidence
+    with span("predict"):
+        return engine.classify_one(frame)  # same RGB preprocessing as training
+
+# --- Segmentation ---
+# Reuses its buffers (and background model) frame to frame; main() picks the method
+segmenter = Segmenter()
+
+# --- Tracking ---
+# With --track, blobs keep their id across frames and each organism's crop is
+# classified a few times in total rather than the whole frame every time
+tracker = None
+engine = ClassificationEngine(model, idx_to_class, rgb=True)  # BGR frames and crops converted to RGB
+MAX_CROPS_PER_FRAME = 64  # bounds the predict call when many organisms appear at once
+
+def track_frame(frame, blobs):
+    """Returns (species, share) of the visible tracked organisms and the session's unique counts."""
+    with span("track"):
+        tracker.update(blobs)
+    track_ids, boxes = tracker.needs_classification(limit=MAX_CROPS_PER_FRAME)
+    if len(track_ids):
+        with span("predict"):
+            species, confidences = engine.classify_crops(frame, boxes)
+        tracker.add_votes(track_ids, species.tolist(), confidences)
+    visible = Counter(tracker.species_of(tracker.visible()))
+    if not visible:
+        return "None", 0.0, tracker.unique_counts()
+    species, n = visible.most_common(1)[0]
+    return species, n / sum(visible.values()), tracker.unique_counts()
+
+def analyze_frame(frame):
+    """Returns (count, contours, species, confidence, unique counts or None without --track, blobs)."""
+    count, thresh, blobs = count_microbes(frame, segmenter=segmenter)
+    if tracker is not None:
+        species, conf, unique = track_frame(frame, blobs)  # conf = share of the visible organisms
+        return count, blobs.contours(), species, conf, unique, blobs
+    species, conf = classify_species(frame)
+    return count, blobs.contours(), species, conf, None, blobs
+
+def draw_result(frame, count, contours, species, conf_percent, extra=""):
+    img_color = frame.copy()
+    cv2.drawContours(img_color, contours, -1, (0, 255, 0), 1)
+    cv2.putText(img_color, f"{species} ({conf_percent}%) Count:{count}{extra}", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    return img_color
 
 # --- Send to Arduino ---
 def send_to_arduino(species, count):
-    if arduino:
-        message = f"{species}:{count}\n"
-        arduino.write(message.encode())
-        print(f"📤 Sent to Arduino → {message.strip()}")
+    if serial_link:
+        with span("serial"):
+            serial_link.send_counts({species: count})  # a newer count for the same species replaces a queued one
+        print(f"📤 Queued for Arduino → {species}:{count}")
     else:
         print(f"(⚠️ Arduino not connected) {species}:{count}")
 
+def send_unique_counts(unique):
+    """--track: report every species' session total; unchanged ones are cheap to resend."""
+    # Organisms that never got a crop classified have no species id on the Arduino;
+    # they are shown on screen and in the session summary instead
+    unique = {name: n for name, n in unique.items() if name != UNCLASSIFIED}
+    if serial_link:
+        with span("serial"):
+            serial_link.send_counts(unique)
+    else:
+        print(f"(⚠️ Arduino not connected) {unique}")
+
+def report(species, count, unique):
+    if unique is None:
+        send_to_arduino(species, count)
+    else:
+        send_unique_counts(unique)
+
 # --- Main ---
 def main():
+    parser = argparse.ArgumentParser(description="Live microscope capture, counting and classification")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file or image folder (default: %(default)s)")
+    parser.add_argument("--continuous", action="store_true",
+                        help="analyze continuously on a worker thread instead of on 's'")
+    parser.add_argument("--every-n", type=int, default=1,
+                        help="continuous mode: analyze at most every Nth frame (default: %(default)s)")
+    parser.add_argument("--max-hz", type=float, default=None,
+                        help="continuous mode: at most this many analyses per second")
+    parser.add_argument("--stats", action="store_true",
+                        help="time every stage; show it on screen and log it periodically")
+    parser.add_argument("--stats-interval", type=float, default=10.0,
+                        help="seconds between stats log lines (default: %(default)s)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="with --stats: rewrite this JSON file with per-stage timings every interval")
+    parser.add_argument("--profile", metavar="DIR", default=None,
+                        help="implies --stats: cProfile each stage and write DIR/<stage>.prof on exit")
+    parser.add_argument("--threshold", choices=METHODS, default="otsu",
+                        help="segmentation method; adaptive/background handle uneven illumination "
+                             "(default: %(default)s)")
+    parser.add_argument("--bg-rate", type=float, default=DEFAULT_BG_RATE,
+                        help="background method: how fast the illumination model follows new frames, "
+                             "0 freezes it after the first (default: %(default)s)")
+    parser.add_argument("--track", action="store_true",
+                        help="track organisms across frames and count each one once per session; "
+                             "classifies each organism's crop instead of every frame (best with --continuous)")
+    parser.add_argument("--votes", type=int, default=DEFAULT_VOTES,
+                        help="--track: classifications per organism (default: %(default)s)")
+    parser.add_argument("--store", nargs="?", const=DEFAULT_STORE_PATH, default=None,
+                        help="also append every result to a results store (results_store.py), "
+                             f"by default {DEFAULT_STORE_PATH}")
+    args = parser.parse_args()
+
+    global segmenter, tracker
+    segmenter = Segmenter(args.threshold, bg_rate=args.bg_rate)
+    if args.track:
+        tracker = OrganismTracker(votes=args.votes)
+
+    if args.stats or args.profile:
+        instrumentation.enable(profile=bool(args.profile))
+    reporter = instrumentation.PeriodicReporter(args.stats_interval, args.metrics_file)
+
     results = []
+    store = ResultsStore(args.store) if args.store else None
+
+    def record(row, blobs=None, kind="result"):
+        results.append(row)
+        if store:
+            frame_name, species, count, conf_percent = row
+            store.append(frame_name, species, count, conf_percent / 100 if conf_percent != "" else float("nan"),
+                         blobs, kind=kind)
+
     cv2.setNumThreads(0)
     logging.getLogger("PIL").setLevel(logging.ERROR)
     warnings.filterwarnings("ignore", category=UserWarning)
 
-    cap = cv2.VideoCapture(0)  # or 1, depending on index
-
-  # 0 = default camera, try 1/2 if USB microscope is not first device
+    # 0 = default camera, try 1/2 if USB microscope is not first device.
+    # Frames are read on a background thread so 's' always analyzes the newest one.
+    cap = FrameGrabber(args.source).start()
 
     if not cap.isOpened():
         print("❌ Could not access microscope camera")
         return
 
-    print("🎥 Microscope camera stream started. Press 's' to capture & analyze, 'q' to quit.")
+    # Continuous mode: the worker analyzes the newest frame while this loop keeps
+    # displaying every frame with the last result drawn on top.
+    analyzer = None
+    if args.continuous:
+        analyzer = LiveAnalyzer(analyze_frame, AnalysisPolicy(every_n=args.every_n, max_hz=args.max_hz))
+        print("🎥 Microscope camera stream started (continuous analysis). Press 'q' to quit.")
+    else:
+        print("🎥 Microscope camera stream started. Press 's' to capture & analyze, 'q' to quit.")
+    if args.threshold == "background":
+        print("   Press 'b' to re-estimate the illumination background.")
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        with span("capture"):
+            frame_id, captured_at, frame = cap.read_latest()
+        if frame is None:
             print("⚠️ Failed to grab frame")
             break
 
-        cv2.imshow("Live Microscope Feed", frame)
+        display = frame
+        if analyzer:
+            analyzer.offer(frame_id, captured_at, frame)
+            result = analyzer.poll()
+            if result:
+                count, contours, species, conf, unique, blobs = result.value
+                conf_percent = round(conf * 100, 2)
+                print(f"[Frame {result.frame_id}] → Species: {species} | Count: {count} | "
+                      f"Confidence: {conf_percent}% | Latency: {result.latency * 1000:.0f} ms")
+                record([f"Frame{result.frame_id}", species, count, conf_percent], blobs)
+                report(species, count, unique)
+            if analyzer.latest:
+                count, contours, species, conf, unique, _ = analyzer.latest.value
+                extra = (f" Unique:{sum(unique.values())} ({unique.get(UNCLASSIFIED, 0)} unclassified)"
+                         if unique is not None else "")
+                display = draw_result(frame, count, contours, species, round(conf * 100, 2),
+                                      f"{extra} | {analyzer.latest.latency * 1000:.0f} ms")
+
+        if instrumentation.enabled():
+            display = instrumentation.draw_stats(display.copy() if display is frame else display)
+            reporter.tick()
+        cv2.imshow("Live Microscope Feed", display)
 
         key = cv2.waitKey(1) & 0xFF
 
-        if key == ord("s"):  # Capture and analyze
-            count, thresh, contours = count_microbes(frame)
-            species, conf = classify_species(frame)
+        if key == ord("s") and not analyzer:  # Capture and analyze
+            count, contours, species, conf, unique, blobs = analyze_frame(frame)
             conf_percent = round(conf * 100, 2)
 
             print(f"[Live Frame] → Species: {species} | Count: {count} | Confidence: {conf_percent}%")
-            results.append(["LiveFrame", species, count, conf_percent])
-            send_to_arduino(species, count)
+            record(["LiveFrame", species, count, conf_percent], blobs)
+            report(species, count, unique)
 
             # Show results with overlay
-            img_color = frame.copy()
-            cv2.drawContours(img_color, contours, -1, (0, 255, 0), 1)
-            cv2.putText(img_color, f"{species} ({conf_percent}%) Count:{count}", (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            cv2.imshow("Detection", img_color)
+            cv2.imshow("Detection", draw_result(frame, count, contours, species, conf_percent))
+
+        elif key == ord("b") and args.threshold == "background":  # slide moved / lamp changed
+            segmenter.reset_background()
+            print("🔄 Re-estimating the illumination background from the next frame")
 
         elif key == ord("q"):  # Quit
             break
 
+    if analyzer:
+        analyzer.close()
+        print(analyzer.stats())
+    print(cap.stats())
     cap.release()
     cv2.destroyAllWindows()
+    if tracker:
+        print(tracker.stats())
+        for species, unique in sorted(tracker.unique_counts().items()):
+            print(f"🦠 {species}: {unique} unique organisms")
+            record(["Session", species, unique, ""], kind="session")  # kept out of per-frame queries
+        if tracker.unclassified:
+            print(f"⚠️ {tracker.unclassified} of {tracker.unique_total} organisms were never classified "
+                  f"(at most {MAX_CROPS_PER_FRAME} crops per frame); they are not sent to the Arduino")
+    if store:
+        store.close()
+        print(f"🗄️ {store.appended} results appended to {store.root}")
+    if serial_link:
+        serial_link.close()
+        print(serial_link.stats())
+    reporter.tick(force=True)
+    if args.profile:
+        for path in instrumentation.dump_profiles(args.profile):
+            print(f"✅ Profile written to {path}")
 
     # Save results
     if results:
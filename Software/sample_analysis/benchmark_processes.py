@@ -0,0 +1,63 @@
+# benchmark_processes.py
+# Scaling of the multi-process analysis mode: images/sec with 1, 2, 4, ...
+# worker processes over the same folder (worker start-up and model loading
+# are excluded). Ideal scaling is speedup == processes.
+#   python benchmark_processes.py --input ../../datasets/test --processes 1 2 4 8 16 32
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.inference import DEFAULT_BATCH_SIZE
+from organism_detection.dataset_cache import scan
+from sample_analysis.process_pool import ShardedAnalyzer, DEFAULT_CHUNK
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "..", "organism_detection", "microbe_model.h5")
+CLASS_INDICES_PATH = os.path.join(BASE_DIR, "..", "organism_detection", "class_indices.json")
+TEST_DIR = os.path.join(BASE_DIR, "..", "..", "datasets", "test")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure multi-process analysis scaling")
+    parser.add_argument("--input", default=TEST_DIR, help="image folder, searched recursively (default: %(default)s)")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--repeat", type=int, default=1, help="pass over the file list this many times")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--json", default=None, help="also write the results here")
+    args = parser.parse_args()
+
+    with open(CLASS_INDICES_PATH) as f:
+        idx_to_class = {int(v): k for k, v in json.load(f).items()}
+    paths = [os.path.join(args.input, rel) for rel, _, _, _ in scan(args.input)] * args.repeat
+    config = {"model_path": MODEL_PATH, "backend": None, "idx_to_class": idx_to_class,
+              "batch_size": args.batch_size, "rgb": True, "blob_filter": {},
+              "per_organism": False, "species_names": [], "tile": None}
+    print(f"{len(paths)} images, {os.cpu_count()} CPU cores")
+
+    results = []
+    for n in sorted(set(args.processes)):
+        with ShardedAnalyzer(config, n, args.chunk_size) as pool:
+            pool.warm_up()
+            start = time.perf_counter()
+            done = sum(1 for _, row, _ in pool.run(paths) if row is not None)
+            elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        results.append({"processes": n, "threads": pool.config["threads"], "images": done,
+                        "seconds": elapsed, "images_per_s": rate})
+        base = results[0]["images_per_s"] / results[0]["processes"]
+        speedup = rate / base if base else 0.0
+        print(f"{n:>3} processes: {rate:8.1f} images/sec  speedup {speedup:5.2f}x  "
+              f"efficiency {speedup / n:4.0%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "runs": results}, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmark_segmentation.py
+# Per-frame cost of the Segmenter methods (segmentation.py) against the
+# original count_microbes() path, over the same frames played back like a
+# live stream. Reports time per frame for thresholding alone and for the full
+# count, peak bytes allocated per frame by thresholding alone and by the full
+# count_microbes() call, and the mean count. --uneven darkens the
+# frames with a left-to-right illumination gradient to show how stable each
+# method's count is under bad lighting.
+#   python benchmark_segmentation.py --input images --frames 200 --uneven
+import os
+import sys
+import time
+import json
+import argparse
+import tracemalloc
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.dataset_cache import scan
+from sample_analysis.counting import count_microbes, threshold, to_gray
+from sample_analysis.segmentation import Segmenter, METHODS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.join(BASE_DIR, "images")
+
+
+def load_frames(folder, limit, uneven):
+    frames = []
+    for rel, _, _, _ in scan(folder)[:limit]:
+        img = cv2.imread(os.path.join(folder, rel))
+        if img is None:
+            continue
+        if frames and img.shape != frames[0].shape:
+            img = cv2.resize(img, (frames[0].shape[1], frames[0].shape[0]))  # a stream has one frame size
+        frames.append(img)
+    if uneven and frames:
+        w = frames[0].shape[1]
+        gradient = np.linspace(0.45, 1.0, w, dtype=np.float32)[None, :, None]
+        frames = [(f * gradient).astype(np.uint8) for f in frames]
+    return frames
+
+
+def run(name, frames, n):
+    """Time n frames (cycling through `frames`) for one method; returns a result dict."""
+    segmenter = None if name == "original" else Segmenter(name)
+    thresh_only = (lambda f: threshold(to_gray(f))) if segmenter is None else segmenter.threshold
+    count = (lambda f: count_microbes(f)) if segmenter is None else (lambda f: count_microbes(f, segmenter=segmenter))
+    for f in frames[:2]:  # warm-up: buffers, background model
+        count(f)
+
+    start = time.perf_counter()
+    for i in range(n):
+        thresh_only(frames[i % len(frames)])
+    thresh_ms = (time.perf_counter() - start) / n * 1000
+
+    counts = []
+    start = time.perf_counter()
+    for i in range(n):
+        counts.append(count(frames[i % len(frames)])[0])
+    count_ms = (time.perf_counter() - start) / n * 1000
+
+    # Allocations are measured on a separate pass; tracing slows everything down
+    m = min(n, 20)
+    return {"method": name, "threshold_ms": thresh_ms, "count_ms": count_ms,
+            "threshold_alloc_kb": peak_alloc(thresh_only, frames, m) / 1024,
+            "count_alloc_kb": peak_alloc(count, frames, m) / 1024, "mean_count": float(np.mean(counts))}
+
+
+def peak_alloc(fn, frames, m):
+    """Largest Python-heap growth (bytes) during any one of m calls, results dropped in between."""
+    tracemalloc.start()
+    worst = 0
+    for i in range(m):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(frames[i % len(frames)])
+        worst = max(worst, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark segmentation methods against count_microbes()")
+    parser.add_argument("--input", default=IMAGE_DIR, help="image folder (default: %(default)s)")
+    parser.add_argument("--limit", type=int, default=50, help="distinct frames to load")
+    parser.add_argument("--frames", type=int, default=100, help="frames timed per method (default: %(default)s)")
+    parser.add_argument("--methods", nargs="+", default=["original", *METHODS])
+    parser.add_argument("--uneven", action="store_true", help="apply an illumination gradient to the frames")
+    parser.add_argument("--json", default=None, help="also write the results here")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(0)  # per-frame cost on one core, like the live worker thread
+    frames = load_frames(args.input, args.limit, args.uneven)
+    if not frames:
+        raise SystemExit(f"No images found in {args.input}")
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames of {w}x{h}, {args.frames} per method{', uneven illumination' if args.uneven else ''}")
+    print(f"{'method':>12} {'threshold':>10} {'count':>10} {'thresh alloc':>12} {'count alloc':>12} "
+          f"{'mean count':>11}")
+
+    results = []
+    for name in args.methods:
+        r = run(name, frames, args.frames)
+        results.append(r)
+        print(f"{name:>12} {r['threshold_ms']:>8.2f}ms {r['count_ms']:>8.2f}ms "
+              f"{r['threshold_alloc_kb']:>9.0f} KB {r['count_alloc_kb']:>9.0f} KB {r['mean_count']:>11.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"frame_size": [w, h], "uneven": args.uneven, "results": results}, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
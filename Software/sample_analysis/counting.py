@@ -0,0 +1,155 @@
+# counting.py
+# Shared microbe counting: Otsu threshold (or a Segmenter from segmentation.py),
+# then per-blob statistics for every connected component in one vectorized
+# pass, with size/shape filtering.
+import numpy as np
+import cv2
+
+from sample_analysis.instrumentation import span
+
+DEFAULT_MIN_AREA = 10  # pixels; smaller blobs are dust specks / sensor noise
+
+_CROSS = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+# Edge pixels lie on an 8-connected path whose pixel count is, averaged over
+# directions, 2*sqrt(2)/pi of the path length; the outline around the pixels
+# is half a pixel further out, which adds pi to a closed convex curve
+_EDGE_TO_LENGTH = np.pi / (2 * np.sqrt(2))
+_BLOCK_ROWS = 64  # full-image gathers/lookups run in bands, so temporaries stay ~100 KB per frame
+
+
+def edge_perimeter(edge_pixels):
+    """Estimated outline length of blobs from their counts of 4-neighbourhood edge pixels."""
+    return np.asarray(edge_pixels, dtype=float) * _EDGE_TO_LENGTH + np.pi
+
+
+class BlobFilter:
+    """Which blobs count as organisms. None disables a bound."""
+
+    def __init__(self, min_area=DEFAULT_MIN_AREA, max_area=None, min_circularity=None,
+                 max_aspect_ratio=None):
+        self.min_area = min_area
+        self.max_area = max_area
+        self.min_circularity = min_circularity
+        self.max_aspect_ratio = max_aspect_ratio
+
+    def mask(self, blobs):
+        keep = np.ones(len(blobs.area), dtype=bool)
+        if self.min_area is not None:
+            keep &= blobs.area >= self.min_area
+        if self.max_area is not None:
+            keep &= blobs.area <= self.max_area
+        if self.min_circularity is not None:
+            keep &= blobs.circularity >= self.min_circularity
+        if self.max_aspect_ratio is not None:
+            keep &= blobs.aspect_ratio <= self.max_aspect_ratio
+        return keep
+
+
+class Blobs:
+    """Column arrays of per-blob statistics (one entry per kept blob).
+
+    area, perimeter, circularity, aspect_ratio: float arrays of length N.
+    circularity is 4*pi*area / perimeter**2: about 1 for a disc, 0.85 for a
+    2:1 ellipse; it is not clipped, so small blobs can come out slightly above 1.
+    bbox: (N, 4) int array of x, y, w, h. centroid: (N, 2) float array of x, y.
+    ids are the component labels in `labels`, which maps every pixel to its blob;
+    labels is None when the blobs were stitched together from tiles (tiling.py).
+    `scratch`, a uint8 image shaped like labels, is reused by mask() if given.
+    """
+
+    def __init__(self, labels, ids, area, perimeter, bbox, centroid, scratch=None):
+        self.labels = labels
+        self.scratch = scratch
+        self.ids = ids
+        self.area = area
+        self.perimeter = perimeter
+        self.bbox = bbox
+        self.centroid = centroid
+        self.circularity = 4.0 * np.pi * area / np.square(perimeter)
+        w, h = bbox[:, 2].astype(float), bbox[:, 3].astype(float)
+        self.aspect_ratio = np.maximum(w, h) / np.maximum(np.minimum(w, h), 1.0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, keep):
+        return Blobs(self.labels, self.ids[keep], self.area[keep], self.perimeter[keep],
+                     self.bbox[keep], self.centroid[keep], self.scratch)
+
+    def mask(self):
+        """uint8 image with 255 on the pixels of the kept blobs (in `scratch` when there is one)."""
+        lut = np.zeros(int(self.labels.max()) + 1, dtype=np.uint8)
+        lut[self.ids] = 255
+        out = np.empty(self.labels.shape, np.uint8) if self.scratch is None else self.scratch
+        for r in range(0, len(out), _BLOCK_ROWS):
+            out[r:r + _BLOCK_ROWS] = lut[self.labels[r:r + _BLOCK_ROWS]]
+        return out
+
+    def contours(self):
+        """Outlines of the kept blobs, for cv2.drawContours overlays only.
+
+        Without a label image the bounding boxes are returned as rectangles.
+        """
+        if self.labels is None:
+            x, y, w, h = self.bbox.T
+            corners = np.stack([np.stack([x, y], 1), np.stack([x + w - 1, y], 1),
+                                np.stack([x + w - 1, y + h - 1], 1), np.stack([x, y + h - 1], 1)], 1)
+            return list(corners.reshape(-1, 4, 1, 2).astype(np.int32))
+        with span("findContours"):
+            contours, _ = cv2.findContours(self.mask(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return contours
+
+
+def threshold(gray):
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return thresh
+
+
+def blob_stats(thresh, labels=None, edge=None, is_edge=None):
+    """Statistics for every foreground blob in a binary image, without Python loops.
+
+    `labels` (int32), `edge` (uint8) and `is_edge` (bool), shaped like
+    `thresh`, are reused instead of allocating new images (see
+    Segmenter.blob_buffers); `edge` then also backs the returned Blobs.mask().
+    """
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(thresh, labels, connectivity=8,
+                                                                   ltype=cv2.CV_32S)
+    # Perimeter from the blob pixels that touch the background (4-neighbourhood)
+    edge = cv2.erode(thresh, _CROSS, dst=edge, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+    edge = cv2.subtract(thresh, edge, dst=edge)
+    is_edge = np.greater(edge, 0, out=is_edge)
+    edge_pixels = np.zeros(n, dtype=np.int64)
+    for r in range(0, len(labels), _BLOCK_ROWS):
+        edge_pixels += np.bincount(labels[r:r + _BLOCK_ROWS][is_edge[r:r + _BLOCK_ROWS]], minlength=n)
+    perimeter = edge_perimeter(edge_pixels)
+    ids = np.arange(1, n)  # label 0 is the background
+    return Blobs(labels, ids, stats[1:, cv2.CC_STAT_AREA].astype(float), perimeter[1:],
+                 stats[1:, :4], centroids[1:], edge)
+
+
+def to_gray(image):
+    """Accept a path, a BGR/grayscale array, or a Sample (sample.py)."""
+    if isinstance(image, str):
+        return cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+    if hasattr(image, "gray"):
+        return image.gray
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def count_microbes(image, blob_filter=None, segmenter=None):
+    """Return (count, thresh, blobs) where blobs holds the stats of the counted blobs.
+
+    With a Segmenter (segmentation.py) its thresholding method is used and its
+    buffers are reused, so thresh and blobs.labels are only valid until the
+    segmenter's next frame.
+    """
+    with span("count"):
+        with span("threshold"):
+            thresh = threshold(to_gray(image)) if segmenter is None else segmenter.threshold(image)
+        with span("blob_stats"):
+            blobs = blob_stats(thresh, *(segmenter.blob_buffers() if segmenter is not None else ()))
+        blobs = blobs.select((blob_filter or BlobFilter()).mask(blobs))
+    return len(blobs), thresh, blobs
@@ -0,0 +1,149 @@
+# folder_watcher.py
+# Notice new slide images in a folder while the microscope is still writing
+# them. File system events come from watchdog (inotify / ReadDirectoryChangesW
+# / FSEvents) when it is installed, otherwise the folder is polled. A file is
+# only handed out once its size and mtime have stopped changing for `settle`
+# seconds and it can be opened, so half-written captures are never analyzed.
+import os
+import time
+import queue
+import threading
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class FolderWatcher:
+    """Background thread turning new files in `folder` into (path, arrived_at) items.
+
+    arrived_at is the time.perf_counter() at which the file was first seen,
+    so callers can report arrival-to-result latency. Use batches() to consume
+    them in micro-batches.
+    """
+
+    def __init__(self, folder, extensions=IMAGE_EXTENSIONS, settle=0.5, poll_interval=0.25, use_events=True):
+        self.folder = folder
+        self.extensions = tuple(extensions)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_events = use_events
+        self.mode = None
+        self.seen = set()
+        self._candidates = {}  # name -> [first_seen, size, mtime_ns, last_change]
+        self._hinted = set()   # names reported by file system events since the last check
+        self._hint_lock = threading.Lock()
+        self._ready = queue.Queue()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def _wanted(self, name):
+        return name.lower().endswith(self.extensions) and not name.startswith(".")
+
+    def start(self, ignore=()):
+        """Begin watching; names in `ignore` (e.g. files already processed) are never reported."""
+        self.seen.update(ignore)
+        if self.use_events:
+            self._observer = self._start_observer()
+        self.mode = "events" if self._observer else "polling"
+        self._scan()  # files that appeared before the observer was running
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return None
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                path = getattr(event, "dest_path", None) or event.src_path  # moves: the new name
+                with watcher._hint_lock:
+                    watcher._hinted.add(os.path.basename(path))
+
+        observer = Observer()
+        observer.schedule(Handler(), self.folder, recursive=False)
+        observer.start()
+        return observer
+
+    def _scan(self):
+        now = time.perf_counter()
+        with os.scandir(self.folder) as it:
+            for e in it:
+                if e.name not in self.seen and e.name not in self._candidates and self._wanted(e.name):
+                    self._candidates[e.name] = [now, -1, -1, now]
+
+    def _run(self):
+        # With events a full rescan is only a safety net (e.g. network shares that drop events)
+        rescan_every = 10.0 if self._observer else 0.0
+        last_scan = time.perf_counter()
+        while not self._stop.wait(self.poll_interval):
+            with self._hint_lock:
+                hinted, self._hinted = self._hinted, set()
+            now = time.perf_counter()
+            for name in hinted:
+                if name not in self.seen and name not in self._candidates and self._wanted(name):
+                    self._candidates[name] = [now, -1, -1, now]
+            if now - last_scan >= rescan_every:
+                self._scan()
+                last_scan = now
+            self._check(now)
+
+    def _check(self, now):
+        for name, state in list(self._candidates.items()):
+            path = os.path.join(self.folder, name)
+            try:
+                st = os.stat(path)
+            except OSError:  # renamed or deleted before it settled
+                del self._candidates[name]
+                continue
+            if (st.st_size, st.st_mtime_ns) != (state[1], state[2]):
+                state[1], state[2], state[3] = st.st_size, st.st_mtime_ns, now
+                continue
+            if st.st_size == 0 or now - state[3] < self.settle:
+                continue
+            try:
+                with open(path, "rb"):
+                    pass  # on Windows this fails while the writer still holds the file
+            except OSError:
+                continue
+            del self._candidates[name]
+            self.seen.add(name)
+            self._ready.put((path, state[0]))
+
+    @property
+    def pending(self):
+        """Files seen but not yet handed out (still settling or waiting in the queue)."""
+        return len(self._candidates) + self._ready.qsize()
+
+    def batches(self, max_batch=32, max_wait=0.25):
+        """Yield lists of (path, arrived_at): wait for one file, then gather more for
+        at most `max_wait` seconds or until `max_batch` are collected."""
+        while not self._stop.is_set():
+            try:
+                first = self._ready.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.perf_counter() + max_wait
+            while len(batch) < max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._ready.get(timeout=max(0.0, remaining)) if remaining > 0
+                                 else self._ready.get_nowait())
+                except queue.Empty:
+                    break
+            yield batch
+
+    def stop(self):
+        self._stop.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer.join(timeout=5.0)
+        if self._thread:
+            self._thread.join(timeout=5.0)
@@ -0,0 +1,188 @@
+# instrumentation.py
+# Stage timing for the analysis hot path (capture, threshold, contours,
+# predict, serial...). Code wraps a stage in `with span("threshold"):`; while
+# instrumentation is off that is a global flag check returning a shared no-op
+# context manager. When enabled, durations go into per-stage rolling windows
+# that feed the on-screen overlay, a periodic log line and a JSON metrics file.
+# With profiling on, each outermost stage also runs under its own cProfile
+# profiler and dump_profiles() writes one <stage>.prof per stage
+# (open with snakeviz / pstats). For py-spy, attach to the running process:
+# the stages are ordinary named functions, so no extra mode is needed.
+import os
+import json
+import time
+import cProfile
+import threading
+from contextlib import nullcontext
+
+import numpy as np
+
+DEFAULT_WINDOW = 1024  # samples kept per stage for percentiles
+
+_enabled = False
+_profiling = False
+_NULL = nullcontext()
+_stages = {}
+_stages_lock = threading.Lock()
+_profile_lock = threading.Lock()  # one cProfile profiler active at a time
+_local = threading.local()
+
+
+class StageHistogram:
+    """Rolling window of the last `window` durations of one stage, plus lifetime totals."""
+
+    def __init__(self, name, window=DEFAULT_WINDOW):
+        self.name = name
+        self.samples = np.zeros(window, dtype=np.float64)
+        self.count = 0
+        self.total = 0.0
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples[self.count % len(self.samples)] = seconds
+            self.count += 1
+            self.total += seconds
+
+    def summary(self):
+        """count, mean and p50/p95/p99/max over the current window, in milliseconds."""
+        with self._lock:
+            window = self.samples[:min(self.count, len(self.samples))] * 1000.0
+            count, total = self.count, self.total
+        if not len(window):
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(window, (50, 95, 99))
+        return {"count": count, "total_s": total, "mean_ms": float(window.mean()),
+                "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(window.max())}
+
+
+def _stage(name):
+    stage = _stages.get(name)
+    if stage is None:
+        with _stages_lock:
+            stage = _stages.setdefault(name, StageHistogram(name))
+    return stage
+
+
+class _Span:
+    __slots__ = ("stage", "start", "profiler")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.profiler = None
+
+    def __enter__(self):
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        # cProfile can't nest, so only an outermost stage is profiled (the inner ones show up inside it)
+        if _profiling and depth == 0 and _profile_lock.acquire(blocking=False):
+            if self.stage.profile is None:
+                self.stage.profile = cProfile.Profile()
+            self.profiler = self.stage.profile
+            self.profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stage.add(time.perf_counter() - self.start)
+        if self.profiler is not None:
+            self.profiler.disable()
+            _profile_lock.release()
+        _local.depth -= 1
+        return False
+
+
+def span(name):
+    """Context manager timing one stage; a no-op unless enable() was called."""
+    if not _enabled:
+        return _NULL
+    return _Span(_stage(name))
+
+
+def enable(profile=False):
+    global _enabled, _profiling
+    _enabled = True
+    _profiling = profile
+
+
+def disable():
+    global _enabled, _profiling
+    _enabled = _profiling = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _stages_lock:
+        _stages.clear()
+
+
+def snapshot():
+    """{stage: summary} for every stage seen so far."""
+    return {name: stage.summary() for name, stage in list(_stages.items())}
+
+
+def format_line(stats=None):
+    """Compact one-line summary, e.g. for a periodic log."""
+    stats = stats if stats is not None else snapshot()
+    parts = [f"{name} p50 {s['p50_ms']:.1f} / p95 {s['p95_ms']:.1f} ms"
+             for name, s in stats.items() if s["count"]]
+    return " | ".join(parts) or "no stage timings yet"
+
+
+def draw_stats(frame, origin=(10, 60)):
+    """Draw one line per stage (p50/p95) onto a BGR frame in place."""
+    import cv2
+    x, y = origin
+    for name, s in snapshot().items():
+        if not s["count"]:
+            continue
+        cv2.putText(frame, f"{name}: {s['p50_ms']:.1f} / {s['p95_ms']:.1f} ms", (x, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 0), 1)
+        y += 16
+    return frame
+
+
+def write_metrics(path, stats=None):
+    data = {"time": time.time(), "stages": stats if stats is not None else snapshot()}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def dump_profiles(folder):
+    """Write <stage>.prof for every profiled stage; returns the paths written."""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for name, stage in list(_stages.items()):
+        if stage.profile is not None:
+            path = os.path.join(folder, f"{name}.prof")
+            stage.profile.dump_stats(path)
+            paths.append(path)
+    return paths
+
+
+class PeriodicReporter:
+    """Call tick() from the main loop; every `interval` seconds it logs a line and refreshes the metrics file."""
+
+    def __init__(self, interval=10.0, metrics_path=None, log=print):
+        self.interval = interval
+        self.metrics_path = metrics_path
+        self.log = log
+        self._next = time.perf_counter() + interval
+
+    def tick(self, force=False):
+        if not _enabled:
+            return
+        now = time.perf_counter()
+        if not force and now < self._next:
+            return
+        self._next = now + self.interval
+        stats = snapshot()
+        self.log("⏱️ " + format_line(stats))
+        if self.metrics_path:
+            write_metrics(self.metrics_path, stats)
@@ -0,0 +1,127 @@
+# live_worker.py
+# Runs counting + classification on a worker thread against the most recent
+# frame, so the display loop keeps rendering at the camera's frame rate.
+import time
+import threading
+
+
+class AnalysisPolicy:
+    """Decide which captured frames get analyzed.
+
+    every_n: analyze at most every Nth frame. max_hz: at most this many
+    analyses per second. adaptive: never queue a frame while the worker is
+    still busy, so a slow model automatically analyzes fewer, fresher frames.
+    """
+
+    def __init__(self, every_n=1, max_hz=None, adaptive=True):
+        self.every_n = max(1, every_n)
+        self.min_interval = 1.0 / max_hz if max_hz else 0.0
+        self.adaptive = adaptive
+        self._last_id = None
+        self._last_time = 0.0
+
+    def should_analyze(self, frame_id, now, worker_busy):
+        if self.adaptive and worker_busy:
+            return False
+        if self._last_id is not None and frame_id - self._last_id < self.every_n:
+            return False
+        if now - self._last_time < self.min_interval:
+            return False
+        self._last_id, self._last_time = frame_id, now
+        return True
+
+
+class LiveResult:
+    def __init__(self, frame_id, captured_at, value):
+        self.frame_id = frame_id
+        self.captured_at = captured_at
+        self.finished_at = time.perf_counter()
+        self.value = value
+
+    @property
+    def latency(self):
+        """Seconds from frame capture to analysis result."""
+        return self.finished_at - self.captured_at
+
+
+class LiveAnalyzer:
+    """Background worker that analyzes the newest submitted frame.
+
+    `analyze(frame)` runs on the worker thread and may return anything; the
+    display loop picks it up with poll() (new results only) or `latest`.
+    A frame submitted while another is still waiting replaces it.
+    """
+
+    def __init__(self, analyze, policy=None):
+        self.analyze = analyze
+        self.policy = policy or AnalysisPolicy()
+        self.latest = None
+        self.analyzed = 0
+        self.skipped = 0
+        self.errors = 0
+        self._latency_sum = 0.0
+        self._max_latency = 0.0
+        self._job = None
+        self._busy = False
+        self._fresh = False
+        self._stop = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="live-analyzer", daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        return self._busy or self._job is not None
+
+    def offer(self, frame_id, captured_at, frame):
+        """Hand a frame to the worker if the policy wants it; returns True if queued."""
+        if not self.policy.should_analyze(frame_id, time.perf_counter(), self.busy):
+            self.skipped += 1
+            return False
+        with self._cond:
+            self._job = (frame_id, captured_at, frame.copy())  # the display loop keeps drawing on its frame
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._job is not None or self._stop)
+                if self._stop:
+                    return
+                frame_id, captured_at, frame = self._job
+                self._job = None
+                self._busy = True
+            try:
+                result = LiveResult(frame_id, captured_at, self.analyze(frame))
+            except Exception as e:
+                self.errors += 1
+                print("⚠️ Live analysis failed:", e)
+                result = None
+            with self._cond:
+                self._busy = False
+                if result is not None:
+                    self.latest = result
+                    self._fresh = True
+                    self.analyzed += 1
+                    self._latency_sum += result.latency
+                    self._max_latency = max(self._max_latency, result.latency)
+
+    def poll(self):
+        """Return the newest LiveResult if it hasn't been returned before, else None."""
+        with self._cond:
+            if not self._fresh:
+                return None
+            self._fresh = False
+            return self.latest
+
+    def stats(self):
+        mean = self._latency_sum / self.analyzed if self.analyzed else 0.0
+        return (f"live analysis: {self.analyzed} frames analyzed, {self.skipped} skipped, "
+                f"latency mean {mean * 1000:.0f} ms / max {self._max_latency * 1000:.0f} ms")
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
@@ -0,0 +1,123 @@
+# load_test.py
+# Throughput and tail latency of analysis_server.py at several concurrency
+# levels. Each level keeps `concurrency` clients posting images back to back
+# for --duration seconds, then reads /metrics to show how well requests were
+# batched together.
+#   python load_test.py --url http://localhost:8765 --concurrency 1 4 16 64
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse, quote
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from organism_detection.dataset_cache import scan
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.join(BASE_DIR, "..", "..", "datasets", "test")
+
+
+def load_images(folder, limit):
+    entries = scan(folder)[:limit]
+    images = []
+    for rel, _, _, _ in entries:
+        with open(os.path.join(folder, rel), "rb") as f:
+            images.append((os.path.basename(rel), f.read()))
+    return images
+
+
+def get_json(url, path):
+    u = urlparse(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=10)
+    conn.request("GET", path)
+    data = json.loads(conn.getresponse().read())
+    conn.close()
+    return data
+
+
+def client(url, images, offset, stop_at, latencies, errors, per_organism):
+    u = urlparse(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=60)  # one keep-alive connection per client
+    i = offset
+    while time.perf_counter() < stop_at:
+        name, body = images[i % len(images)]
+        i += 1
+        path = f"/analyze?name={quote(name)}" + ("&per_organism=1" if per_organism else "")
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, body=body, headers={"Content-Type": "application/octet-stream"})
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = http.client.HTTPConnection(u.hostname, u.port, timeout=60)
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(name)
+    conn.close()
+
+
+def run_level(url, images, concurrency, duration, per_organism):
+    before = get_json(url, "/metrics")["batcher"]
+    latencies, errors = [], []
+    stop_at = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(url, images, i * 7, stop_at, latencies, errors, per_organism))
+               for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    after = get_json(url, "/metrics")["batcher"]
+
+    batches = after["batches"] - before["batches"]
+    rows = after["rows"] - before["rows"]
+    ms = np.asarray(latencies) * 1000.0 if latencies else np.zeros(1)
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+    return {"concurrency": concurrency, "requests": len(latencies), "errors": len(errors),
+            "throughput_rps": len(latencies) / elapsed, "p50_ms": float(p50), "p95_ms": float(p95),
+            "p99_ms": float(p99), "max_ms": float(ms.max()), "mean_batch": rows / batches if batches else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for analysis_server.py")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--images", default=IMAGE_DIR, help="folder of images to post (default: %(default)s)")
+    parser.add_argument("--limit", type=int, default=200, help="distinct images to cycle through")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level (default: %(default)s)")
+    parser.add_argument("--per-organism", action="store_true", help="also request per-organism classification")
+    parser.add_argument("--json", default=None, help="also write the results here")
+    args = parser.parse_args()
+
+    health = get_json(args.url, "/health")
+    if not health.get("model_loaded"):
+        raise SystemExit(f"Service at {args.url} is not ready: {health}")
+    images = load_images(args.images, args.limit)
+    print(f"{len(images)} images, {args.duration:g}s per level")
+    print(f"{'clients':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'batch':>6} {'errors':>7}")
+
+    results = []
+    for c in args.concurrency:
+        r = run_level(args.url, images, c, args.duration, args.per_organism)
+        results.append(r)
+        print(f"{c:>8} {r['throughput_rps']:>8.1f} {r['p50_ms']:>6.1f}ms {r['p95_ms']:>6.1f}ms "
+              f"{r['p99_ms']:>6.1f}ms {r['max_ms']:>6.1f}ms {r['mean_batch']:>6.1f} {r['errors']:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"url": args.url, "levels": results}, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# process_pool.py
+# Multi-process batch analysis (analyze_and_classify.py --processes N).
+# The file list is cut into small chunks that worker processes pick up as they
+# become free. Each worker loads the model once and caps its own OpenCV,
+# BLAS/OpenMP and model-runtime threads so N workers don't oversubscribe the
+# CPU. BLAS and OpenMP only read their thread count when they are loaded, so
+# workers are spawned (not forked from a parent that already loaded numpy)
+# with the *_NUM_THREADS variables already in their environment. Results come
+# back to the parent in input order. A crashed worker only costs the chunks
+# in flight: the pool is restarted and those files are re-run one at a time,
+# and a file that crashes a worker twice on its own is reported as failed.
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+
+from organism_detection.backends import load_model
+from organism_detection.inference import ClassificationEngine
+from sample_analysis.sample import Sample
+from sample_analysis.counting import count_microbes, BlobFilter
+from sample_analysis.tiling import process_tiled
+
+DEFAULT_CHUNK = 16
+MAX_ATTEMPTS = 2
+THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+_worker = None  # (engine, blob_filter, config) inside a worker process
+
+
+def result_row(sample, species, conf, engine, blob_filter, per_organism=False, species_names=(),
+               tile=None, tile_workers=None):
+    """Count one decoded sample (and classify its organisms if asked).
+
+    Returns (row, blobs) where row is [filename, species, count, confidence %]
+    followed by one count per species name with per_organism.
+    """
+    if tile:
+        # Full-resolution tiles in parallel; tile votes replace the 64x64 whole-slide guess
+        count, blobs, species, conf = process_tiled(sample.color, engine, tile=tile, workers=tile_workers,
+                                                    blob_filter=blob_filter)
+    else:
+        count, _, blobs = count_microbes(sample, blob_filter)
+    row = [sample.name, species, count, round(conf * 100, 2)]
+    if per_organism:
+        # Classify every detected organism's crop in one batched forward pass
+        species_counts = engine.count_species(sample.color, blobs.bbox)
+        row += [species_counts.get(name, 0) for name in species_names]
+    return row, blobs
+
+
+def _init_worker(config):
+    global _worker
+    threads = config["threads"]
+    cv2.setNumThreads(threads)
+    model = load_model(config["model_path"], config["backend"], threads)
+    engine = ClassificationEngine(model, config["idx_to_class"], batch_size=config["batch_size"],
+                                  rgb=config["rgb"])
+    model.input_shape  # load now, once per worker, instead of inside the first chunk
+    _worker = (engine, BlobFilter(**config["blob_filter"]), config)
+
+
+def _analyze_chunk(chunk):
+    """[(index, path)] -> [(index, row or None if unreadable)], run inside a worker."""
+    engine, blob_filter, config = _worker
+    samples = [Sample(path, headless=True) for _, path in chunk]
+    out = []
+    for (index, _), sample, (_, species, conf) in zip(chunk, samples, engine.classify(samples)):
+        row = None
+        if species is not None:
+            row, _ = result_row(sample, species, conf, engine, blob_filter, config["per_organism"],
+                                config["species_names"], config["tile"], config["threads"])
+        sample.release()
+        out.append((index, row))
+    return out
+
+
+def _ping():
+    return os.getpid()
+
+
+class ShardedAnalyzer:
+    """Pool of worker processes analyzing image files.
+
+    `config` holds what each worker needs to rebuild the pipeline: model_path,
+    backend, idx_to_class, batch_size, rgb, blob_filter (BlobFilter kwargs),
+    per_organism, species_names and tile. `threads` defaults to the CPU count
+    divided among the processes.
+    """
+
+    def __init__(self, config, processes=None, chunk_size=DEFAULT_CHUNK):
+        self.processes = max(1, processes or os.cpu_count())
+        self.chunk_size = max(1, chunk_size)
+        self.config = dict(config)
+        self.config.setdefault("threads", max(1, (os.cpu_count() or 1) // self.processes))
+        self.crashes = 0
+        self.failed = []
+        self._pool = None
+        self._saved_env = None
+
+    def _new_pool(self):
+        # Workers start on demand (and again after a crash), so the variables stay
+        # set until close(); the parent's own BLAS/OpenMP are loaded already and ignore them
+        if self._saved_env is None:
+            self._saved_env = {var: os.environ.get(var) for var in THREAD_ENV}
+            for var in THREAD_ENV:
+                os.environ[var] = str(self.config["threads"])
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(self.config,))
+
+    def warm_up(self):
+        """Start every worker (and load its model) before timing anything."""
+        if self._pool is None:
+            self._pool = self._new_pool()
+        for f in [self._pool.submit(_ping) for _ in range(self.processes)]:
+            f.result()
+
+    def run(self, paths):
+        """Yield (path, row, error) in input order; row is None when error is set."""
+        items = list(enumerate(paths))
+        chunks = deque(items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size))
+        suspects = deque()  # files in flight when a worker died, re-run one at a time
+        attempts = {}
+        ready = {}  # index -> (row, error), waiting for everything before it
+        next_index = 0
+        futures = {}
+        if self._pool is None:
+            self._pool = self._new_pool()
+
+        def collect(result):
+            for index, row in result:
+                ready[index] = (row, None if row is not None else "could not read image")
+
+        while chunks or futures or suspects:
+            if suspects:
+                # Isolate: only one suspect in flight, so a crash points at exactly one file
+                if not futures:
+                    item = suspects.popleft()
+                    futures[self._pool.submit(_analyze_chunk, [item])] = [item]
+            else:
+                while chunks and len(futures) < 2 * self.processes:  # bounded look-ahead
+                    chunk = chunks.popleft()
+                    futures[self._pool.submit(_analyze_chunk, chunk)] = chunk
+            in_flight = len(futures)
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+            crashed, broken = [], False
+            for f in done:
+                chunk = futures.pop(f)
+                try:
+                    collect(f.result())
+                except BrokenProcessPool:
+                    broken = True
+                    crashed.append(chunk)
+                except Exception as e:  # error raised by the analysis code itself
+                    if len(chunk) > 1:
+                        chunks.extendleft([item] for item in reversed(chunk))
+                    else:
+                        ready[chunk[0][0]] = (None, f"analysis failed: {e}")
+            if broken:
+                # Every chunk still in flight went down with the pool; keep whatever finished
+                self.crashes += 1
+                print(f"⚠️ A worker process died; restarting the pool ({self.crashes} so far)")
+                wait(futures)
+                for f, chunk in futures.items():
+                    try:
+                        collect(f.result())
+                    except Exception:
+                        crashed.append(chunk)
+                futures.clear()
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+
+                if in_flight == 1 and len(crashed) == 1 and len(crashed[0]) == 1:
+                    index, path = crashed[0][0]
+                    attempts[index] = attempts.get(index, 0) + 1
+                    if attempts[index] >= MAX_ATTEMPTS:
+                        self.failed.append(path)
+                        ready[index] = (None, "analysis failed (worker crashed)")
+                    else:
+                        suspects.appendleft((index, path))
+                else:
+                    suspects.extend(sorted(item for chunk in crashed for item in chunk))
+
+            while next_index in ready:
+                row, error = ready.pop(next_index)
+                yield paths[next_index], row, error
+                next_index += 1
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        if self._saved_env is not None:
+            for var, value in self._saved_env.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+            self._saved_env = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,156 @@
+# result_cache.py
+# Persistent cache of per-image analysis results in SQLite, so re-running
+# analyze_and_classify.py over a folder only analyzes new or changed slides.
+# A result is keyed by
+#   image hash  - SHA-1 of the file bytes (memoized per path/size/mtime)
+#   model hash  - SHA-1 of the model file(s) and class mapping in use
+#   params hash - counting/classification settings (blob filter, tiling, ...)
+# so swapping the model or changing a threshold simply misses for the affected
+# entries, which then age out. The database is kept under `max_bytes` by
+# evicting the least recently used results.
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "result_cache.sqlite")
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+COMMIT_EVERY = 50
+ROW_OVERHEAD = 160  # rough bytes per row for keys, timestamps and index entries
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    image_hash  TEXT NOT NULL,
+    model_hash  TEXT NOT NULL,
+    params_hash TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    last_used   REAL NOT NULL,
+    PRIMARY KEY (image_hash, model_hash, params_hash)
+);
+CREATE INDEX IF NOT EXISTS results_lru ON results (last_used);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash     TEXT NOT NULL
+);
+"""
+
+
+def hash_file(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def files_fingerprint(paths):
+    """One hash over the contents of every existing file in `paths` (e.g. model + class mapping)."""
+    h = hashlib.sha1()
+    for p in paths:
+        if os.path.exists(p):
+            h.update(os.path.basename(p).encode() + b"\0" + hash_file(p).encode() + b"\n")
+    return h.hexdigest()
+
+
+def params_fingerprint(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    """Look up and store result values (any JSON-able list) per image content.
+
+    get()/put() take the image hash from image_hash(path), which only reads
+    the file again if its size or mtime changed since it was last hashed.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, model_hash="", params=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.model_hash = model_hash
+        self.params_hash = params_fingerprint(params or {})
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._uncommitted = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def image_hash(self, path):
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        row = self.db.execute("SELECT size, mtime_ns, hash FROM file_hashes WHERE path = ?", (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = hash_file(path)
+        self.db.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                        (key, st.st_size, st.st_mtime_ns, digest))
+        self._changed()
+        return digest
+
+    def get(self, image_hash):
+        """Cached value for this image under the current model and params, or None."""
+        key = (image_hash, self.model_hash, self.params_hash)
+        row = self.db.execute("SELECT value FROM results WHERE image_hash = ? AND model_hash = ? AND params_hash = ?",
+                              key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute("UPDATE results SET last_used = ? WHERE image_hash = ? AND model_hash = ? AND params_hash = ?",
+                        (time.time(),) + key)
+        self._changed()
+        return json.loads(row[0])
+
+    def put(self, image_hash, value):
+        text = json.dumps(value)
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                        (image_hash, self.model_hash, self.params_hash, text, len(text) + ROW_OVERHEAD, time.time()))
+        self._changed()
+
+    def _changed(self):
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.evict()
+        self.db.commit()
+        self._uncommitted = 0
+
+    def total_bytes(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used results until the cache fits in max_bytes."""
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+        # cumulative size in LRU order; delete the oldest rows that cover the excess
+        cutoff = self.db.execute(
+            "SELECT last_used FROM (SELECT last_used, SUM(size) OVER (ORDER BY last_used) AS running FROM results) "
+            "WHERE running >= ? ORDER BY last_used LIMIT 1", (excess,)).fetchone()
+        if cutoff is None:
+            return 0
+        n = self.db.execute("DELETE FROM results WHERE last_used <= ?", cutoff).rowcount
+        self.evicted += n
+        return n
+
+    def stats(self):
+        return (f"result cache: {self.hits} hits, {self.misses} misses, {self.evicted} evicted, "
+                f"{self.total_bytes() / 1024:.0f} KB")
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
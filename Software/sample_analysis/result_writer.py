@@ -0,0 +1,131 @@
+# result_writer.py
+# Streams analysis rows to CSV or JSONL as soon as each sample is done, so a
+# crash partway through an overnight run keeps everything written so far.
+import os
+import csv
+import json
+import time
+
+FORMATS = ("csv", "jsonl")
+
+
+def guess_format(path):
+    return "jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv"
+
+
+class ResultWriter:
+    """Append-as-you-go result file with periodic flushing and resume support.
+
+    Rows are lists matching `columns`. With resume=True an existing file is
+    appended to and the values of `key_column` already in it are available
+    in `self.done`, so the caller can skip those samples. A row cut off by a
+    crash (no trailing newline) is dropped first, and a file written with
+    different columns raises ValueError instead of being appended to.
+    """
+
+    def __init__(self, path, columns, fmt=None, key_column=None, resume=False,
+                 flush_every=10, flush_seconds=5.0):
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt or guess_format(path)
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unknown output format {self.fmt!r}, expected one of {FORMATS}")
+        self.key_column = key_column or self.columns[0]
+        self.flush_every = max(1, flush_every)
+        self.flush_seconds = flush_seconds
+        self.done = set()
+        self.written = 0
+
+        appending = resume and os.path.exists(path) and os.path.getsize(path) > 0
+        if appending:
+            self._drop_partial_row()
+            appending = os.path.getsize(path) > 0  # a crash inside the header line leaves nothing to keep
+        if appending:
+            self._check_columns()
+            self.done = self._read_done()
+        self._file = open(path, "a" if appending else "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file) if self.fmt == "csv" else None
+        if self._csv and not appending:
+            self._csv.writerow(self.columns)
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def _drop_partial_row(self):
+        """Cut the file back to its last newline; whatever follows was half-written."""
+        if self._ends_with_newline():
+            return
+        with open(self.path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(65536, pos)
+                f.seek(pos - step)
+                block = f.read(step)
+                cut = block.rfind(b"\n")
+                if cut >= 0:
+                    pos = pos - step + cut + 1
+                    break
+                pos -= step
+            f.truncate(pos)
+        print(f"⚠️ Dropped an incomplete last row ({end - pos} bytes) from {self.path}")
+
+    def _check_columns(self):
+        with open(self.path, newline="", encoding="utf-8") as f:
+            if self.fmt == "csv":
+                found = next(csv.reader(f), [])
+            else:
+                line = f.readline()
+                found = list(json.loads(line)) if line.strip() else []
+        if found and found != self.columns:
+            raise ValueError(f"Can't resume {self.path}: it has columns {found}, this run writes {self.columns}. "
+                             f"Use a new --output file.")
+
+    def _read_done(self):
+        done = set()
+        with open(self.path, newline="", encoding="utf-8") as f:
+            if self.fmt == "csv":
+                for row in csv.DictReader(f):
+                    if row.get(self.key_column):
+                        done.add(row[self.key_column])
+            else:
+                for line in f:
+                    try:
+                        done.add(json.loads(line)[self.key_column])
+                    except (ValueError, KeyError):
+                        continue  # half-written last line from a crash
+        return done
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def write(self, row):
+        if self._csv:
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(dict(zip(self.columns, row))) + "\n")
+        self.done.add(str(row[self.columns.index(self.key_column)]))
+        self.written += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,545 @@
+# results_store.py
+# Append-only columnar store for analysis results, so every run of either
+# analyzer adds to one history instead of overwriting analysis_results.csv.
+#
+#   results_store/
+#     date=2026-10-18/                 one partition per local day
+#       chunk-<time>-<pid>.npz         compressed column arrays for a batch of rows
+#       _index.json                    per chunk: rows, time range and, per kind and
+#                                      species, rows / summed count / summed
+#                                      confidence / rows with a confidence
+#
+# Aggregations by day/month/species read only the _index.json files; chunk
+# data is decompressed only for row-level filters (confidence, source) or
+# grouping by source. Every row has a kind: "result" for a counted image or
+# frame, "session" for a live --track session's unique totals, which are not
+# per-frame counts and stay out of queries unless asked for. Species names are stored per chunk (codes + names), so
+# concurrent writers never share a dictionary, and a chunk missing from an
+# index (a writer crashed) is indexed on the next read. Index rewrites,
+# compaction and chunk reads hold a per-partition lock (_lock file), so
+# several processes can append to, compact and query the same day at once.
+#   python results_store.py summary
+#   python results_store.py query --by day species --species Euglena --since 30d
+#   python results_store.py export --output analysis_results.csv --since 2026-10-01
+#   python results_store.py import old_results.csv
+import os
+import csv
+import json
+import time
+import argparse
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_PATH = os.path.join(BASE_DIR, "results_store")
+DEFAULT_CHUNK_ROWS = 65536
+DEFAULT_FLUSH_SECONDS = 60.0  # a long watch/live session still lands on disk regularly
+COMPACT_AFTER = 32  # chunks in a partition before they are merged into one
+INDEX_NAME = "_index.json"
+LOCK_NAME = "_lock"
+CSV_COLUMNS = ["Filename", "Species", "Count", "Confidence (%)"]  # analyze_and_classify.py layout
+BLOB_COLUMNS = ("mean_area", "median_area", "mean_circularity", "mean_aspect_ratio")
+COLUMNS = ("timestamp", "source", "kind", "species", "count", "confidence") + BLOB_COLUMNS
+KINDS = ("result", "session")
+GROUP_KEYS = ("day", "month", "species", "source")
+
+
+def blob_summary(blobs):
+    """Per-row blob statistics stored with each result; NaN when no blobs were measured."""
+    if blobs is None or not len(blobs):
+        return (np.nan,) * len(BLOB_COLUMNS)
+    return (float(blobs.area.mean()), float(np.median(blobs.area)), float(blobs.circularity.mean()),
+            float(blobs.aspect_ratio.mean()))
+
+
+def partition_name(day):
+    return f"date={day}"
+
+
+def _atomic_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _lock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _species_sums(codes, names, count, confidence):
+    """{species: [rows, summed count, summed confidence, rows with a confidence]}; NaN confidences skipped."""
+    rated = ~np.isnan(confidence)
+    rows = np.bincount(codes, minlength=len(names))
+    counts = np.bincount(codes, weights=count, minlength=len(names))
+    conf = np.bincount(codes[rated], weights=confidence[rated], minlength=len(names))
+    conf_rows = np.bincount(codes[rated], minlength=len(names))
+    return {str(names[i]): [int(rows[i]), float(counts[i]), float(conf[i]), int(conf_rows[i])]
+            for i in np.flatnonzero(rows)}
+
+
+def _chunk_summary(columns):
+    codes, names, kinds = columns["species"], columns["species_names"], columns["kind"]
+    ts = columns["timestamp"]
+    summary = {"rows": int(len(codes)), "t_min": float(ts.min()) if len(ts) else None,
+               "t_max": float(ts.max()) if len(ts) else None, "kinds": {}}
+    for kind in np.unique(kinds):
+        rows = kinds == kind
+        sums = _species_sums(codes[rows], names, columns["count"][rows], columns["confidence"][rows])
+        summary["kinds"][kind.decode("utf-8")] = sums
+    summary["species"] = summary["kinds"].pop("result", {})  # the default kind, as in older indexes
+    return summary
+
+
+def _summary_species(summary, kind):
+    """{species: [rows, count, conf, conf rows]} of one kind (None for all) from an index entry."""
+    parts = [summary["species"]] if kind in (None, "result") else []
+    if kind != "result":
+        kinds = summary.get("kinds", {})
+        parts += list(kinds.values()) if kind is None else [kinds.get(kind, {})]
+    out = {}
+    for part in parts:
+        for name, sums in part.items():
+            g = out.setdefault(name, [0, 0.0, 0.0, 0])
+            for i, value in enumerate(sums):
+                g[i] += value
+    return out
+
+
+class ResultsStore:
+    """Buffered appends plus per-species / per-day queries over a results_store folder.
+
+    Safe to use from several processes at once; not thread-safe within one.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_PATH, chunk_rows=DEFAULT_CHUNK_ROWS, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        self.root = root
+        self.chunk_rows = max(1, chunk_rows)
+        self.flush_seconds = flush_seconds
+        self.appended = 0
+        self._buffer = {name: [] for name in COLUMNS}
+        self._last_flush = time.monotonic()
+        self._held = set()  # days whose partition lock this store holds
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def _locked(self, day):
+        """Exclusive lock on one day partition across processes; re-entrant within this store."""
+        if day in self._held:
+            yield
+            return
+        folder = os.path.join(self.root, partition_name(day))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, LOCK_NAME), "a+b") as f:
+            _lock_file(f)
+            self._held.add(day)
+            try:
+                yield
+            finally:
+                self._held.discard(day)
+                _unlock_file(f)
+
+    # --- writing ---
+    def append(self, source, species, count, confidence, blobs=None, timestamp=None, kind="result"):
+        """Queue one result; `confidence` is a 0-1 fraction (NaN if none), `blobs` a counting.Blobs or None."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown result kind {kind!r}; choose from {', '.join(KINDS)}")
+        buf = self._buffer
+        buf["timestamp"].append(time.time() if timestamp is None else timestamp)
+        buf["source"].append(str(source))
+        buf["kind"].append(kind)
+        buf["species"].append(str(species))
+        buf["count"].append(int(count))
+        buf["confidence"].append(float(confidence))
+        for name, value in zip(BLOB_COLUMNS, blob_summary(blobs)):
+            buf[name].append(value)
+        self.appended += 1
+        if len(buf["timestamp"]) >= self.chunk_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as one chunk per day partition, merging crowded partitions."""
+        buf = self._buffer
+        self._last_flush = time.monotonic()
+        if not buf["timestamp"]:
+            return
+        ts = np.asarray(buf["timestamp"], dtype=np.float64)
+        days = np.array([date.fromtimestamp(t).isoformat() for t in ts])
+        for day in np.unique(days):
+            rows = np.flatnonzero(days == day)
+            self._write_chunk(str(day), {name: [buf[name][i] for i in rows] for name in COLUMNS})
+        self._buffer = {name: [] for name in COLUMNS}
+        crowded = [str(day) for day in np.unique(days) if len(self._index(str(day))) > COMPACT_AFTER]
+        if crowded:
+            self.compact(crowded)
+
+    def _columns(self, values):
+        names, codes = np.unique(np.asarray(values["species"], dtype=str), return_inverse=True)
+        cols = {"timestamp": np.asarray(values["timestamp"], dtype=np.float64),
+                "source": np.char.encode(np.asarray(values["source"], dtype=str), "utf-8"),
+                "kind": np.char.encode(np.asarray(values["kind"], dtype=str), "utf-8"),
+                "species": codes.astype(np.int16), "species_names": names,
+                "count": np.asarray(values["count"], dtype=np.int32),
+                "confidence": np.asarray(values["confidence"], dtype=np.float32)}
+        for name in BLOB_COLUMNS:
+            cols[name] = np.asarray(values[name], dtype=np.float32)
+        return cols
+
+    def _write_chunk(self, day, values, name=None):
+        folder = os.path.join(self.root, partition_name(day))
+        os.makedirs(folder, exist_ok=True)
+        columns = values if "species_names" in values else self._columns(values)
+        name = name or f"chunk-{time.time_ns()}-{os.getpid()}.npz"
+        tmp = os.path.join(folder, f".{name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **columns)
+        with self._locked(day):
+            os.replace(tmp, os.path.join(folder, name))
+            index = self._index(day)
+            index[name] = _chunk_summary(columns)
+            _atomic_json(os.path.join(folder, INDEX_NAME), index)
+        return name
+
+    def compact(self, days=None):
+        """Merge each partition's chunks into one; returns the number of chunks removed."""
+        removed = 0
+        for day in days if days is not None else self.days():
+            with self._locked(day):  # another process may be appending or compacting this day
+                removed += self._compact_day(day)
+        return removed
+
+    def _compact_day(self, day):
+        old = sorted(self._index(day))
+        if len(old) < 2:
+            return 0
+        parts = [self._read_chunk(day, chunk) for chunk in old]
+        names = np.unique(np.concatenate([p["species_names"] for p in parts]))
+        merged = {key: np.concatenate([p[key] for p in parts]) for key in COLUMNS if key != "species"}
+        merged["species"] = np.concatenate([np.searchsorted(names, p["species_names"])[p["species"]]
+                                            for p in parts]).astype(np.int16)
+        order = np.argsort(merged["timestamp"], kind="stable")
+        merged = {key: column[order] for key, column in merged.items()}
+        merged["species_names"] = names
+        self._write_chunk(day, merged)
+        # the merged chunk is on disk and indexed before the originals go
+        folder = os.path.join(self.root, partition_name(day))
+        index = self._index(day)
+        for chunk in old:
+            _remove(os.path.join(folder, chunk))
+            index.pop(chunk, None)
+        _atomic_json(os.path.join(folder, INDEX_NAME), index)
+        return len(old)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- reading ---
+    def days(self, start=None, end=None):
+        """Partition dates (YYYY-MM-DD strings) between start and end, both inclusive."""
+        out = []
+        for entry in sorted(os.listdir(self.root)):
+            if not entry.startswith("date="):
+                continue
+            day = entry[len("date="):]
+            if (start is None or day >= str(start)) and (end is None or day <= str(end)):
+                out.append(day)
+        return out
+
+    def _index(self, day):
+        folder = os.path.join(self.root, partition_name(day))
+        if not os.path.isdir(folder):
+            return {}
+        with self._locked(day):
+            return self._reconciled_index(day, folder)
+
+    def _reconciled_index(self, day, folder):
+        path = os.path.join(folder, INDEX_NAME)
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        on_disk = {n for n in os.listdir(folder) if n.startswith("chunk-") and n.endswith(".npz")}
+        # entries written before per-kind, NaN-aware summaries are rebuilt from their chunk
+        if on_disk != set(index) or any("kinds" not in s for s in index.values()):
+            index = {n: s for n, s in index.items() if n in on_disk and "kinds" in s}
+            for name in sorted(on_disk - set(index)):
+                index[name] = _chunk_summary(self._read_chunk(day, name))
+            _atomic_json(path, index)
+        return index
+
+    def _read_chunk(self, day, name, columns=None):
+        with np.load(os.path.join(self.root, partition_name(day), name)) as data:
+            keys = data.files if columns is None else [c for c in columns if c in data.files]
+            cols = {key: data[key] for key in keys}
+            if "kind" not in data.files and (columns is None or "kind" in columns):
+                cols["kind"] = np.full(len(data["species"]), b"result")  # chunks from before kinds
+            return cols
+
+    def _chunks(self, start, end, wanted, columns, kind=None):
+        """(day, {column: array}) for chunks that can hold any of the `wanted` species (of one kind).
+
+        A day's chunks are read under its lock, so a concurrent compaction can't
+        remove them halfway through.
+        """
+        for day in self.days(start, end):
+            with self._locked(day):
+                parts = [self._read_chunk(day, name, columns) for name, summary in sorted(self._index(day).items())
+                         if wanted is None or wanted & set(_summary_species(summary, kind))]
+            for cols in parts:
+                yield day, cols
+
+    def scan(self, start=None, end=None, species=None, columns=COLUMNS):
+        """Yield (day, {column: array}) per chunk; `species` is a name or list of names.
+
+        Chunks without any of the requested species are skipped using the index.
+        The species column comes back as names.
+        """
+        wanted = None if species is None else ({species} if isinstance(species, str) else set(species))
+        need = set(columns) | {"species", "species_names"}
+        for day, cols in self._chunks(start, end, wanted, need):
+            names = cols.pop("species_names")
+            if wanted is not None:
+                keep = np.isin(cols["species"], np.flatnonzero(np.isin(names, list(wanted))))
+                cols = {k: v[keep] for k, v in cols.items()}
+            cols["species"] = names[cols["species"]]
+            for key in ("source", "kind"):
+                if key in cols:
+                    cols[key] = np.char.decode(cols[key], "utf-8")
+            yield day, {k: v for k, v in cols.items() if k in columns}
+
+    def load(self, start=None, end=None, species=None, columns=COLUMNS):
+        """All matching rows as one dict of column arrays, sorted by timestamp."""
+        parts = [cols for _, cols in self.scan(start, end, species, tuple(columns) + ("timestamp",))]
+        if not parts:
+            return {c: np.array([]) for c in columns}
+        merged = {c: np.concatenate([p[c] for p in parts]) for c in parts[0]}
+        order = np.argsort(merged["timestamp"], kind="stable")
+        return {c: merged[c][order] for c in columns}
+
+    def aggregate(self, by=("day", "species"), start=None, end=None, species=None,
+                  min_confidence=None, source=None, kind="result"):
+        """Rows, total count and mean confidence per group.
+
+        `by` is any of day, month, species, source; `kind` one of KINDS, or
+        None for every row. Without confidence/source filters and without
+        grouping by source, only the indexes are read. The mean confidence
+        skips rows without one (NaN) and is NaN when none had one.
+        Returns a list of dicts sorted by the group keys.
+        """
+        for key in by:
+            if key not in GROUP_KEYS:
+                raise ValueError(f"Can't group by {key!r}; choose from {', '.join(GROUP_KEYS)}")
+        wanted = None if species is None else ({species} if isinstance(species, str) else set(species))
+        groups = {}
+
+        def add(key, rows, count, conf, conf_rows):
+            g = groups.setdefault(key, [0, 0.0, 0.0, 0])
+            g[0] += rows
+            g[1] += count
+            g[2] += conf
+            g[3] += conf_rows
+
+        def key_for(day, name, src=None):
+            parts = {"day": day, "month": day[:7], "species": name, "source": src}
+            return tuple(parts[k] for k in by)
+
+        if min_confidence is None and source is None and "source" not in by:
+            for day in self.days(start, end):
+                for summary in self._index(day).values():
+                    for name, sums in _summary_species(summary, kind).items():
+                        if wanted is None or name in wanted:
+                            add(key_for(day, name), *sums)
+        else:
+            need = ("species", "species_names", "count", "confidence", "kind")
+            if source is not None or "source" in by:
+                need += ("source",)
+            for day, cols in self._chunks(start, end, wanted, need, kind):
+                names = cols["species_names"]
+                keep = np.ones(len(cols["species"]), dtype=bool)
+                if kind is not None:
+                    keep &= cols["kind"] == kind.encode()
+                if wanted is not None:
+                    keep &= np.isin(cols["species"], np.flatnonzero(np.isin(names, list(wanted))))
+                if min_confidence is not None:
+                    keep &= cols["confidence"] >= min_confidence
+                if source is not None:
+                    keep &= np.char.find(cols["source"], source.encode()) >= 0
+                codes = cols["species"][keep].astype(np.int64)
+                if not len(codes):
+                    continue
+                sources = None
+                if "source" in by:
+                    sources, src_codes = np.unique(cols["source"][keep], return_inverse=True)
+                    codes = src_codes.ravel() * len(names) + codes  # one group per (source, species)
+                confidence = cols["confidence"][keep]
+                rated = ~np.isnan(confidence)
+                rows = np.bincount(codes)
+                counts = np.bincount(codes, weights=cols["count"][keep])
+                conf = np.bincount(codes[rated], weights=confidence[rated], minlength=len(rows))
+                conf_rows = np.bincount(codes[rated], minlength=len(rows))
+                for g in np.flatnonzero(rows):
+                    src = sources[g // len(names)].decode("utf-8") if sources is not None else None
+                    add(key_for(day, str(names[g % len(names)]), src), int(rows[g]), float(counts[g]),
+                        float(conf[g]), int(conf_rows[g]))
+
+        out = []
+        for key in sorted(groups):
+            rows, count, conf, conf_rows = groups[key]
+            out.append({**dict(zip(by, key)), "rows": rows, "count": int(count),
+                        "mean_confidence": conf / conf_rows if conf_rows else float("nan")})
+        return out
+
+    def stats(self):
+        days = self.days()
+        chunks = rows = size = 0
+        for day in days:
+            folder = os.path.join(self.root, partition_name(day))
+            with self._locked(day):
+                for name, summary in self._index(day).items():
+                    chunks += 1
+                    rows += summary["rows"]
+                    size += os.path.getsize(os.path.join(folder, name))
+        return {"days": len(days), "first_day": days[0] if days else None, "last_day": days[-1] if days else None,
+                "chunks": chunks, "rows": rows, "megabytes": round(size / 1e6, 2)}
+
+    # --- CSV ---
+    def export_csv(self, path, start=None, end=None, species=None, kind="result"):
+        """Write matching rows of one kind (None for all) in the analysis_results.csv layout.
+
+        A missing confidence is written as "", like the live script does. Returns the row count.
+        """
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            cols = self.load(start, end, species, ("timestamp", "source", "kind", "species", "count", "confidence"))
+            keep = cols["kind"] == kind if kind is not None else np.ones(len(cols["kind"]), dtype=bool)
+            percent = np.round(cols["confidence"][keep].astype(np.float64) * 100, 2)
+            percent = ["" if np.isnan(p) else p for p in percent.tolist()]
+            writer.writerows(zip(cols["source"][keep].tolist(), cols["species"][keep].tolist(),
+                                 cols["count"][keep].tolist(), percent))
+        return int(keep.sum())
+
+    def import_csv(self, path, timestamp=None):
+        """Append rows from an analysis_results.csv style file (timestamped with its mtime)."""
+        ts = os.path.getmtime(path) if timestamp is None else timestamp
+        n = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) < 4 or row[0] in ("Filename", "FrameID"):
+                    continue
+                try:
+                    count, conf = int(row[2]), float(row[3]) / 100 if row[3] else np.nan
+                except ValueError:
+                    continue
+                # the live script's end-of-session unique totals
+                kind = "session" if row[0] == "Session" else "result"
+                self.append(row[0], row[1], count, conf, timestamp=ts, kind=kind)
+                n += 1
+        self.flush()
+        return n
+
+
+def parse_day(text):
+    """YYYY-MM-DD, or Nd for N days ago."""
+    if text is None:
+        return None
+    if text.endswith("d") and text[:-1].isdigit():
+        return (date.today() - timedelta(days=int(text[:-1]))).isoformat()
+    return datetime.strptime(text, "%Y-%m-%d").date().isoformat()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the appended analysis results")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="results store folder (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_filters(p):
+        p.add_argument("--since", default=None, help="first day, YYYY-MM-DD or e.g. 30d for 30 days ago")
+        p.add_argument("--until", default=None, help="last day (inclusive), YYYY-MM-DD or Nd")
+        p.add_argument("--species", nargs="+", default=None)
+
+    sub.add_parser("summary", help="days, rows and size of the store")
+    q = sub.add_parser("query", help="rows / total count / mean confidence per group")
+    q.add_argument("--by", nargs="+", choices=GROUP_KEYS, default=["day", "species"])
+    q.add_argument("--min-confidence", type=float, default=None, help="only rows at or above this (0-1)")
+    q.add_argument("--source", default=None, help="only rows whose source contains this text")
+    q.add_argument("--kind", choices=KINDS + ("all",), default="result",
+                   help="per-image/frame results, live session totals, or both (default: %(default)s)")
+    q.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    add_filters(q)
+    e = sub.add_parser("export", help="write rows in the analysis_results.csv layout")
+    e.add_argument("--output", required=True)
+    e.add_argument("--kind", choices=KINDS + ("all",), default="result",
+                   help="per-image/frame results, live session totals, or both (default: %(default)s)")
+    add_filters(e)
+    i = sub.add_parser("import", help="append rows from analysis_results.csv style files")
+    i.add_argument("files", nargs="+")
+    sub.add_parser("compact", help="merge each day's chunks into one file")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    if args.command == "summary":
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == "query":
+        start = time.perf_counter()
+        rows = store.aggregate(args.by, parse_day(args.since), parse_day(args.until), args.species,
+                               args.min_confidence, args.source, None if args.kind == "all" else args.kind)
+        elapsed = time.perf_counter() - start
+        if args.json:
+            print(json.dumps(rows, indent=2))
+            return
+        headers = list(args.by) + ["rows", "count", "mean_confidence"]
+        widths = [max([len(h)] + [len(f"{r[h]:.3f}" if h == "mean_confidence" else str(r[h])) for r in rows])
+                  for h in headers]
+        print("  ".join(h.rjust(w) for h, w in zip(headers, widths)))
+        for r in rows:
+            cells = [f"{r[h]:.3f}" if h == "mean_confidence" else str(r[h]) for h in headers]
+            print("  ".join(c.rjust(w) for c, w in zip(cells, widths)))
+        print(f"⏱️ {len(rows)} groups in {elapsed * 1000:.1f} ms")
+    elif args.command == "export":
+        n = store.export_csv(args.output, parse_day(args.since), parse_day(args.until), args.species,
+                             None if args.kind == "all" else args.kind)
+        print(f"✅ {n} rows written to {args.output}")
+    elif args.command == "import":
+        for path in args.files:
+            print(f"✅ {store.import_csv(path)} rows imported from {path}")
+    elif args.command == "compact":
+        print(f"✅ {store.compact()} chunks merged")
+
+
+if __name__ == "__main__":
+    main()
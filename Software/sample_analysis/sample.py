@@ -0,0 +1,56 @@
+# sample.py
+# One decoded sample image shared by counting, classification and the overlay,
+# so each file is read from disk exactly once.
+import os
+import cv2
+
+from organism_detection.inference import preprocess_frame
+
+
+class Sample:
+    """A sample image decoded once in color, with derived views built on demand.
+
+    Create it from a path (decoded lazily by load(), so a worker thread can
+    do the I/O) or from an in-memory BGR frame. In headless mode no overlay
+    is ever drawn.
+    """
+
+    def __init__(self, path=None, frame=None, name=None, headless=False):
+        self.path = path
+        self.name = name or (os.path.basename(path) if path else "frame")
+        self.color = frame
+        self.headless = headless
+        self._gray = None
+
+    def load(self):
+        """Decode the color image if not done yet; returns False if unreadable."""
+        if self.color is None and self.path is not None:
+            self.color = cv2.imread(self.path)
+        return self.color is not None
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.color, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def classifier_input(self, size, rgb=False, out=None):
+        """The (h, w, 3) float32 tensor the classifier expects, written into `out` if given."""
+        return preprocess_frame(self.color, size, rgb, out=out)
+
+    def draw_overlay(self, contours, label):
+        """Draw contours and the label onto the color buffer itself and return it.
+
+        Call this last: the decoded image is reused as the overlay instead of
+        being copied. Returns None in headless mode.
+        """
+        if self.headless:
+            return None
+        cv2.drawContours(self.color, contours, -1, (0, 255, 0), 1)
+        cv2.putText(self.color, label, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        return self.color
+
+    def release(self):
+        """Drop the pixel buffers once the sample has been reported."""
+        self.color = None
+        self._gray = None
@@ -0,0 +1,148 @@
+# segmentation.py
+# Thresholding methods for counting under uneven microscope illumination, with
+# every intermediate image preallocated once per frame size and reused, so the
+# live loop allocates nothing per frame for segmentation.
+#
+#   otsu        one global Otsu threshold (what count_microbes() does by default)
+#   adaptive    Gaussian-weighted local mean over block_size x block_size pixels,
+#               computed at 1/ADAPTIVE_SCALE resolution (cv2.adaptiveThreshold
+#               at full size costs ~100 ms per 1080p frame for a 151 px block)
+#   background  flat-field correction: divide by an illumination model
+#               estimated on the first frame and blended with every following
+#               one (bg_rate), then threshold the pixel / background ratio.
+#               Illumination is multiplicative, so a ratio treats an organism
+#               the same in a dim corner as in the bright centre, where a
+#               difference would shrink with the light
+#
+# The illumination model is a grayscale closing (dark organisms removed) on a
+# 1/bg_scale downscaled frame, so updating it costs a few small-image ops.
+import numpy as np
+import cv2
+
+from sample_analysis.counting import to_gray
+
+METHODS = ("otsu", "adaptive", "background")
+DEFAULT_BLOCK_SIZE = 151  # pixels; odd, several organisms wide
+DEFAULT_OFFSET = 3        # adaptive: how far below the local mean counts as foreground
+ADAPTIVE_SCALE = 4
+DEFAULT_BG_SCALE = 8      # background model resolution = frame / 8
+DEFAULT_BG_KERNEL = 15    # closing kernel on the downscaled frame, i.e. ~120 px at full size
+DEFAULT_BG_RATE = 0.05    # weight of the newest frame in the background model; 0 freezes it
+DEFAULT_MIN_CONTRAST = 12  # background: pixels must be at least 12/255 (~5%) darker than the background
+
+
+class Segmenter:
+    """Reusable foreground segmentation for a stream of same-sized frames.
+
+    threshold() returns a uint8 image owned by the segmenter: it is
+    overwritten by the next call, so copy it if it has to outlive the frame.
+    Not thread-safe; use one Segmenter per analysis thread.
+    """
+
+    def __init__(self, method="otsu", block_size=DEFAULT_BLOCK_SIZE, offset=DEFAULT_OFFSET,
+                 bg_scale=DEFAULT_BG_SCALE, bg_kernel=DEFAULT_BG_KERNEL, bg_rate=DEFAULT_BG_RATE,
+                 min_contrast=DEFAULT_MIN_CONTRAST):
+        if method not in METHODS:
+            raise ValueError(f"Unknown threshold method {method!r}; choose from {', '.join(METHODS)}")
+        self.method = method
+        self.block_size = block_size | 1  # adaptiveThreshold needs an odd block
+        self.offset = offset
+        self.bg_scale = max(1, bg_scale)
+        self.bg_rate = bg_rate
+        self.min_contrast = min_contrast
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (bg_kernel, bg_kernel))
+        self._shape = None
+        self.background_ready = False
+        self.frames = 0
+
+    def _allocate(self, shape):
+        h, w = shape
+        self._gray = np.empty((h, w), np.uint8)
+        self._blurred = np.empty((h, w), np.uint8)
+        self._thresh = np.empty((h, w), np.uint8)
+        self._edge = np.empty((h, w), np.uint8)
+        self._labels = np.empty((h, w), np.int32)
+        self._is_edge = np.empty((h, w), bool)
+        self._diff = np.empty((h, w), np.uint8)
+        if self.method == "adaptive":
+            small = (max(1, h // ADAPTIVE_SCALE), max(1, w // ADAPTIVE_SCALE))
+            self._small = np.empty(small, np.uint8)
+            self._small_mean = np.empty(small, np.uint8)
+            self._mean = np.empty((h, w), np.uint8)
+        elif self.method == "background":
+            small = (max(1, h // self.bg_scale), max(1, w // self.bg_scale))
+            self._small = np.empty(small, np.uint8)
+            self._closed = np.empty(small, np.uint8)
+            self._bg_small = np.empty(small, np.float32)
+            self._bg_small_u8 = np.empty(small, np.uint8)
+            self._bg = np.empty((h, w), np.uint8)
+        self._shape = shape
+        self.background_ready = False
+
+    def reset_background(self):
+        """Re-estimate the illumination model from the next frame (e.g. after moving the slide)."""
+        self.background_ready = False
+
+    @property
+    def background(self):
+        """Current full-resolution illumination estimate, or None before the first frame."""
+        return self._bg if self.method == "background" and self.background_ready else None
+
+    def _gray_of(self, image):
+        if isinstance(image, np.ndarray) and image.ndim == 3:
+            if image.shape[:2] != self._shape:
+                self._allocate(image.shape[:2])
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        gray = to_gray(image)
+        if gray.shape != self._shape:
+            self._allocate(gray.shape)
+        return gray
+
+    def _local_mean(self):
+        h, w = self._shape
+        sh, sw = self._small.shape
+        ksize = (self.block_size // ADAPTIVE_SCALE) | 1
+        cv2.resize(self._blurred, (sw, sh), dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.GaussianBlur(self._small, (ksize, ksize), 0, dst=self._small_mean, borderType=cv2.BORDER_REPLICATE)
+        cv2.resize(self._small_mean, (w, h), dst=self._mean, interpolation=cv2.INTER_LINEAR)
+        return self._mean
+
+    def _update_background(self):
+        h, w = self._shape
+        sh, sw = self._small.shape
+        cv2.resize(self._blurred, (sw, sh), dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.morphologyEx(self._small, cv2.MORPH_CLOSE, self._kernel, dst=self._closed)
+        if not self.background_ready:
+            np.copyto(self._bg_small, self._closed)
+            self.background_ready = True
+        elif self.bg_rate > 0:
+            cv2.accumulateWeighted(self._closed, self._bg_small, self.bg_rate)
+        else:
+            return  # frozen model: the full-size background from last frame still holds
+        np.copyto(self._bg_small_u8, self._bg_small, casting="unsafe")
+        np.maximum(self._bg_small_u8, 1, out=self._bg_small_u8)  # cv2.divide gives 0 for x / 0
+        cv2.resize(self._bg_small_u8, (w, h), dst=self._bg, interpolation=cv2.INTER_LINEAR)
+
+    def threshold(self, image):
+        """Foreground (organism) pixels = 255 for a path, BGR/grayscale array or Sample."""
+        gray = self._gray_of(image)
+        cv2.GaussianBlur(gray, (5, 5), 0, dst=self._blurred)
+        if self.method == "otsu":
+            cv2.threshold(self._blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, dst=self._thresh)
+        elif self.method == "adaptive":
+            # foreground where pixel <= local mean - offset, like ADAPTIVE_THRESH_GAUSSIAN_C + BINARY_INV
+            cv2.subtract(self._local_mean(), self._blurred, dst=self._diff)
+            cv2.threshold(self._diff, max(self.offset - 1, 0), 255, cv2.THRESH_BINARY, dst=self._thresh)
+        else:
+            self._update_background()
+            # 255 * pixel / illumination, saturating at 255 for anything brighter than the background
+            cv2.divide(self._blurred, self._bg, dst=self._diff, scale=255)
+            level, _ = cv2.threshold(self._diff, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, dst=self._thresh)
+            if level > 255 - self.min_contrast:  # empty field: Otsu would split the sensor noise
+                cv2.threshold(self._diff, 255 - self.min_contrast, 255, cv2.THRESH_BINARY_INV, dst=self._thresh)
+        self.frames += 1
+        return self._thresh
+
+    def blob_buffers(self):
+        """(labels, edge, is_edge) scratch images for counting.blob_stats on the last thresholded frame."""
+        return self._labels, self._edge, self._is_edge
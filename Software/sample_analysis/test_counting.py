@@ -0,0 +1,58 @@
+# test_counting.py
+# Blob shape statistics from counting.blob_stats, and tiled counting
+# (tiling.py) matching the untiled count.
+# Run with: python -m pytest sample_analysis/test_counting.py
+import os
+import sys
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sample_analysis.counting import blob_stats, BlobFilter, count_microbes
+from sample_analysis.tiling import process_tiled
+
+
+def shape(a, b, angle=0):
+    img = np.zeros((200, 200), np.uint8)
+    cv2.ellipse(img, (100, 100), (a, b), angle, 0, 360, 255, -1)
+    return blob_stats(img)
+
+
+def test_disc_circularity_is_about_one():
+    for r in (5, 10, 20, 40):
+        circ = shape(r, r).circularity[0]
+        assert 0.9 < circ < 1.1, f"r={r}: {circ:.3f}"
+
+
+def test_ellipse_is_less_circular_than_a_disc():
+    # a 2:1 ellipse has circularity 0.84; a 3:1 one 0.66
+    for a, angle in ((10, 0), (10, 30), (20, 0), (20, 30)):
+        disc, ellipse = shape(a, a).circularity[0], shape(a, a // 2, angle).circularity[0]
+        assert ellipse < 0.9 and ellipse < disc - 0.1, f"{a}x{a // 2} at {angle}: {ellipse:.3f}"
+        assert shape(3 * a // 2, a // 2, angle).circularity[0] < 0.75
+
+
+def test_min_circularity_rejects_elongated_blobs():
+    img = np.zeros((200, 400), np.uint8)
+    cv2.circle(img, (100, 100), 10, 255, -1)
+    cv2.ellipse(img, (300, 100), (10, 5), 0, 0, 360, 255, -1)
+    blobs = blob_stats(img)
+    keep = BlobFilter(min_circularity=0.9).mask(blobs)
+    assert keep.tolist() == [True, False]
+
+
+def test_tiled_count_matches_untiled():
+    rng = np.random.default_rng(0)
+    # wider than 1024 px and unevenly lit, so a threshold from a downscaled copy would differ
+    img = np.tile(np.linspace(150, 230, 1600).astype(np.uint8), (400, 1))
+    for x, y, r in zip(rng.integers(0, 1600, 600), rng.integers(0, 400, 600), rng.integers(1, 8, 600)):
+        cv2.circle(img, (int(x), int(y)), int(r), int(rng.integers(40, 120)), -1)
+    img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    n, _, blobs = count_microbes(img)
+    for tile in (100, 256, 1024):
+        count, tiled, _, _ = process_tiled(img, tile=tile, workers=2)
+        assert count == n, f"tile {tile}"
+        assert np.allclose(np.sort(tiled.area), np.sort(blobs.area))
+        assert np.allclose(np.sort(tiled.perimeter), np.sort(blobs.perimeter))
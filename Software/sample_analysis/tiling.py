@@ -0,0 +1,220 @@
+# tiling.py
+# Count (and optionally classify) large slide images tile by tile in parallel.
+#
+# Every tile owns a non-overlapping "core" region and reads `overlap` extra
+# pixels around it, so blurring and edge detection on the core see exactly the
+# same neighbourhood as on the full image. Blobs are labelled per core and the
+# pieces of blobs that cross a core boundary are stitched back together by
+# comparing the labels on either side of each seam, so no organism is counted
+# twice and no full-resolution label image is ever built. The shared Otsu
+# threshold comes from a first pass summing the 256-bin histograms of the
+# blurred tile cores, which is exactly the histogram of the blurred full
+# image, so tiled and untiled counts agree.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+from sample_analysis.counting import Blobs, BlobFilter, edge_perimeter
+
+DEFAULT_TILE = 1024
+DEFAULT_OVERLAP = 8  # >= 3: 2 px for the 5x5 blur + 1 px for the perimeter erode
+
+_CROSS = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+
+
+def tile_grid(height, width, tile=DEFAULT_TILE):
+    """Core regions as a list of rows of (y0, y1, x0, x1)."""
+    return [[(y, min(y + tile, height), x, min(x + tile, width)) for x in range(0, width, tile)]
+            for y in range(0, height, tile)]
+
+
+def otsu_level(hist):
+    """Otsu threshold of a 256-bin histogram, computed the way cv2.threshold does."""
+    hist = np.asarray(hist, dtype=np.float64)
+    total = hist.sum()
+    if not total:
+        return 0.0
+    p = hist / total
+    mu = float(np.dot(np.arange(256), p))
+    q1 = mu1 = max_sigma = best = 0.0
+    eps = np.finfo(np.float32).eps
+    for i in range(256):
+        mu1 *= q1
+        q1 += p[i]
+        q2 = 1.0 - q1
+        if min(q1, q2) < eps or max(q1, q2) > 1.0 - eps:
+            continue
+        mu1 = (mu1 + i * p[i]) / q1
+        mu2 = (mu - q1 * mu1) / q2
+        sigma = q1 * q2 * (mu1 - mu2) ** 2
+        if sigma > max_sigma:
+            max_sigma, best = sigma, i
+    return float(best)
+
+
+def _blurred_tile(image, core, overlap):
+    """(blurred grayscale tile with its overlap, slices of the core within it)."""
+    y0, y1, x0, x1 = core
+    h, w = image.shape[:2]
+    py0, py1 = max(y0 - overlap, 0), min(y1 + overlap, h)
+    px0, px1 = max(x0 - overlap, 0), min(x1 + overlap, w)
+    tile = image[py0:py1, px0:px1]
+    gray = cv2.cvtColor(tile, cv2.COLOR_BGR2GRAY) if tile.ndim == 3 else tile
+    inner = (slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0))
+    return cv2.GaussianBlur(gray, (5, 5), 0), inner
+
+
+def _core_histogram(image, core, overlap):
+    blurred, inner = _blurred_tile(image, core, overlap)
+    return cv2.calcHist([np.ascontiguousarray(blurred[inner])], [0], None, [256], [0, 256]).ravel()
+
+
+def global_threshold(image, cores, overlap=DEFAULT_OVERLAP, pool=None):
+    """Otsu threshold of the whole blurred image, from the summed histograms of the tile cores."""
+    hists = (pool.map if pool else map)(lambda c: _core_histogram(image, c, overlap), cores)
+    return otsu_level(np.sum(list(hists), axis=0))
+
+
+def _process_tile(image, core, overlap, thresh_value, input_size):
+    y0, y1, x0, x1 = core
+    blurred, inner = _blurred_tile(image, core, overlap)
+    if thresh_value is None:  # per-tile Otsu
+        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    else:
+        _, thresh = cv2.threshold(blurred, thresh_value, 255, cv2.THRESH_BINARY_INV)
+    edge = cv2.subtract(thresh, cv2.erode(thresh, _CROSS, borderType=cv2.BORDER_CONSTANT, borderValue=0))
+
+    core_thresh = np.ascontiguousarray(thresh[inner])
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(core_thresh, connectivity=8)
+    edge_pixels = np.bincount(labels[edge[inner] > 0], minlength=n)[1:].astype(float)
+    area = stats[1:, cv2.CC_STAT_AREA].astype(float)
+    bbox = stats[1:, :4].copy()
+    bbox[:, 0] += x0
+    bbox[:, 1] += y0
+    weighted = (centroids[1:] + (x0, y0)) * area[:, None]  # area-weighted so pieces can be merged
+
+    result = {
+        "n": n - 1, "area": area, "edge_pixels": edge_pixels, "bbox": bbox, "weighted": weighted,
+        "top": labels[0].copy(), "bottom": labels[-1].copy(),
+        "left": labels[:, 0].copy(), "right": labels[:, -1].copy(),
+    }
+    if input_size is not None:
+        core_color = image[y0:y1, x0:x1]
+        result["tensor"] = cv2.resize(core_color, input_size, interpolation=cv2.INTER_AREA)
+    return result
+
+
+def _seam_pairs(a, b, base_a, base_b):
+    """Global id pairs of blobs touching across a straight seam (8-connectivity)."""
+    pairs = []
+    for shift in (-1, 0, 1):
+        if shift < 0:
+            la, lb = a[-shift:], b[:shift]
+        elif shift > 0:
+            la, lb = a[:-shift], b[shift:]
+        else:
+            la, lb = a, b
+        hit = (la > 0) & (lb > 0)
+        if hit.any():
+            pairs.append(np.stack([la[hit] - 1 + base_a, lb[hit] - 1 + base_b], 1))
+    return pairs
+
+
+def _union(pairs, n):
+    """Map each of n ids to a representative id, joining every pair."""
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    touched = np.unique(pairs) if len(pairs) else []
+    for i in touched:
+        parent[i] = find(i)
+    return parent  # ids not in any pair are their own root
+
+
+def _merge(grid, results):
+    rows, cols = len(grid), len(grid[0])
+    bases = np.cumsum([0] + [r["n"] for r in results])
+    total = int(bases[-1])
+    at = lambda i, j: i * cols + j
+
+    pairs = []
+    for i in range(rows):
+        for j in range(cols):
+            k, r = at(i, j), results[at(i, j)]
+            if j + 1 < cols:
+                pairs += _seam_pairs(r["right"], results[at(i, j + 1)]["left"], bases[k], bases[at(i, j + 1)])
+            if i + 1 < rows:
+                pairs += _seam_pairs(r["bottom"], results[at(i + 1, j)]["top"], bases[k], bases[at(i + 1, j)])
+            # diagonal neighbours only touch at a single corner pixel
+            if i + 1 < rows and j + 1 < cols:
+                pairs += _seam_pairs(r["bottom"][-1:], results[at(i + 1, j + 1)]["top"][:1],
+                                     bases[k], bases[at(i + 1, j + 1)])
+            if i + 1 < rows and j > 0:
+                pairs += _seam_pairs(r["bottom"][:1], results[at(i + 1, j - 1)]["top"][-1:],
+                                     bases[k], bases[at(i + 1, j - 1)])
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=int)
+    pairs = np.unique(pairs, axis=0)
+
+    roots = _union(pairs, total)
+    _, blob = np.unique(roots, return_inverse=True)
+    m = int(blob.max()) + 1 if total else 0
+
+    area = np.bincount(blob, np.concatenate([r["area"] for r in results]), minlength=m)
+    # edge pixels add up across tiles; the length estimate is only taken of the whole blob
+    perimeter = edge_perimeter(np.bincount(blob, np.concatenate([r["edge_pixels"] for r in results]), minlength=m))
+    weighted = np.concatenate([r["weighted"] for r in results]).reshape(-1, 2)
+    centroid = np.stack([np.bincount(blob, weighted[:, 0], minlength=m),
+                         np.bincount(blob, weighted[:, 1], minlength=m)], 1) / np.maximum(area, 1)[:, None]
+    bbox = np.concatenate([r["bbox"] for r in results]).reshape(-1, 4)
+    lo = np.full((m, 2), np.iinfo(np.int32).max)
+    hi = np.zeros((m, 2), dtype=int)
+    np.minimum.at(lo, blob, bbox[:, :2])
+    np.maximum.at(hi, blob, bbox[:, :2] + bbox[:, 2:])
+    merged_bbox = np.concatenate([lo, hi - lo], 1) if m else np.empty((0, 4), dtype=int)
+    return Blobs(None, np.arange(m), area, perimeter, merged_bbox, centroid)
+
+
+def process_tiled(image, engine=None, tile=DEFAULT_TILE, overlap=DEFAULT_OVERLAP, workers=None,
+                  blob_filter=None, per_tile_threshold=False):
+    """Count blobs in `image` tile by tile; optionally classify the tiles too.
+
+    Returns (count, blobs, species, confidence). species/confidence come from
+    classifying every tile core in one batch and summing confidence per
+    species, or are (None, None) without an engine. Intermediate buffers are
+    sized by the tile, not by the image.
+    """
+    overlap = max(3, overlap)
+    h, w = image.shape[:2]
+    grid = tile_grid(h, w, tile)
+    cores = [core for row in grid for core in row]
+    input_size = engine.input_size if engine is not None else None
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        thresh_value = None if per_tile_threshold else global_threshold(image, cores, overlap, pool)
+        results = list(pool.map(lambda c: _process_tile(image, c, overlap, thresh_value, input_size), cores))
+
+    blobs = _merge(grid, results)
+    blobs = blobs.select((blob_filter or BlobFilter()).mask(blobs))
+
+    species, confidence = None, None
+    if engine is not None:
+        batch = np.stack([r["tensor"] for r in results])
+        if engine.rgb:
+            batch = batch[..., ::-1]
+        indices, confidences = engine.predict_batch(batch.astype("float32") * (1.0 / 255.0))
+        votes = np.bincount(indices, confidences)
+        best = int(np.argmax(votes))
+        species = engine.idx_to_class.get(best, "Unknown")
+        confidence = float(confidences[indices == best].mean())
+    return len(blobs), blobs, species, confidence
@@ -0,0 +1,268 @@
+# tracking.py
+# Frame-to-frame organism tracking for live video, so a Paramecium swimming
+# across the field is counted once per session instead of once per frame.
+#
+# Blobs from count_microbes() are matched to existing tracks by centroid
+# distance after a constant-velocity prediction plus 1 - IoU of the boxes.
+# Only pairs inside the gates are scored: a KD-tree finds the blobs within
+# max_distance of each predicted centroid or close enough for the boxes to
+# overlap, and linear_sum_assignment runs on each connected group of tracks
+# and blobs, so a frame with a thousand organisms costs a few thousand pairs
+# instead of a million.
+# A track is confirmed after min_hits matched frames, which keeps flickering
+# noise out of the unique counts, and dropped after max_missed frames unseen.
+# Species come from classifying each confirmed track's crop a few times
+# (`votes`) and taking the confidence-weighted majority, instead of
+# classifying every blob of every frame.
+from collections import Counter
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+DEFAULT_MAX_DISTANCE = 40.0  # pixels a centroid may move between analyzed frames
+DEFAULT_MIN_IOU = 0.1        # ...or this much box overlap still counts as the same organism
+DEFAULT_MAX_MISSED = 5       # frames a track survives without a matching blob
+DEFAULT_MIN_HITS = 3         # matched frames before a track counts as an organism
+DEFAULT_VOTES = 3            # classifications per track
+DEFAULT_VOTE_INTERVAL = 10   # frames between a track's classifications
+UNCLASSIFIED = "Unclassified"
+
+_INVALID = 1e6  # cost of a pair outside the gates; never accepted
+
+
+def box_iou(a, b):
+    """(len(a), len(b)) IoU of two arrays of (x, y, w, h) boxes."""
+    return paired_iou(a[:, None, :], b[None, :, :])
+
+
+def paired_iou(a, b):
+    """Element-wise IoU of (x, y, w, h) boxes in a[..., 4] and b[..., 4]."""
+    ax0, ay0, aw, ah = (a[..., i] for i in range(4))
+    bx0, by0, bw, bh = (b[..., i] for i in range(4))
+    iw = np.clip(np.minimum(ax0 + aw, bx0 + bw) - np.maximum(ax0, bx0), 0, None)
+    ih = np.clip(np.minimum(ay0 + ah, by0 + bh) - np.maximum(ay0, by0), 0, None)
+    inter = iw * ih
+    return inter / np.maximum(aw * ah + bw * bh - inter, 1e-9)
+
+
+class OrganismTracker:
+    """Persistent ids for blobs across frames, and unique organism counts per species.
+
+    Per frame: ids = update(blobs); then classify the boxes from
+    needs_classification() and hand the results to add_votes().
+    Not thread-safe; update it from the one thread that analyzes frames.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, min_iou=DEFAULT_MIN_IOU,
+                 max_missed=DEFAULT_MAX_MISSED, min_hits=DEFAULT_MIN_HITS, votes=DEFAULT_VOTES,
+                 vote_interval=DEFAULT_VOTE_INTERVAL):
+        self.max_distance = max_distance
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.votes = votes
+        self.vote_interval = vote_interval
+
+        # Active tracks as parallel columns; ids stay sorted (new ones are appended)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.centroids = np.zeros((0, 2))
+        self.boxes = np.zeros((0, 4))
+        self.velocity = np.zeros((0, 2))
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.missed = np.zeros(0, dtype=np.int64)
+        self.n_votes = np.zeros(0, dtype=np.int64)
+        self.last_vote = np.zeros(0, dtype=np.int64)
+
+        self._ballots = {}  # track id -> Counter(species -> summed confidence)
+        self._finished = Counter()  # species -> confirmed tracks that have ended
+        self._next_id = 1
+        self.frame = 0
+        self.created = 0
+        self.confirmed = 0
+        self.new_confirmed = np.zeros(0, dtype=np.int64)  # ids confirmed by the last update()
+        self.classified = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- association ---
+    def _candidates(self, centroids, boxes):
+        """(track rows, blob indices, cost) of every pair inside the distance or IoU gate."""
+        predicted = self.centroids + self.velocity
+        shifted = self.boxes.copy()
+        shifted[:, :2] += self.velocity
+        near = cKDTree(predicted).sparse_distance_matrix(cKDTree(centroids), self.max_distance, output_type="ndarray")
+        rows, cols = [near["i"]], [near["j"]]
+
+        # Overlapping boxes have centres within the sum of their half-diagonals. Boxes
+        # up to a typical size go through a second KD-tree query; the few large ones
+        # (a clump, the slide edge) are compared with everything directly.
+        track_half = np.hypot(shifted[:, 2], shifted[:, 3]) / 2
+        blob_half = np.hypot(boxes[:, 2], boxes[:, 3]) / 2
+        limit = np.percentile(np.concatenate([track_half, blob_half]), 95)
+        small_tracks = np.flatnonzero(track_half <= limit)
+        small_blobs = np.flatnonzero(blob_half <= limit)
+        touching = cKDTree(shifted[small_tracks, :2] + shifted[small_tracks, 2:] / 2).sparse_distance_matrix(
+            cKDTree(boxes[small_blobs, :2] + boxes[small_blobs, 2:] / 2), 2 * limit, output_type="ndarray")
+        r, c = small_tracks[touching["i"]], small_blobs[touching["j"]]
+        keep = touching["v"] <= track_half[r] + blob_half[c]
+        rows.append(r[keep])
+        cols.append(c[keep])
+        for big_rows, big_cols in ((np.flatnonzero(track_half > limit), np.arange(len(boxes))),
+                                   (small_tracks, np.flatnonzero(blob_half > limit))):
+            if len(big_rows) and len(big_cols):
+                r, c = np.nonzero(box_iou(shifted[big_rows], boxes[big_cols]) >= self.min_iou)
+                rows.append(big_rows[r])
+                cols.append(big_cols[c])
+
+        key = np.unique(np.concatenate(rows) * len(centroids) + np.concatenate(cols))
+        rows, cols = key // len(centroids), key % len(centroids)
+
+        dist = np.hypot(*(predicted[rows] - centroids[cols]).T)
+        iou = paired_iou(shifted[rows], boxes[cols])
+        ok = (dist <= self.max_distance) | (iou >= self.min_iou)
+        rows, cols, dist, iou = rows[ok], cols[ok], dist[ok], iou[ok]
+        return rows, cols, dist / self.max_distance + (1.0 - iou)
+
+    def _assign(self, rows, cols, cost, n_blobs):
+        """Minimum-cost one-to-one matching of the candidate pairs, solved per connected group."""
+        n_tracks = len(self.ids)
+        graph = coo_matrix((np.ones(len(rows)), (rows, n_tracks + cols)), shape=(n_tracks + n_blobs,) * 2)
+        _, label = connected_components(graph, directed=False)
+        group = label[rows]
+        edges = np.bincount(group, minlength=label.max() + 1)
+        tracks = np.bincount(label[:n_tracks], minlength=len(edges))
+        blobs = np.bincount(label[n_tracks:], minlength=len(edges))
+        # The usual case, one track and one blob that only see each other, needs no solver
+        single = (edges == 1) & (tracks == 1) & (blobs == 1)
+        first = single[group]
+        out_rows, out_cols = [rows[first]], [cols[first]]
+        rest = ~first
+        if rest.any():
+            rows, cols, cost, group = rows[rest], cols[rest], cost[rest], group[rest]
+            order = np.argsort(group, kind="stable")
+            rows, cols, cost, group = rows[order], cols[order], cost[order], group[order]
+            bounds = np.flatnonzero(np.diff(group)) + 1
+            for r, c, w in zip(np.split(rows, bounds), np.split(cols, bounds), np.split(cost, bounds)):
+                ur, ri = np.unique(r, return_inverse=True)
+                uc, ci = np.unique(c, return_inverse=True)
+                dense = np.full((len(ur), len(uc)), _INVALID)
+                dense[ri, ci] = w
+                a, b = linear_sum_assignment(dense)
+                ok = dense[a, b] < _INVALID
+                out_rows.append(ur[a[ok]])
+                out_cols.append(uc[b[ok]])
+        return np.concatenate(out_rows), np.concatenate(out_cols)
+
+    def update(self, blobs):
+        """Match this frame's blobs (counting.Blobs) to tracks; returns the track id of each blob."""
+        return self.update_boxes(np.asarray(blobs.centroid, dtype=float), np.asarray(blobs.bbox, dtype=float))
+
+    def update_boxes(self, centroids, boxes):
+        self.frame += 1
+        centroids = centroids.reshape(-1, 2)
+        boxes = boxes.reshape(-1, 4)
+        n = len(centroids)
+        track_of = np.full(n, -1, dtype=np.int64)
+
+        matched = np.zeros(len(self.ids), dtype=bool)
+        if len(self.ids) and n:
+            rows, cols = self._assign(*self._candidates(centroids, boxes), n)
+            step = centroids[cols] - self.centroids[rows]
+            self.velocity[rows] = 0.5 * self.velocity[rows] + 0.5 * step
+            self.centroids[rows] = centroids[cols]
+            self.boxes[rows] = boxes[cols]
+            self.hits[rows] += 1
+            self.missed[rows] = 0
+            matched[rows] = True
+            track_of[cols] = self.ids[rows]
+        self.missed[~matched] += 1
+
+        was_confirmed = self.hits >= self.min_hits
+        self._retire(self.missed > self.max_missed, was_confirmed)
+
+        fresh = track_of < 0
+        k = int(fresh.sum())
+        if k:
+            new_ids = np.arange(self._next_id, self._next_id + k)
+            self._next_id += k
+            self.created += k
+            track_of[fresh] = new_ids
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.centroids = np.concatenate([self.centroids, centroids[fresh]])
+            self.boxes = np.concatenate([self.boxes, boxes[fresh]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((k, 2))])
+            self.hits = np.concatenate([self.hits, np.ones(k, dtype=np.int64)])
+            self.missed = np.concatenate([self.missed, np.zeros(k, dtype=np.int64)])
+            self.n_votes = np.concatenate([self.n_votes, np.zeros(k, dtype=np.int64)])
+            self.last_vote = np.concatenate([self.last_vote, np.zeros(k, dtype=np.int64)])
+
+        newly = (self.hits == self.min_hits) & (self.missed == 0)
+        self.new_confirmed = self.ids[newly]
+        self.confirmed += len(self.new_confirmed)
+        return track_of
+
+    def _retire(self, dead, was_confirmed):
+        if not dead.any():
+            return
+        for track_id in self.ids[dead & was_confirmed]:
+            self._finished[self._species_of(int(track_id))] += 1
+        for track_id in self.ids[dead]:
+            self._ballots.pop(int(track_id), None)
+        keep = ~dead
+        self.ids, self.centroids, self.boxes = self.ids[keep], self.centroids[keep], self.boxes[keep]
+        self.velocity, self.hits, self.missed = self.velocity[keep], self.hits[keep], self.missed[keep]
+        self.n_votes, self.last_vote = self.n_votes[keep], self.last_vote[keep]
+
+    # --- classification ---
+    def needs_classification(self, limit=None):
+        """(track ids, boxes) of visible confirmed tracks that are due another vote."""
+        due = ((self.hits >= self.min_hits) & (self.missed == 0) & (self.n_votes < self.votes)
+               & ((self.n_votes == 0) | (self.frame - self.last_vote >= self.vote_interval)))
+        rows = np.flatnonzero(due)
+        if limit is not None:
+            rows = rows[np.argsort(self.n_votes[rows], kind="stable")[:limit]]  # unclassified tracks first
+        return self.ids[rows], self.boxes[rows]
+
+    def add_votes(self, track_ids, species, confidences):
+        rows = np.searchsorted(self.ids, track_ids)
+        self.n_votes[rows] += 1
+        self.last_vote[rows] = self.frame
+        self.classified += len(track_ids)
+        for track_id, name, conf in zip(np.asarray(track_ids).tolist(), species, np.asarray(confidences).tolist()):
+            self._ballots.setdefault(track_id, Counter())[name] += conf
+
+    def _species_of(self, track_id):
+        ballot = self._ballots.get(track_id)
+        return ballot.most_common(1)[0][0] if ballot else UNCLASSIFIED
+
+    def species_of(self, track_ids):
+        return [self._species_of(int(i)) for i in track_ids]
+
+    # --- results ---
+    def unique_counts(self):
+        """Confirmed organisms seen this session, per species (ended and still visible)."""
+        counts = Counter(self._finished)
+        counts.update(self.species_of(self.ids[self.hits >= self.min_hits]))
+        return dict(counts)
+
+    @property
+    def unique_total(self):
+        return self.confirmed
+
+    @property
+    def unclassified(self):
+        """Confirmed organisms this session that never got a classification vote."""
+        return self.unique_counts().get(UNCLASSIFIED, 0)
+
+    def visible(self):
+        """Ids of confirmed tracks matched in the last frame."""
+        return self.ids[(self.hits >= self.min_hits) & (self.missed == 0)]
+
+    def stats(self):
+        return (f"tracker: {self.frame} frames, {self.confirmed} organisms confirmed "
+                f"({self.created} tracks), {len(self.visible())} visible, "
+                f"{self.classified} track classifications, {self.unclassified} organisms never classified")
@@ -0,0 +1,229 @@
+# binary_link.py
+# Reliable, non-blocking species-count reporting over the binary protocol
+# (protocol.py). Callers never wait on the serial port: counts are merged
+# into a pending table (latest count per species wins) and a writer thread
+# packs everything pending into as few frames as possible. Every frame
+# carries a sequence number and must be acked; unacked frames are resent
+# and counted as lost once the retries run out.
+#
+# The sketch only recognizes a resend of the frame it applied last, so a
+# resend must never arrive after a newer frame for the same state: a species
+# id is framed again only once its previous frame is acked or given up on
+# (serial is in order, so every copy of the old frame is already on the wire),
+# and a command goes out alone. Commands therefore wait for a round trip
+# each; at most max_commands wait in line, and the oldest is dropped (and
+# counted) when a caller sends them faster than that. Counts of a frame that was given up on go back
+# to the pending table unless a newer count is already waiting.
+import time
+import threading
+from collections import deque
+
+from serial_communication import protocol
+
+DEFAULT_ACK_TIMEOUT = 0.3  # seconds, on top of the frame's transmit time
+DEFAULT_RETRIES = 3
+DEFAULT_WINDOW = 4  # frames in flight
+DEFAULT_MAX_COMMANDS = 16  # queued commands before the oldest is dropped
+
+
+class BinaryLink:
+    """Framed, acknowledged link to serial_control.ino.
+
+    `species_ids` maps species names to the numeric ids in class_indices.json.
+    The port needs write(), read(n) and in_waiting, like serial.Serial.
+    """
+
+    def __init__(self, port, species_ids, baudrate=9600, ack_timeout=DEFAULT_ACK_TIMEOUT,
+                 retries=DEFAULT_RETRIES, window=DEFAULT_WINDOW, max_commands=DEFAULT_MAX_COMMANDS):
+        self.port = port
+        self.species_ids = {name: int(i) for name, i in species_ids.items()}
+        self.byte_time = 10.0 / baudrate
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.window = max(1, window)
+        self.max_commands = max(1, max_commands)
+        self.decoder = protocol.FrameDecoder()
+
+        self.frames_sent = 0
+        self.counts_sent = 0
+        self.coalesced = 0
+        self.acked = 0
+        self.retransmits = 0
+        self.lost = 0
+        self.dropped = 0
+        self.errors = 0
+        self.unknown_species = 0
+        self._rtt_sum = 0.0
+
+        self._seq = 0
+        self._pending_counts = {}   # species_id -> count, not yet framed
+        self._pending_frames = deque()  # (type, payload) for commands, sent in order
+        self._in_flight = {}        # seq -> [frame bytes, deadline, attempts, sent_at, counts or None]
+        self._cond = threading.Condition()
+        self._closing = False
+        self._stop = False
+        self._writer = threading.Thread(target=self._write_loop, name="binary-link-writer", daemon=True)
+        self._reader = threading.Thread(target=self._read_loop, name="binary-link-reader", daemon=True)
+        self._writer.start()
+        self._reader.start()
+
+    # --- API ---
+    def send_counts(self, counts):
+        """Queue {species name: count}; returns immediately."""
+        with self._cond:
+            if self._closing:
+                return False
+            for name, count in counts.items():
+                species_id = self.species_ids.get(name)
+                if species_id is None:
+                    self.unknown_species += 1
+                    continue
+                if species_id in self._pending_counts:
+                    self.coalesced += 1
+                self._pending_counts[species_id] = int(count)
+            self._cond.notify_all()
+        return True
+
+    def send_command(self, code, arg=None):
+        """Queue a command; returns immediately. Beyond max_commands queued, the oldest is dropped."""
+        payload = bytes((code,)) if arg is None else bytes((code, arg & 0xFF))
+        with self._cond:
+            if self._closing:
+                return False
+            if len(self._pending_frames) >= self.max_commands:
+                self._pending_frames.popleft()
+                self.dropped += 1
+            self._pending_frames.append((protocol.COMMAND, payload))
+            self._cond.notify_all()
+        return True
+
+    # --- writer ---
+    def _next_seq(self):
+        # skip numbers still waiting for an ack after the 8-bit counter wraps
+        while self._seq in self._in_flight:
+            self._seq = (self._seq + 1) & 0xFF
+        seq = self._seq
+        self._seq = (self._seq + 1) & 0xFF
+        return seq
+
+    def _timeout_for(self, frame):
+        return self.ack_timeout + 2 * len(frame) * self.byte_time
+
+    def _due(self, now):
+        """Frames to (re)send now; empty when there is nothing to do yet."""
+        out = []
+        for seq, entry in list(self._in_flight.items()):
+            if entry[1] > now:
+                continue
+            if entry[2] > self.retries:
+                del self._in_flight[seq]
+                self.lost += 1
+                print(f"⚠️ Serial frame {seq} was never acknowledged")
+                if entry[4] and not self._closing:
+                    for species_id, count in entry[4].items():
+                        self._pending_counts.setdefault(species_id, count)
+                continue
+            entry[1] = now + self._timeout_for(entry[0])
+            entry[2] += 1
+            self.retransmits += 1
+            out.append(entry[0])
+        busy = set()  # species ids in frames still waiting for an ack
+        for entry in self._in_flight.values():
+            if entry[4] is None:
+                return out  # a command is in flight; nothing may overtake its resends
+            busy.update(entry[4])
+        while len(self._in_flight) < self.window:
+            if self._pending_frames:
+                if self._in_flight:
+                    break  # wait for the window to drain, then send the command alone
+                frame_type, payload = self._pending_frames.popleft()
+                counts = None
+            else:
+                ready = {i: c for i, c in self._pending_counts.items() if i not in busy}
+                if not ready:
+                    break
+                payload, ids = protocol.pack_counts(ready)[0]
+                counts = {species_id: self._pending_counts.pop(species_id) for species_id in ids}
+                busy.update(ids)
+                frame_type = protocol.COUNTS
+            seq = self._next_seq()
+            frame = protocol.encode_frame(frame_type, seq, payload)
+            self._in_flight[seq] = [frame, now + self._timeout_for(frame), 1, now, counts]
+            out.append(frame)
+            if counts is None:
+                break
+        return out
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.perf_counter()
+                    frames = self._due(now)
+                    if frames:
+                        break
+                    idle = not self._in_flight and not self._pending_frames and not self._pending_counts
+                    if idle and self._closing:
+                        self._stop = True
+                        self._cond.notify_all()
+                        return
+                    deadlines = [e[1] for e in self._in_flight.values()]
+                    self._cond.wait(timeout=max(0.0, min(deadlines) - now) if deadlines else None)
+            for frame in frames:
+                try:
+                    self.port.write(frame)
+                    self.frames_sent += 1
+                except Exception as e:  # a flaky link shouldn't kill the writer; the ack timeout retries it
+                    self.errors += 1
+                    print("⚠️ Serial write failed:", e)
+
+    # --- reader ---
+    def _read_loop(self):
+        while not self._stop:
+            try:
+                data = self.port.read(max(1, self.port.in_waiting))
+            except Exception:
+                if self._stop:
+                    return
+                self.errors += 1
+                time.sleep(0.1)
+                continue
+            if not data:
+                continue
+            for frame in self.decoder.feed(data):
+                if frame.type == protocol.ACK:
+                    self._on_ack(frame)
+
+    def _on_ack(self, frame):
+        with self._cond:
+            entry = self._in_flight.pop(frame.seq, None)
+            if entry is None:
+                return  # ack for a retransmit we already counted
+            self.acked += 1
+            self.counts_sent += len(entry[4] or ())
+            self._rtt_sum += time.perf_counter() - entry[3]
+            status = frame.payload[0] if frame.payload else protocol.ACK_OK
+            if status == protocol.ACK_BAD_PAYLOAD:
+                self.errors += 1
+            self._cond.notify_all()
+
+    # --- lifecycle ---
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is acknowledged (or given up on)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not (self._in_flight or self._pending_frames
+                                                    or self._pending_counts), timeout)
+
+    def close(self, timeout=5.0):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._writer.join(timeout)
+        self._stop = True
+        self._reader.join(timeout=1.0)
+
+    def stats(self):
+        rtt = self._rtt_sum / self.acked * 1000 if self.acked else 0.0
+        return (f"serial: {self.frames_sent} frames ({self.counts_sent} counts) acked {self.acked}, "
+                f"{self.coalesced} coalesced, {self.dropped} commands dropped, {self.retransmits} retransmits, "
+                f"{self.lost} lost, {self.errors} errors, ack rtt {rtt:.0f} ms")
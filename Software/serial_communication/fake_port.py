@@ -0,0 +1,179 @@
+# fake_port.py
+# Stand-ins for the Arduino serial port so the reporting code can run without hardware.
+import os
+import time
+import random
+import threading
+
+from serial_communication import protocol
+
+
+class LoopbackPort:
+    """In-memory replacement for serial.Serial: bytes written come back from read().
+
+    With throttle=True each write takes as long as it would on a real UART at
+    `baudrate` (10 bits per byte), which is what makes the analysis loop stall
+    when it writes synchronously.
+    """
+
+    def __init__(self, baudrate=9600, throttle=True):
+        self.baudrate = baudrate
+        self.throttle = throttle
+        self.is_open = True
+        self._buffer = bytearray()
+        self._lock = threading.Condition()
+
+    def write(self, data):
+        if not self.is_open:
+            raise OSError("port is closed")
+        if self.throttle:
+            time.sleep(len(data) * 10 / self.baudrate)
+        with self._lock:
+            self._buffer.extend(data)
+            self._lock.notify_all()
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def read(self, size=1, timeout=1.0):
+        with self._lock:
+            self._lock.wait_for(lambda: len(self._buffer) >= size, timeout)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def readline(self, timeout=1.0):
+        with self._lock:
+            self._lock.wait_for(lambda: b"\n" in self._buffer, timeout)
+            end = self._buffer.find(b"\n") + 1 or len(self._buffer)
+            data = bytes(self._buffer[:end])
+            del self._buffer[:end]
+        return data
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def open_pty_port(baudrate=9600, timeout=1):
+    """Open a pseudo-terminal pair (POSIX only) and return (serial.Serial, master_fd).
+
+    The Serial object behaves like a real device node; read what it writes
+    with os.read(master_fd, n), and answer with os.write(master_fd, data).
+    """
+    import serial
+
+    master, slave = os.openpty()
+    port = serial.Serial(os.ttyname(slave), baudrate=baudrate, timeout=timeout)
+    os.close(slave)  # the Serial object holds its own descriptor
+    return port, master
+
+
+class ArduinoSimulator:
+    """serial.Serial-like stand-in for serial_control.ino speaking the binary protocol.
+
+    Frames written by the host are decoded and applied the way the sketch
+    does (counts stored per species id, LED commands), and ACK frames come
+    back through read(). drop_rate / corrupt_rate make the link lossy so
+    BinaryLink's retransmits can be exercised.
+    """
+
+    def __init__(self, baudrate=9600, throttle=True, drop_rate=0.0, corrupt_rate=0.0, timeout=1.0, seed=None):
+        self.baudrate = baudrate
+        self.throttle = throttle
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.timeout = timeout
+        self.is_open = True
+        self._rng = random.Random(seed)
+        self._decoder = protocol.FrameDecoder()
+        self._out = bytearray()
+        self._cond = threading.Condition()
+
+        # state the sketch keeps
+        self.counts = {}  # species_id -> last count
+        self.led = False
+        self.brightness = 0
+        self.blinks = 0
+        self.frames = 0
+        self.duplicates = 0
+        self.seq_gaps = 0
+        self._last_seq = None
+
+    # --- serial.Serial-like side used by the host ---
+    def write(self, data):
+        if not self.is_open:
+            raise OSError("port is closed")
+        if self.throttle:
+            time.sleep(len(data) * 10 / self.baudrate)
+        data = bytes(data)
+        if self._rng.random() < self.drop_rate:
+            return len(data)  # lost on the wire
+        if data and self._rng.random() < self.corrupt_rate:
+            i = self._rng.randrange(len(data))
+            data = data[:i] + bytes((data[i] ^ 0x10,)) + data[i + 1:]
+        for frame in self._decoder.feed(data):
+            self._handle(frame)
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            return len(self._out)
+
+    def read(self, size=1):
+        with self._cond:
+            self._cond.wait_for(lambda: self._out or not self.is_open, self.timeout)
+            data = bytes(self._out[:size])
+            del self._out[:size]
+        return data
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+    # --- the sketch ---
+    def _ack(self, seq, status):
+        frame = protocol.encode_frame(protocol.ACK, seq, bytes((status,)))
+        with self._cond:
+            self._out += frame
+            self._cond.notify_all()
+
+    def _handle(self, frame):
+        if frame.type == protocol.ACK:
+            return
+        if frame.seq == self._last_seq:
+            self.duplicates += 1  # our ack was lost and the host resent; don't apply twice
+            self._ack(frame.seq, protocol.ACK_DUPLICATE)
+            return
+        if self._last_seq is not None and frame.seq != (self._last_seq + 1) & 0xFF:
+            self.seq_gaps += 1
+        self._last_seq = frame.seq
+        self.frames += 1
+        try:
+            if frame.type == protocol.COUNTS:
+                for species_id, count in protocol.decode_counts(frame.payload):
+                    self.counts[species_id] = count
+            elif frame.type == protocol.COMMAND:
+                code = frame.payload[0]
+                if code == protocol.CMD_LED_ON:
+                    self.led = True
+                elif code == protocol.CMD_LED_OFF:
+                    self.led = False
+                elif code == protocol.CMD_BLINK:
+                    self.blinks += 1
+                elif code == protocol.CMD_BRIGHTNESS:
+                    self.brightness = frame.payload[1] if len(frame.payload) > 1 else 0
+        except (ValueError, IndexError):
+            self._ack(frame.seq, protocol.ACK_BAD_PAYLOAD)
+            return
+        self._ack(frame.seq, protocol.ACK_OK)
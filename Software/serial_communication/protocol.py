@@ -0,0 +1,158 @@
+# protocol.py
+# Binary framing for the microscope <-> Arduino serial link, replacing the
+# "species:count\n" text lines. Mirrors Hardware/arduino/serial_commands/serial_control.ino.
+#
+#   frame   = SYNC type seq len payload[len] crc16_lo crc16_hi
+#   SYNC    = 0xA5
+#   crc16   = CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over type..payload
+#   len     <= MAX_PAYLOAD, so a whole frame fits the Uno's 64-byte receive buffer
+#
+#   COUNTS  payload = (species_id varint, count varint) repeated; species ids
+#           are the indices from class_indices.json
+#   COMMAND payload = command code, optional argument byte
+#   ACK     payload = status (sent by the Arduino with the seq it received)
+#
+# Varints are unsigned LEB128: 7 bits per byte, high bit = more bytes follow.
+import binascii
+
+SYNC = 0xA5
+HEADER_SIZE = 4
+CRC_SIZE = 2
+MAX_PAYLOAD = 48
+
+COUNTS = 0x01
+COMMAND = 0x02
+ACK = 0x80
+
+ACK_OK = 0
+ACK_DUPLICATE = 1  # already applied; the host's retransmit crossed our ack
+ACK_BAD_PAYLOAD = 2
+
+CMD_LED_OFF = 0
+CMD_LED_ON = 1
+CMD_BLINK = 2
+CMD_BRIGHTNESS = 3
+
+
+def crc16(data):
+    return binascii.crc_hqx(bytes(data), 0xFFFF)
+
+
+def encode_varint(value, out=None):
+    if value < 0:
+        raise ValueError("varints are unsigned")
+    out = bytearray() if out is None else out
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return out
+
+
+def decode_varint(data, pos=0):
+    """Return (value, next_pos); raises ValueError on a truncated varint."""
+    value = shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+    raise ValueError("truncated varint")
+
+
+def encode_frame(frame_type, seq, payload=b""):
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    body = bytes((frame_type, seq & 0xFF, len(payload))) + bytes(payload)
+    crc = crc16(body)
+    return bytes((SYNC,)) + body + bytes((crc & 0xFF, crc >> 8))
+
+
+def pack_counts(counts):
+    """Split {species_id: count} into as few COUNTS payloads as fit MAX_PAYLOAD.
+
+    Returns [(payload, species_ids_in_it), ...].
+    """
+    packed, current, ids = [], bytearray(), []
+    for species_id, count in counts.items():
+        entry = encode_varint(count, encode_varint(species_id))
+        if len(current) + len(entry) > MAX_PAYLOAD:
+            packed.append((bytes(current), ids))
+            current, ids = bytearray(), []
+        current += entry
+        ids.append(species_id)
+    if current:
+        packed.append((bytes(current), ids))
+    return packed
+
+
+def decode_counts(payload):
+    """[(species_id, count), ...] from a COUNTS payload."""
+    entries, pos = [], 0
+    while pos < len(payload):
+        species_id, pos = decode_varint(payload, pos)
+        count, pos = decode_varint(payload, pos)
+        entries.append((species_id, count))
+    return entries
+
+
+class Frame:
+    __slots__ = ("type", "seq", "payload")
+
+    def __init__(self, frame_type, seq, payload):
+        self.type = frame_type
+        self.seq = seq
+        self.payload = payload
+
+    def __repr__(self):
+        return f"Frame(type=0x{self.type:02x}, seq={self.seq}, payload={self.payload.hex()})"
+
+
+class FrameDecoder:
+    """Incremental decoder: feed() raw bytes as they arrive, get complete frames back.
+
+    Noise and corrupted frames are skipped by hunting for the next SYNC byte;
+    they are counted in `crc_errors` / `skipped_bytes`.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.crc_errors = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data):
+        self._buf += data
+        frames = []
+        buf = self._buf
+        while True:
+            start = buf.find(SYNC)
+            if start < 0:
+                self.skipped_bytes += len(buf)
+                buf.clear()
+                break
+            if start:
+                self.skipped_bytes += start
+                del buf[:start]
+            if len(buf) < HEADER_SIZE:
+                break
+            length = buf[3]
+            if length > MAX_PAYLOAD:  # not a real header; resync after this byte
+                del buf[:1]
+                self.skipped_bytes += 1
+                continue
+            end = HEADER_SIZE + length + CRC_SIZE
+            if len(buf) < end:
+                break
+            crc = buf[end - 2] | (buf[end - 1] << 8)
+            if crc16(buf[1:end - 2]) != crc:
+                self.crc_errors += 1
+                del buf[:1]
+                continue
+            frames.append(Frame(buf[1], buf[2], bytes(buf[HEADER_SIZE:end - 2])))
+            del buf[:end]
+        return frames
@@ -1,14 +1,31 @@
 import serial
 import time
 
+from serial_communication import protocol
+from serial_communication.binary_link import BinaryLink
+
+# Text commands understood by earlier sketches, mapped to binary command codes
+COMMANDS = {"ON": protocol.CMD_LED_ON, "OFF": protocol.CMD_LED_OFF, "1": protocol.CMD_BLINK,
+            "BLINK": protocol.CMD_BLINK}
+
 class ArduinoController:
-    def __init__(self, port='COM3', baudrate=9600):
-        self.arduino = serial.Serial(port, baudrate, timeout=1)
-        time.sleep(2)  # allow Arduino to reset
+    def __init__(self, port='COM3', baudrate=9600, connection=None, species_ids=None):
+        # `connection` lets a fake port (serial_communication/fake_port.py) stand in for hardware
+        self.arduino = connection or serial.Serial(port, baudrate, timeout=1)
+        if connection is None:
+            time.sleep(2)  # allow Arduino to reset
+        self.link = BinaryLink(self.arduino, species_ids or {}, baudrate)
 
     def send_command(self, cmd: str):
-        """Send a single character command to Arduino"""
-        self.arduino.write(cmd.encode())
+        """Queue a command ("ON", "OFF", "1" = blink, "BRIGHT n") for the Arduino (never blocks)"""
+        name, _, arg = cmd.strip().upper().partition(" ")
+        if name == "BRIGHT":
+            return self.link.send_command(protocol.CMD_BRIGHTNESS, int(arg or 255))
+        if name not in COMMANDS:
+            raise ValueError(f"Unknown Arduino command: {cmd!r}")
+        return self.link.send_command(COMMANDS[name])
 
     def close(self):
+        self.link.close()
+        print(self.link.stats())
         self.arduino.close()
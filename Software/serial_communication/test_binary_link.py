@@ -0,0 +1,61 @@
+# test_binary_link.py
+# BinaryLink against the ArduinoSimulator on a lossy link: whatever gets
+# dropped, corrupted or resent, the sketch must end up with the latest count
+# of every species and run every command exactly once.
+# Run with: python -m pytest serial_communication/test_binary_link.py
+import os
+import sys
+import random
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from serial_communication import protocol
+from serial_communication.binary_link import BinaryLink
+from serial_communication.fake_port import ArduinoSimulator
+
+SPECIES = {name: i for i, name in enumerate(["Amoeba", "Euglena", "Paramecium", "Rotifer", "Volvox"])}
+
+
+def run_session(seed, updates=60, blinks=5, retries=3):
+    rng = random.Random(seed)
+    port = ArduinoSimulator(throttle=False, drop_rate=0.2, corrupt_rate=0.1, timeout=0.01, seed=seed)
+    link = BinaryLink(port, SPECIES, ack_timeout=0.02, retries=retries)
+    latest = {}
+    for i in range(updates):
+        counts = {name: rng.randrange(500) for name in rng.sample(list(SPECIES), rng.randint(1, len(SPECIES)))}
+        link.send_counts(counts)
+        latest.update(counts)
+        if i % (updates // blinks) == 0:
+            link.send_command(protocol.CMD_BLINK)
+        time.sleep(0.005)  # one analyzed frame apart, so updates spread over several frames in flight
+    assert link.flush(timeout=30)
+    link.close()
+    port.close()
+    return port, link, {SPECIES[name]: count for name, count in latest.items()}
+
+
+def test_final_counts_survive_a_lossy_link():
+    for seed in range(20):
+        port, _, expected = run_session(seed)
+        assert port.counts == expected, f"seed {seed}"
+
+
+def test_commands_run_once():
+    for seed in range(20):
+        # enough retries that no command is given up on, so every blink must run exactly once
+        port, link, _ = run_session(seed, retries=10)
+        assert link.lost == 0 and port.blinks == 5, f"seed {seed}"
+
+
+def test_command_flood_is_bounded():
+    port = ArduinoSimulator(throttle=True)
+    link = BinaryLink(port, SPECIES, max_commands=8)
+    for _ in range(200):  # far faster than one round trip per command
+        link.send_command(protocol.CMD_BLINK)
+        assert len(link._pending_frames) <= 8
+    assert link.flush(timeout=30)
+    link.close()
+    port.close()
+    assert link.dropped > 0 and port.blinks + link.dropped == 200
+    assert f"{link.dropped} commands dropped" in link.stats()
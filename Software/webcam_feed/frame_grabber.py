@@ -0,0 +1,165 @@
+# frame_grabber.py
+# Reads frames on a dedicated thread and keeps only the newest one, so a slow
+# analysis step never leaves the UI looking at stale frames from the OpenCV buffer.
+import os
+import time
+import threading
+from collections import deque
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif")
+
+
+def parse_source(source):
+    """'0' / 0 -> camera index, anything else is a video file or image folder path."""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class _ImageFolderCapture:
+    """cv2.VideoCapture look-alike that plays a folder of images as a stream."""
+
+    def __init__(self, folder):
+        self.paths = sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                            if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.pos = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        while self.pos < len(self.paths):
+            frame = cv2.imread(self.paths[self.pos])
+            self.pos += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def get(self, prop):
+        return 0.0
+
+    def release(self):
+        self.paths = []
+
+
+class FrameGrabber:
+    """Capture frames in a background thread with latest-frame semantics.
+
+    `source` is a camera index, a video file or a folder of images. File and
+    folder sources are paced at `fps` (default: the file's own rate, or 30)
+    so they behave like a live camera; camera sources run as fast as the
+    device delivers. The newest frame replaces the previous one; with
+    ring_size > 0 the last N frames are kept as well.
+    """
+
+    def __init__(self, source=0, ring_size=0, fps=None, loop=False):
+        self.source = parse_source(source)
+        if isinstance(self.source, str) and os.path.isdir(self.source):
+            self.cap = _ImageFolderCapture(self.source)
+        else:
+            self.cap = cv2.VideoCapture(self.source)
+        self.is_file = not isinstance(self.source, int)
+        if fps is None and self.is_file:
+            fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.pace = 1.0 / fps if fps and self.is_file else 0.0
+        self.loop = loop
+        self.ring = deque(maxlen=ring_size) if ring_size > 0 else None
+
+        self.captured = 0  # frames read from the source
+        self.delivered = 0  # frames handed to read()
+        self.fps = 0.0  # measured capture rate
+        self._frame = None
+        self._frame_id = 0
+        self._timestamp = 0.0
+        self._last_read_id = 0
+        self._ended = False
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        if self._thread is None and self.isOpened():
+            self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+            self._thread.start()
+        return self
+
+    def _reopen(self):
+        if isinstance(self.cap, _ImageFolderCapture):
+            self.cap.pos = 0
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _run(self):
+        window_start, window_frames = time.perf_counter(), 0
+        next_due = time.perf_counter()
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                if self.loop and self.is_file and self.captured:
+                    self._reopen()
+                    continue
+                break
+            now = time.perf_counter()
+            with self._cond:
+                self._frame = frame
+                self._frame_id += 1
+                self._timestamp = now
+                if self.ring is not None:
+                    self.ring.append((self._frame_id, now, frame))
+                self.captured += 1
+                self._cond.notify_all()
+
+            window_frames += 1
+            if now - window_start >= 1.0:
+                self.fps = window_frames / (now - window_start)
+                window_start, window_frames = now, 0
+
+            if self.pace:
+                next_due = max(next_due + self.pace, now)
+                self._stop.wait(max(0.0, next_due - time.perf_counter()))
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+
+    def read(self, timeout=5.0):
+        """Like cv2.VideoCapture.read(), but returns the newest frame not yet read.
+
+        Waits up to `timeout` seconds for a new frame; returns (False, None)
+        once the source is exhausted or nothing arrives in time.
+        """
+        frame_id, _, frame = self.read_latest(timeout)
+        return frame is not None, frame
+
+    def read_latest(self, timeout=5.0):
+        """Return (frame_id, capture_timestamp, frame) for the newest unseen frame."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame_id > self._last_read_id or self._ended, timeout)
+            if self._frame_id <= self._last_read_id:
+                return self._last_read_id, None, None
+            self._last_read_id = self._frame_id
+            self.delivered += 1
+            return self._frame_id, self._timestamp, self._frame
+
+    def recent(self):
+        """The last ring_size frames as (frame_id, timestamp, frame), oldest first."""
+        with self._cond:
+            return list(self.ring) if self.ring is not None else []
+
+    @property
+    def dropped(self):
+        """Frames captured but replaced before anyone read them."""
+        return max(0, self.captured - self.delivered - (self._frame_id > self._last_read_id))
+
+    def stats(self):
+        return f"capture: {self.fps:.1f} FPS, {self.captured} frames, {self.dropped} dropped"
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.cap.release()
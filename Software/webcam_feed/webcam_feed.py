@@ -1,7 +1,17 @@
+import os
+import sys
+import argparse
 import cv2
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from webcam_feed.frame_grabber import FrameGrabber
+
 def main():
-    cap = cv2.VideoCapture(0)  # Open the default webcam
+    parser = argparse.ArgumentParser(description="Show the microscope/webcam feed")
+    parser.add_argument("--source", default="0", help="camera index, video file or image folder (default: %(default)s)")
+    args = parser.parse_args()
+
+    cap = FrameGrabber(args.source).start()  # Open the default webcam, read on a background thread
 
     if not cap.isOpened():
         print("Cannot open webcam")
@@ -20,6 +30,7 @@ def main():
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
+    print(cap.stats())
     cap.release()
     cv2.destroyAllWindows()
 